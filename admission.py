@@ -0,0 +1,170 @@
+"""
+Admission control by route class.
+
+Every request is put in a class by its endpoint and method:
+
+  static    /static/ files
+  page      the home page, /sent/, /metrics, stats and anything else
+  verify    GET /verify/<token> and API lookups/revocations: one row read
+  upload    POST /upload and POST /api/v1/transfers: read, encrypt, write
+  download  POST /verify/<token>: decrypt, hash and send a whole blob
+
+Each class has its own gate: at most `slots` requests in flight, up to
+`queue` more waiting for at most `wait` seconds (a freed slot goes to
+the oldest waiter), and the rest turned away with 503 and Retry-After.
+A class with 0 slots is not limited.
+
+Gates are per process, so the limits apply to each gunicorn worker and
+only bite with threaded workers (the shipped start command runs
+`--worker-class gthread --threads 8`; a sync worker serves one request
+at a time and never sheds). A queued request holds one of the worker's
+threads, so the defaults are sized for 8 threads: upload and download
+together can take at most 5 (slots plus queue), which leaves at least 3
+for pages, static files and verify GETs however many large transfers
+arrive. Those light classes are bounded by the thread pool alone.
+
+A slot is released when the request is torn down, or for a streamed
+response once it is closed, so a streamed download counts for as long
+as it is sending. Time spent queueing and requests shed are counted per
+class.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from flask import g, make_response, request
+
+CLASSES = ("static", "page", "verify", "upload", "download")
+
+# slots:queue:wait_ms per class, per worker process (sized for gthread --threads 8)
+DEFAULT_LIMITS = "static=0,page=0,verify=0,upload=1:1:2000,download=2:1:2000"
+
+UPLOAD_ENDPOINTS = frozenset({"upload", "api_create_transfer"})
+VERIFY_ENDPOINTS = frozenset({"api_transfer"})
+
+SHED_BODY = "Busy, please retry shortly.\n"
+
+
+def parse_limits(spec):
+    """"name=slots:queue:wait_ms,..." -> {name: (slots, queue, wait_seconds)}"""
+    limits = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in CLASSES:
+            raise ValueError(f"Unknown admission class {name!r}; expected one of {', '.join(CLASSES)}")
+        parts = [int(p) for p in value.split(":")] + [0, 0]
+        limits[name] = (parts[0], parts[1], parts[2] / 1000)
+    return limits
+
+
+def classify(endpoint, method):
+    if endpoint == "static":
+        return "static"
+    if endpoint in UPLOAD_ENDPOINTS:
+        return "upload"
+    if endpoint == "verify":
+        return "download" if method == "POST" else "verify"
+    if endpoint in VERIFY_ENDPOINTS:
+        return "verify"
+    return "page"
+
+
+class Gate:
+    """`slots` concurrent holders; up to `queue` waiters for `wait` seconds,
+    admitted oldest first"""
+
+    def __init__(self, slots, queue=0, wait=0.0, clock=time.monotonic):
+        self.slots = slots
+        self.queue = queue
+        self.wait = wait
+        self.clock = clock
+        self.in_flight = 0
+        self._waiters = deque()  # one Event per queued request, oldest first
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def acquire(self):
+        """(admitted, seconds queued, reason shed or None)"""
+        with self._lock:
+            if self.in_flight < self.slots and not self._waiters:
+                self.in_flight += 1
+                return True, 0.0, None
+            if len(self._waiters) >= self.queue:
+                return False, 0.0, "queue_full"
+            ticket = threading.Event()
+            self._waiters.append(ticket)
+        started = self.clock()
+        if not ticket.wait(self.wait):
+            with self._lock:
+                if not ticket.is_set():  # else handed a slot just as time ran out
+                    self._waiters.remove(ticket)
+                    return False, self.clock() - started, "timeout"
+        return True, self.clock() - started, None
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes straight to it
+            else:
+                self.in_flight -= 1
+
+
+class AdmissionController:
+    def __init__(self, limits, retry_after=5, metrics=None):
+        self.gates = {name: Gate(*limit) for name, limit in limits.items() if limit[0] > 0}
+        self.retry_after = retry_after
+        self.metrics = metrics
+
+    def _inc(self, name, value=1, **labels):
+        if self.metrics:
+            self.metrics.inc(name, value, **labels)
+
+    # ---- request hooks ----
+    def before_request(self):
+        cls = classify(request.endpoint, request.method)
+        gate = self.gates.get(cls)
+        if gate is None:
+            return None
+        admitted, waited, reason = gate.acquire()
+        if waited:
+            self._inc("admission_queued_total", **{"class": cls})
+            self._inc("admission_queue_seconds_total", waited, **{"class": cls})
+        if not admitted:
+            self._inc("admission_shed_total", **{"class": cls, "reason": reason})
+            resp = make_response(SHED_BODY, 503)
+            resp.mimetype = "text/plain"
+            resp.headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+            resp.headers["Cache-Control"] = "no-store"
+            return resp
+        self._inc("admission_admitted_total", **{"class": cls})
+        g.admission_gate = gate
+        return None
+
+    def after_request(self, response):
+        # A streamed body is still being produced: hold the slot until it is closed
+        if response.is_streamed:
+            gate = g.pop("admission_gate", None)
+            if gate is not None:
+                response.call_on_close(gate.release)
+        return response
+
+    def teardown_request(self, exc=None):
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            gate.release()
+
+    def collect(self):
+        """Gauges for the metrics endpoint"""
+        gauges = {}
+        for cls, gate in self.gates.items():
+            gauges[f'admission_in_flight{{class="{cls}"}}'] = gate.in_flight
+            gauges[f'admission_waiting{{class="{cls}"}}'] = gate.waiting
+        return gauges
@@ -1,88 +1,71 @@
 import os
 import re
-import sqlite3
 import uuid
 import secrets
 import hashlib
 import base64
 import datetime
+import functools
 import hmac
-import smtplib
 import threading
-from email.mime.text import MIMEText
-from io import BytesIO
+import time
 
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, send_file, abort, flash, session, make_response
+    url_for, abort, flash, make_response, current_app, jsonify,
+    Response, stream_with_context
 )
 from werkzeug.utils import secure_filename
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# -------------------- App & Config --------------------
-app = Flask(__name__)
-app.secret_key = os.environ.get("APP_SECRET", "dev-secret-change-me")
-
-# Limits & folders
-app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # 10 MB
-ROOT = os.path.dirname(__file__)
-UPLOADS = os.path.join(ROOT, "uploads")
-os.makedirs(UPLOADS, exist_ok=True)
-DB_PATH = os.path.join(ROOT, "blackfile.db")
-
-# Email settings
-SMTP_HOST = os.environ.get("SMTP_HOST", "")
-SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
-SMTP_USER = os.environ.get("SMTP_USER", "")
-SMTP_PASS = os.environ.get("SMTP_PASS", "")
-FROM_EMAIL = os.environ.get("FROM_EMAIL", SMTP_USER or "no-reply@example.com")
-
-# Security settings
+
+import admission
+import blobcrypt
+import blobstore
+import store
+from jsonlog import configure_logging, get_logger, log_context, request_elapsed_ms, start_request_timer
+from metrics import Metrics, get_metrics, metrics_view
+from secret_store import DbSecretStore, MemorySecretStore
+from storage import StorageFull, StorageManager, get_storage
+from store import close_db, now_ts, token_bytes
+from token_filter import TokenFilter
+from transfer_cache import TransferCache
+
+# -------------------- Static config --------------------
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+log = get_logger("app")
+email_log = get_logger("email")
+
 ALLOWED_EXPIRY = {5, 10, 60}
-OTP_MAX_TRIES = int(os.environ.get("OTP_MAX_TRIES", "3"))
-LOCK_MIN = int(os.environ.get("LOCK_MIN", "10"))
 EMAIL_REGEX = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]+$")
 
-# -------------------- Database helpers --------------------
-def db():
-    con = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
-    con.row_factory = sqlite3.Row
-    return con
-
-def init_db():
-    con = db()
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS transfers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            token TEXT UNIQUE,
-            recipient_email TEXT,
-            otp_hash TEXT,
-            otp_salt TEXT,
-            key_id TEXT,
-            filename_orig TEXT,
-            filepath TEXT,
-            nonce_b64 TEXT,
-            sha256_hex TEXT,
-            created_at TIMESTAMP,
-            expires_at TIMESTAMP,
-            used INTEGER DEFAULT 0,
-            attempts INTEGER DEFAULT 0,
-            locked_until TIMESTAMP NULL,
-            downloaded_from_ip TEXT NULL
-        );
-    """)
-    # Add indexes for faster queries
-    con.execute("CREATE INDEX IF NOT EXISTS idx_token ON transfers(token);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_expires ON transfers(expires_at);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_used ON transfers(used);")
-    con.commit()
-    con.close()
-
-init_db()
+# Served for tokens the token filter rules out: no template, no DB query
+UNKNOWN_TOKEN_BODY = (
+    b"<!doctype html><meta charset=utf-8><title>Link not found - BlackFile</title>"
+    b"<p>This link does not exist or has expired.</p><p><a href=\"/\">BlackFile</a></p>"
+)
+
+# Blob writes take well under this; startup recovery leaves younger files alone
+RECOVERY_GRACE_SECONDS = 60
+# Recovery purges at most this many lost disk blobs, or this fraction of them;
+# more than that looks like an unmounted or wrong UPLOADS, not a crash
+RECOVERY_MAX_LOST = 3
+RECOVERY_MAX_LOST_FRACTION = 0.05
+
+# Per-profile overrides applied on top of the environment-derived defaults.
+# "optimized" carries over what app_optimized.py used to do on its own.
+PROFILES = {
+    "default": {},
+    "optimized": {
+        "SWEEP_EXPIRED_ON_INDEX": True,
+    },
+    "testing": {
+        "TESTING": True,
+        "MAINTENANCE_INTERVAL": 0,
+        "LOAD_DOTENV": False,
+        "SMTP_HOST": "",
+        "HOT_TIER_MB": 0,
+    },
+}
 
 # -------------------- Time helpers --------------------
 def to_dt(val):
@@ -101,79 +84,190 @@ def get_ist_time():
     return ist_now
 
 # -------------------- Crypto helpers --------------------
-def encrypt_file(plaintext_bytes: bytes):
-    key = AESGCM.generate_key(bit_length=256)
-    nonce = os.urandom(12)
-    aesgcm = AESGCM(key)
-    ciphertext = aesgcm.encrypt(nonce, plaintext_bytes, None)
-    return key, nonce, ciphertext
+GCM_TAG_BYTES = 16
 
 def decrypt_file(key: bytes, nonce: bytes, ciphertext: bytes):
+    """Single-message AES-GCM, as written before blobs were segmented"""
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
     aesgcm = AESGCM(key)
     return aesgcm.decrypt(nonce, ciphertext, None)
 
-def key_fingerprint(secret_key_bytes: bytes, token: str) -> str:
-    mac = hmac.new(app.secret_key.encode(), secret_key_bytes + token.encode(), hashlib.sha256).hexdigest()
-    return mac[:32]
+def _legacy_chunks(key: bytes, nonce: bytes, f):
+    from cryptography.exceptions import InvalidTag
+    try:
+        yield decrypt_file(key, nonce, f.read())
+    except InvalidTag:
+        raise blobcrypt.IntegrityError("blob failed authentication") from None
+
+def plaintext_chunks(row, secret_key: bytes, f):
+    """Plaintext of a transfer's blob (open as `f`), a segment at a time"""
+    if row["segment_size"]:
+        return blobcrypt.decrypt_segments(secret_key, row["nonce"], f, row["blob_size"], row["segment_size"],
+                                          pool=current_app.extensions.get("segment_pool"))
+    return _legacy_chunks(secret_key, row["nonce"], f)
+
+def plaintext_size(row) -> int:
+    if row["segment_size"]:
+        return blobcrypt.plaintext_size(row["blob_size"], row["segment_size"])
+    return row["blob_size"] - GCM_TAG_BYTES
+
+def key_fingerprint(secret_key_bytes: bytes, token: str) -> bytes:
+    mac = hmac.new(current_app.secret_key.encode(), secret_key_bytes + token.encode(), hashlib.sha256).digest()
+    return mac[:16]
 
 # -------------------- OTP helpers --------------------
 def gen_otp():
     """Fast and secure 6-digit OTP generation"""
     return f"{secrets.randbelow(1000000):06d}"
 
-def hash_otp(otp: str, salt: str):
-    return hashlib.sha256((salt + otp).encode()).hexdigest()
+def hash_otp(otp: str, salt: bytes) -> bytes:
+    # Salt is hashed in its hex form so hashes migrated from v1 still match
+    return hashlib.sha256((salt.hex() + otp).encode()).digest()
 
 # -------------------- Optimized Email helper --------------------
-def send_email_async(to_email: str, subject: str, html_body: str):
-    """Send email in background thread for better performance"""
-    def _send_email():
+def send_email_batch(messages):
+    """Send (to_email, subject, html_body) messages in one background thread
+    over a single SMTP session"""
+    cfg = current_app.config
+    smtp_host, smtp_port = cfg["SMTP_HOST"], cfg["SMTP_PORT"]
+    smtp_user, smtp_pass, from_email = cfg["SMTP_USER"], cfg["SMTP_PASS"], cfg["FROM_EMAIL"]
+    messages = list(messages)
+    ctx = dict(log_context(), stage="email")
+
+    def _send_emails():
         try:
-            if not (SMTP_HOST and SMTP_USER and SMTP_PASS):
-                print(f"[EMAIL] TO: {to_email} | SUBJECT: {subject[:50]}...")
+            if not (smtp_host and smtp_user and smtp_pass):
+                for to_email, subject, _ in messages:
+                    email_log.info("SMTP not configured; not sent", extra=dict(ctx, to=to_email, subject=subject[:50]))
                 return True
 
-            msg = MIMEText(html_body, "html")
-            msg["Subject"] = subject
-            msg["From"] = FROM_EMAIL
-            msg["To"] = to_email
+            # Imported here so processes that never send mail never pay for it
+            import smtplib
+            from email.mime.text import MIMEText
 
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
+            with smtplib.SMTP(smtp_host, smtp_port) as s:
                 s.starttls()
-                s.login(SMTP_USER, SMTP_PASS)
-                s.send_message(msg)
-            print(f"[EMAIL] ✅ Sent to {to_email}")
-        except Exception as e:
-            print(f"[EMAIL] ❌ Error: {e}")
+                s.login(smtp_user, smtp_pass)
+                for to_email, subject, html_body in messages:
+                    msg = MIMEText(html_body, "html")
+                    msg["Subject"] = subject
+                    msg["From"] = from_email
+                    msg["To"] = to_email
+                    try:
+                        s.send_message(msg)
+                        email_log.info("Email sent", extra=dict(ctx, to=to_email))
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # One bad address must not sink the rest of the batch
+                        email_log.warning("Recipient refused: %s", e, extra=dict(ctx, to=to_email))
+        except Exception:
+            email_log.error("Email batch failed", exc_info=True, extra=ctx)
     
     # Send email in background thread - non-blocking!
-    threading.Thread(target=_send_email, daemon=True).start()
+    threading.Thread(target=_send_emails, daemon=True).start()
     return True
 
+def send_email_async(to_email: str, subject: str, html_body: str):
+    """Send email in background thread for better performance"""
+    return send_email_batch([(to_email, subject, html_body)])
+
 # Keep old function for compatibility
 def send_email(to_email: str, subject: str, html_body: str):
     return send_email_async(to_email, subject, html_body)
 
 # -------------------- Utilities --------------------
 def client_ip():
-    return request.headers.get("X-Forwarded-For", request.remote_addr or "")
+    # X-Forwarded-For is only believed through ProxyFix (TRUSTED_PROXY_HOPS):
+    # a client can send any value, and the sender quota is keyed on this
+    return request.remote_addr or ""
 
 def is_expired(row):
-    expires_at = to_dt(row["expires_at"])
-    if not expires_at:
-        return True
-    return datetime.datetime.utcnow() >= expires_at
+    return now_ts() >= row["expires_at"]
+
+def expires_iso(row):
+    """UTC expiry in the format the verify page countdown expects"""
+    return _epoch_iso(row["expires_at"])
+
+@functools.lru_cache(maxsize=1024)
+def _epoch_iso(ts):
+    return to_dt(ts).isoformat() + 'Z'
+
+def remove_blob(path):
+    if not path:
+        return
+    tiers = current_app.extensions.get("blob_tiers")
+    for candidate in tiers.candidates(path) if tiers is not None else (path,):
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
 
-def purge_row_and_files(row):
+def open_blob(path):
+    """Open a blob for reading in whichever tier holds it now"""
+    tiers = current_app.extensions.get("blob_tiers")
+    if tiers is None:
+        return open(path, "rb")
+    first, other = tiers.candidates(path)
     try:
-        if row["filepath"]:
-            os.remove(row["filepath"])
+        return open(first, "rb")
     except FileNotFoundError:
-        pass
-    con = db()
-    con.execute("DELETE FROM transfers WHERE token=?", (row["token"],))
-    con.commit()
-    con.close()
+        return open(other, "rb")  # demoted since `path` was read
+
+def open_row_blob(row):
+    """The transfer's blob opened for reading, or None if it has none or
+    the file is gone"""
+    if row["blob_path"] is None:
+        return None
+    try:
+        return open_blob(row["blob_path"])
+    except FileNotFoundError:
+        return None
+
+def forget_transfer(token_b):
+    cache = current_app.extensions.get("transfer_cache")
+    if cache is not None:
+        cache.discard(token_b)
+
+def load_transfer(token_b):
+    """The transfer row, its immutable columns from the cache when this
+    worker has seen it; used/attempts/locked_until always come from the
+    database"""
+    cache = current_app.extensions.get("transfer_cache")
+    if cache is None:
+        return store.get_transfer(token_b)
+    meta = cache.get(token_b)
+    if meta is None:
+        row = store.get_transfer(token_b)
+        if row is not None:
+            cache.put(token_b, row)
+        return row
+    state = store.transfer_state(token_b)
+    if state is None:
+        cache.discard(token_b)  # purged or downloaded by another worker
+        return None
+    return dict(meta, **{key: state[key] for key in state.keys()})
+
+def purge_row_and_files(row, event="expired"):
+    # Fan-out rows share a blob; it goes only with the last reference
+    forget_transfer(row["token"])
+    generation, orphan = store.delete_transfer(row["token"], event)
+    remove_blob(orphan)
+    # A racing purge that found no row must not take the token out of the
+    # filter a second time: its counters are shared with live tokens.
+    token_filter = current_app.extensions.get("token_filter")
+    if token_filter is not None and generation is not None:
+        token_filter.discard(row["token"], generation)
+    return orphan
+
+def token_may_exist(token_b):
+    """False when the token is not stored, or was created on another worker
+    within the last TOKEN_FILTER_SYNC_SECONDS"""
+    token_filter = current_app.extensions.get("token_filter")
+    return token_filter is None or token_filter.might_contain(token_b)
+
+def unknown_token_response():
+    resp = make_response(UNKNOWN_TOKEN_BODY, 404)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
 
 def _notify_sender_download(row, ip):
     email = row["recipient_email"]
@@ -218,100 +312,180 @@ def _notify_sender_download(row, ip):
     """
     send_email(email, subject, html)
 
-def _bump_attempts_and_maybe_lock(token: str, attempts_now: int):
+def _bump_attempts_and_maybe_lock(token_b: bytes, attempts_now: int, event="otp_failed"):
     attempts_now = (attempts_now or 0) + 1
-    con = db()
-    if attempts_now >= OTP_MAX_TRIES:
-        locked_until = datetime.datetime.utcnow() + datetime.timedelta(minutes=LOCK_MIN)
-        con.execute(
-            "UPDATE transfers SET attempts=?, locked_until=? WHERE token=?",
-            (attempts_now, locked_until, token)
-        )
-        con.commit()
-        con.close()
+    if attempts_now >= current_app.config["OTP_MAX_TRIES"]:
+        locked_until = now_ts() + current_app.config["LOCK_MIN"] * 60
+        store.set_attempts(token_b, attempts_now, locked_until, event=event)
+        forget_transfer(token_b)
         return True
     else:
-        con.execute("UPDATE transfers SET attempts=? WHERE token=?", (attempts_now, token))
-        con.commit()
-        con.close()
+        store.set_attempts(token_b, attempts_now, event=event)
         return False
 
-# -------------------- Routes --------------------
-@app.route("/")
-def index():
-    resp = make_response(render_template("modern-index.html", allowed_expiry=sorted(ALLOWED_EXPIRY)))
-    # Cache static content for better performance
-    resp.headers["Cache-Control"] = "public, max-age=300"  # 5 minutes
-    return resp
+def sweep_expired():
+    """Purge every expired transfer (blob + row)"""
+    now = now_ts()
+    for row in store.expired_live_transfers(now):
+        purge_row_and_files(row)
+    store.delete_expired_used(now)
+    if current_app.config["SECRET_STORE"] == "db":
+        store.delete_expired_secrets(now)
+    retention = current_app.config["EVENT_RETENTION_DAYS"]
+    if retention:
+        store.prune_events(now - retention * 86400)
 
-@app.route("/upload", methods=["POST"])
-def upload():
-    try:
-        email = request.form.get("email", "").strip()
-        file = request.files.get("file")
-        expiry = int(request.form.get("expiry", "10"))
+def sweep_orphan_blobs(grace=None):
+    """Unlink blob files no blobs row references (left by a crash between
+    the write and the insert) and abandoned temp files, once they are
+    older than the grace period"""
+    if grace is None:
+        grace = current_app.config["ORPHAN_GRACE_SECONDS"]
+    directories = [current_app.config["UPLOADS"]]
+    tiers = current_app.extensions.get("blob_tiers")
+    if tiers is not None:
+        directories.append(tiers.hot_dir)
+    # By name: a blob being demoted is in both tiers under one row
+    known = {os.path.basename(path) for path in store.blob_paths()}
+    cutoff = time.time() - grace
+    removed = 0
+    for directory in directories:
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            orphan = name.endswith(".blob") and name not in known
+            try:
+                if (orphan or name.endswith(blobstore.TEMP_SUFFIX)) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        log.info("Removed %d orphaned blob files", removed, extra={"stage": "maintenance"})
+    return removed
 
-        if expiry not in ALLOWED_EXPIRY:
-            flash("Invalid expiry option.")
-            return redirect(url_for("index"))
+def recover_blobs():
+    """Startup pass: the row is inserted only after its blob is durable, so
+    a row whose file is missing or short lost it to a crash (possible with
+    BLOB_DURABILITY=none). Those transfers are purged; files without rows
+    go through sweep_orphan_blobs.
 
-        if not EMAIL_REGEX.match(email):
-            flash("Please enter a valid email address.")
-            return redirect(url_for("index"))
+    Purging cannot be undone, so nothing is purged when UPLOADS does not
+    exist or when more disk blobs are lost than a crash could explain
+    (storage not mounted yet, wrong path); that is logged for an operator.
+    Hot-tier blobs are expected to be gone after a reboot and always go."""
+    uploads = current_app.config["UPLOADS"]
+    if not os.path.isdir(uploads):
+        log.error("Blob recovery skipped: %s does not exist (not mounted?)", uploads,
+                  extra={"stage": "recovery"})
+        get_metrics().inc("blob_recovery_skipped_total")
+        return 0, 0
+    tiers = current_app.extensions.get("blob_tiers")
+    lost, disk_blobs, disk_lost = [], 0, 0
+    for blob in store.blob_files():
+        hot = tiers is not None and tiers.is_hot(blob["path"])
+        path = tiers.resolve(blob["path"]) if tiers is not None else blob["path"]
+        try:
+            intact = os.path.getsize(path) == blob["size"]
+        except OSError:
+            intact = False
+        disk_blobs += not hot
+        if not intact:
+            lost.append(blob["blob_id"])
+            disk_lost += not hot
+    if disk_lost > max(RECOVERY_MAX_LOST, disk_blobs * RECOVERY_MAX_LOST_FRACTION):
+        log.error("Blob recovery skipped: %d of %d blobs in %s are missing or short; "
+                  "check the storage, then purge by hand if they are really gone",
+                  disk_lost, disk_blobs, uploads, extra={"stage": "recovery"})
+        get_metrics().inc("blob_recovery_skipped_total")
+        return 0, 0
+    purged = 0
+    for blob_id in lost:
+        for row in store.transfers_for_blob(blob_id):
+            purge_row_and_files(row, event="purged")
+            purged += 1
+    if purged:
+        log.warning("Purged %d transfers whose blob did not survive", purged, extra={"stage": "recovery"})
+        get_metrics().inc("blob_recovery_purged_total", purged)
+    # Any write still in flight on another worker is younger than this
+    return purged, sweep_orphan_blobs(grace=min(RECOVERY_GRACE_SECONDS, current_app.config["ORPHAN_GRACE_SECONDS"]))
 
-        if not file or file.filename == "":
-             flash("Please choose a file.")
-             return redirect(url_for("index"))
-            
-        if not file.content_type:
-            flash("Invalid file type.")
-            return redirect(url_for("index"))
+def demote_hot_blobs():
+    """Move blobs from the RAM tier to disk, longest-lived first, until
+    the tier is back within its budget; returns how many moved"""
+    tiers = current_app.extensions["blob_tiers"]
+    excess = tiers.hot_bytes() - tiers.budget
+    moved = 0
+    for blob in store.blobs_in(tiers.hot_dir):
+        if excess <= 0:
+            break
+        hot_path = blob["path"]
+        disk_path = os.path.join(tiers.disk_dir, os.path.basename(hot_path))
+        try:
+            with open(hot_path, "rb") as f:
+                current_app.extensions["blob_writer"].write(disk_path, iter(lambda: f.read(1024 * 1024), b""))
+        except FileNotFoundError:
+            continue  # downloaded or purged meanwhile
+        if not store.move_blob(blob["blob_id"], hot_path, disk_path):
+            remove_blob(disk_path)  # purged while it was being copied
+            continue
+        try:
+            os.remove(hot_path)
+        except FileNotFoundError:
+            pass
+        excess -= blob["size"]
+        moved += 1
+    if moved:
+        get_metrics().inc("blob_demotions_total", moved)
+        log.info("Demoted %d blobs from the hot tier to disk", moved, extra={"stage": "maintenance"})
+    return moved
 
-        filename_orig = secure_filename(file.filename)
-        file_bytes = file.read()
-        if not file_bytes:
-            flash("Uploaded file is empty.")
-            return redirect(url_for("index"))
+def recover_blobs_once():
+    """Maintenance task: one recovery pass per process, the first time it
+    holds the lease, so two workers or nodes never purge at once"""
+    state = current_app.extensions["blob_recovery"]
+    if state["pid"] != os.getpid():
+        state["pid"] = os.getpid()
+        recover_blobs()
 
-        sha256_hex = hashlib.sha256(file_bytes).hexdigest()
+# -------------------- Routes --------------------
+def index():
+    resp = make_response(render_template("modern-index.html", allowed_expiry=sorted(ALLOWED_EXPIRY)))
+    # Cache static content for better performance
+    resp.headers["Cache-Control"] = "public, max-age=300"  # 5 minutes
+    return resp
 
-        # Encrypt file at rest
-        secret_key, nonce, ciphertext = encrypt_file(file_bytes)
-        token = uuid.uuid4().hex
-        blob_path = os.path.join(UPLOADS, f"{token}.blob")
+def parse_recipients(raw: str):
+    """Unique addresses from the email field; more than one means fan-out"""
+    recipients = []
+    seen = set()
+    for part in re.split(r"[,;\s]+", raw):
+        if part and part.lower() not in seen:
+            seen.add(part.lower())
+            recipients.append(part)
+    return recipients
 
-        with open(blob_path, "wb") as f:
-            f.write(ciphertext)
+def check_transfer_request(recipients, expiry):
+    """Validation shared by the upload form and the API; returns an error
+    message, or None when the request is acceptable"""
+    if expiry not in ALLOWED_EXPIRY:
+        return "Invalid expiry option."
+    if not recipients or not all(EMAIL_REGEX.match(email) for email in recipients):
+        return "Please enter a valid email address."
+    if len(recipients) > current_app.config["MAX_RECIPIENTS"]:
+        return f"You can send to at most {current_app.config['MAX_RECIPIENTS']} recipients at once."
+    return None
 
-        # OTP + key ID
-        otp = gen_otp()
-        salt = uuid.uuid4().hex
-        otp_hash = hash_otp(otp, salt)
-        k_id = key_fingerprint(secret_key, token)
-
-        now = datetime.datetime.utcnow()
-        expires_at = now + datetime.timedelta(minutes=expiry)
-
-        con = db()
-        con.execute("""
-            INSERT INTO transfers (
-                id, token, recipient_email, otp_hash, otp_salt, key_id,
-                filename_orig, filepath, nonce_b64, sha256_hex, created_at, expires_at
-            ) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            token, email, otp_hash, salt, k_id,
-            filename_orig, blob_path, base64.b64encode(nonce).decode(),
-            sha256_hex, now, expires_at
-        ))
-        con.commit()
-        con.close()
+def verify_link(token: str) -> str:
+    return request.url_root.rstrip("/") + url_for("verify", token=token)
 
-        link = request.url_root.rstrip("/") + url_for("verify", token=token)
-        
-        # Convert UTC expires_at to IST for email display
-        ist_expires_at = expires_at + datetime.timedelta(hours=5, minutes=30)
-        
-        html = f"""
+def transfer_email_html(link: str, otp: str, filename_orig: str, expires_at: int) -> str:
+    # Convert UTC expires_at to IST for email display
+    ist_expires_at = to_dt(expires_at) + datetime.timedelta(hours=5, minutes=30)
+    return f"""
             <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
                 <h2 style="color: #333;">BlackFile Secure Transfer</h2>
                 <p>You've received a secure file transfer via BlackFile.</p>
@@ -338,47 +512,203 @@ def upload():
                     This is an automated message from BlackFile secure transfer service.</p>
             </div>
         """
-        send_email(email, "Your BlackFile secure link", html)
 
-        secret_key_b64 = base64.urlsafe_b64encode(secret_key).decode().rstrip("=")
-        session[f"secret_{token}"] = secret_key_b64
-        return redirect(url_for("sent", token=token))
+def send_transfer_emails(issued, filename_orig: str, expires_at: int):
+    send_email_batch(
+        (email, "Your BlackFile secure link",
+         transfer_email_html(verify_link(token), otp, filename_orig, expires_at))
+        for token, email, otp in issued
+    )
+
+def encode_secret_key(secret_key: bytes) -> str:
+    return base64.urlsafe_b64encode(secret_key).decode().rstrip("=")
+
+def transfer_state(row) -> str:
+    """"used", "expired", "locked" or "active", without side effects"""
+    if row["used"]:
+        return "used"
+    if is_expired(row):
+        return "expired"
+    if row["locked_until"] and now_ts() < row["locked_until"]:
+        return "locked"
+    return "active"
+
+def create_transfers(file_bytes: bytes, filename_orig: str, recipients, expiry: int, sender: str = ""):
+    """Encrypt once, store one blob and one token row per recipient.
+
+    Every recipient gets its own token, OTP, lockout state and expiry; all of
+    them share the ciphertext and the secret key. Space for the blob is
+    reserved against the storage quotas first (StorageFull if there is none).
+    Returns (secret_key, [(token, email, otp), ...], sha256, expires_at).
+    """
+    with get_storage().reservation(sender, blobcrypt.ciphertext_size(len(file_bytes))) as reserved:
+        return _create_transfers(file_bytes, filename_orig, recipients, expiry, sender, reserved)
+
+# Order of the row tuples handed to store.insert_transfers
+INSERTED_COLUMNS = (
+    "token", "recipient_email", "otp_hash", "otp_salt", "key_id",
+    "filename_orig", "nonce", "sha256", "created_at", "expires_at",
+)
+
+def _create_transfers(file_bytes, filename_orig, recipients, expiry, sender, reserved):
+    sha256 = hashlib.sha256(file_bytes).digest()
+
+    # Encrypt file at rest, one segment at a time
+    secret_key, nonce = blobcrypt.new_key(), blobcrypt.new_nonce()
+    blob_id = uuid.uuid4().bytes
+    uploads = current_app.config["UPLOADS"]
+    os.makedirs(uploads, exist_ok=True)
+    name = f"{blob_id.hex()}.blob"
+    chunks = blobcrypt.encrypt_segments(
+        secret_key, nonce, file_bytes, pool=current_app.extensions.get("segment_pool")
+    )
+
+    # Durable under its final name before any row can point at it
+    tiers = current_app.extensions.get("blob_tiers")
+    if tiers is not None:
+        blob_path, blob_size = tiers.write(
+            name, blobcrypt.ciphertext_size(len(file_bytes)), expiry * 60,
+            chunks, current_app.extensions["blob_writer"],
+        )
+    else:
+        blob_path = os.path.join(uploads, name)
+        blob_size = current_app.extensions["blob_writer"].write(blob_path, chunks)
+
+    now = now_ts()
+    expires_at = now + expiry * 60
+
+    issued, rows = [], []
+    for email in recipients:
+        # OTP + key ID per recipient
+        token = uuid.uuid4().hex
+        otp = gen_otp()
+        salt = secrets.token_bytes(16)
+        rows.append((
+            bytes.fromhex(token), email, hash_otp(otp, salt), salt,
+            key_fingerprint(secret_key, token), filename_orig, nonce, sha256,
+            now, expires_at
+        ))
+        issued.append((token, email, otp))
+
+    try:
+        generation = store.insert_transfers(
+            blob_id, blob_path, blob_size, rows, sender=sender, reserved=reserved,
+            segment_size=blobcrypt.SEGMENT_SIZE, duration_ms=request_elapsed_ms() or 0
+        )
+    except Exception:
+        remove_blob(blob_path)  # no row will ever point at it
+        raise
+
+    token_filter = current_app.extensions.get("token_filter")
+    if token_filter is not None:
+        for row in rows:
+            token_filter.add(row[0], generation)
+    cache = current_app.extensions.get("transfer_cache")
+    if cache is not None:
+        blob = {"blob_id": blob_id, "blob_path": blob_path, "blob_size": blob_size,
+                "segment_size": blobcrypt.SEGMENT_SIZE}
+        for row in rows:
+            cache.put(row[0], dict(zip(INSERTED_COLUMNS, row), **blob))
+    return secret_key, issued, sha256, expires_at
+
+def upload():
+    try:
+        recipients = parse_recipients(request.form.get("email", ""))
+        file = request.files.get("file")
+        expiry = int(request.form.get("expiry", "10"))
+
+        error = check_transfer_request(recipients, expiry)
+        if error:
+            flash(error)
+            return redirect(url_for("index"))
+
+        if not file or file.filename == "":
+             flash("Please choose a file.")
+             return redirect(url_for("index"))
+            
+        if not file.content_type:
+            flash("Invalid file type.")
+            return redirect(url_for("index"))
+
+        filename_orig = secure_filename(file.filename)
+        file_bytes = file.read()
+        if not file_bytes:
+            flash("Uploaded file is empty.")
+            return redirect(url_for("index"))
+
+        try:
+            secret_key, issued, _, expires_at = create_transfers(
+                file_bytes, filename_orig, recipients, expiry, sender=client_ip()
+            )
+        except StorageFull as e:
+            if e.reason == "sender":
+                flash("You have too many active transfers. Please wait for some to be downloaded or expire.")
+            else:
+                flash("BlackFile is out of storage space right now. Please try again later.")
+            return make_response(render_template("modern-index.html", allowed_expiry=sorted(ALLOWED_EXPIRY)), 507)
+
+        send_transfer_emails(issued, filename_orig, expires_at)
+
+        token = issued[0][0]
+        resp = redirect(url_for("sent", token=token))
+        remember_secret(resp, token, encode_secret_key(secret_key), expires_at)
+        return resp
     except Exception as e:
-        app.logger.error(f"Upload error: {str(e)}")
+        log.error("Upload failed: %s", e, exc_info=True, extra={"stage": "upload"})
         flash("An error occurred during file upload. Please try again.")
         return redirect(url_for("index"))
 
-@app.route("/sent/<token>")
+SENT_COOKIE = "bf_sent"
+
+def get_secret_store():
+    return current_app.extensions["secret_store"]
+
+def remember_secret(resp, token: str, secret: str, expires_at: int):
+    """Hold the secret server-side for /sent/<token>; the browser gets a
+    handle in a cookie sent to that path only"""
+    handle = get_secret_store().put(bytes.fromhex(token), secret, expires_at)
+    resp.set_cookie(
+        SENT_COOKIE, handle, max_age=max(1, expires_at - now_ts()), path=f"/sent/{token}",
+        secure=current_app.config["SESSION_COOKIE_SECURE"], httponly=True, samesite="Lax",
+    )
+
 def sent(token):
-    secret = session.pop(f"secret_{token}", None)
+    token_b = token_bytes(token)
+    secret = None
+    if token_b is not None:
+        secret = get_secret_store().pop(token_b, request.cookies.get(SENT_COOKIE))
     if secret is None:
         flash("This confirmation page is viewable only once.")
         return redirect(url_for("index"))
 
-    con = db()
-    row = con.execute("SELECT * FROM transfers WHERE token=?", (token,)).fetchone()
-    con.close()
+    row = store.get_transfer(token_b)
     if not row:
         abort(404)
 
-    created_at = to_dt(row["created_at"]) or datetime.datetime.utcnow()
-    expires_at = to_dt(row["expires_at"]) or (created_at + datetime.timedelta(minutes=10))
-    expiry_minutes = max(1, int((expires_at - created_at).total_seconds() // 60))
+    expiry_minutes = max(1, (row["expires_at"] - row["created_at"]) // 60)
+    recipients = [
+        (r["recipient_email"], verify_link(r["token"].hex()))
+        for r in store.transfers_for_blob(row["blob_id"])
+    ]
 
-    return render_template(
+    resp = make_response(render_template(
         "modern-sent.html",
-        link=request.url_root.rstrip("/") + url_for("verify", token=token),
-        email=row["recipient_email"],
+        link=verify_link(token),
+        email=", ".join(email for email, _ in recipients),
+        recipients=recipients,
         secret_key=secret,
-        sha256_hex=row["sha256_hex"],
+        sha256_hex=row["sha256"].hex(),
         expiry_minutes=expiry_minutes
-    )
+    ))
+    resp.delete_cookie(SENT_COOKIE, path=f"/sent/{token}")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
 
-@app.route("/verify/<token>", methods=["GET", "POST"])
 def verify(token):
-    con = db()
-    row = con.execute("SELECT * FROM transfers WHERE token=?", (token,)).fetchone()
-    con.close()
+    token_b = token_bytes(token)
+    if token_b is None or not token_may_exist(token_b):
+        return unknown_token_response()
+    row = load_transfer(token_b)
 
     if not row:
         abort(404)
@@ -392,22 +722,16 @@ def verify(token):
 
     locked_until = row["locked_until"]
     if locked_until:
-        lu = to_dt(locked_until)
-        now = datetime.datetime.utcnow()
-        if lu and now < lu:
-            minutes_left = max(1, int((lu - now).total_seconds() // 60))
+        now = now_ts()
+        if now < locked_until:
+            minutes_left = max(1, (locked_until - now) // 60)
             return render_template("modern-verify.html", token=token, locked=True, minutes_left=minutes_left)
 
     if request.method == "GET":
-        # Format expires_at for JavaScript
-        expires_at = to_dt(row["expires_at"])
-        expires_at_iso = expires_at.isoformat() + 'Z' if expires_at else None
-        
         resp = make_response(render_template(
             "modern-verify.html", 
             token=token, 
-            expires_at=expires_at_iso,
-            expires_at_raw=expires_at
+            expires_at=expires_iso(row)
         ))
         resp.headers["Cache-Control"] = "no-store"
         return resp
@@ -416,26 +740,21 @@ def verify(token):
     secret_key_b64 = request.form.get("secret_key", "").strip()
 
     if not otp_input or not secret_key_b64:
-        expires_at = to_dt(row["expires_at"])
-        expires_at_iso = expires_at.isoformat() + 'Z' if expires_at else None
+        expires_at_iso = expires_iso(row)
         return render_template("modern-verify.html", token=token, error="Please enter both OTP and Secret Key.", expires_at=expires_at_iso)
 
-    if hash_otp(otp_input, row["otp_salt"]) != row["otp_hash"]:
-        was_locked = _bump_attempts_and_maybe_lock(token, row["attempts"])
+    if not hmac.compare_digest(hash_otp(otp_input, row["otp_salt"]), row["otp_hash"]):
+        was_locked = _bump_attempts_and_maybe_lock(token_b, row["attempts"])
         
-        con = db()
-        row2 = con.execute("SELECT * FROM transfers WHERE token=?", (token,)).fetchone()
-        con.close()
+        row2 = store.transfer_state(token_b)
         
-        attempts_remaining = OTP_MAX_TRIES - row2["attempts"]
+        attempts_remaining = current_app.config["OTP_MAX_TRIES"] - row2["attempts"]
         
-        if was_locked or (row2["locked_until"] and to_dt(row2["locked_until"]) > datetime.datetime.utcnow()):
-            lu2 = to_dt(row2["locked_until"])
-            minutes_left = max(1, int((lu2 - datetime.datetime.utcnow()).total_seconds() // 60))
+        if was_locked or (row2["locked_until"] and row2["locked_until"] > now_ts()):
+            minutes_left = max(1, (row2["locked_until"] - now_ts()) // 60)
             return render_template("modern-verify.html", token=token, locked=True, minutes_left=minutes_left)
         else:
-            expires_at = to_dt(row["expires_at"])
-            expires_at_iso = expires_at.isoformat() + 'Z' if expires_at else None
+            expires_at_iso = expires_iso(row)
             return render_template("modern-verify.html", token=token, wrong_otp=True, 
                                   attempts_remaining=attempts_remaining, expires_at=expires_at_iso)
 
@@ -443,67 +762,637 @@ def verify(token):
         pad = "=" * (-len(secret_key_b64) % 4)
         secret_key = base64.urlsafe_b64decode(secret_key_b64 + pad)
     except Exception:
-        _bump_attempts_and_maybe_lock(token, row["attempts"])
-        expires_at = to_dt(row["expires_at"])
-        expires_at_iso = expires_at.isoformat() + 'Z' if expires_at else None
+        _bump_attempts_and_maybe_lock(token_b, row["attempts"], event="key_failed")
+        expires_at_iso = expires_iso(row)
         return render_template("modern-verify.html", token=token, error="Invalid key format. Please paste the exact Secret Key.", expires_at=expires_at_iso)
 
-    if key_fingerprint(secret_key, token) != row["key_id"]:
-        _bump_attempts_and_maybe_lock(token, row["attempts"])
-        expires_at = to_dt(row["expires_at"])
-        expires_at_iso = expires_at.isoformat() + 'Z' if expires_at else None
+    if not hmac.compare_digest(key_fingerprint(secret_key, token), row["key_id"]):
+        _bump_attempts_and_maybe_lock(token_b, row["attempts"], event="key_failed")
+        expires_at_iso = expires_iso(row)
         return render_template("modern-verify.html", token=token, wrong_secret=True, expires_at=expires_at_iso)
 
+    if wants_stream():
+        return stream_download(token, row, secret_key)
+
+    f = open_row_blob(row)
+    if f is None:
+        purge_row_and_files(row, event="purged")
+        return render_template("modern-verify.html", token=token, already_erased=True)
     try:
-        with open(row["filepath"], "rb") as f:
-            ciphertext = f.read()
-    except FileNotFoundError:
-        purge_row_and_files(row)
+        with f:
+            plaintext = b"".join(blobcrypt.verified(plaintext_chunks(row, secret_key, f), row["sha256"]))
+    except blobcrypt.IntegrityError as e:
+        return integrity_failure(token, row, e)
+    except Exception as e:
+        log.error("Decryption failed: %s", e, extra={"stage": "decrypt"})
+        expires_at_iso = expires_iso(row)
+        return render_template("modern-verify.html", token=token, error="Decryption failed. Please check your Secret Key.", expires_at=expires_at_iso)
+
+    # Mark as downloaded in database; drops this row's blob reference
+    claimed, orphan = store.mark_downloaded(
+        token_b, client_ip(), duration_ms=request_elapsed_ms() or 0, delivered=len(plaintext)
+    )
+    forget_transfer(token_b)
+    if not claimed:
+        return render_template("modern-verify.html", token=token, already_erased=True)
+
+    # Send download notification
+    _notify_sender_download(row, client_ip())
+    get_metrics().inc("downloads_total", delivery="page")
+
+    # Encode file data for client-side download
+    file_data_b64 = base64.b64encode(plaintext).decode()
+
+    # Remove the encrypted file once no other recipient still needs it
+    remove_blob(orphan)
+
+    # Return success page with auto-download and redirect
+    return render_template(
+        "download-success.html",
+        filename=row["filename_orig"],
+        file_data=file_data_b64,
+        file_size=len(plaintext)
+    )
+
+def wants_stream():
+    """Clients asking for application/octet-stream get the file itself
+    instead of the download page"""
+    best = request.accept_mimetypes.best_match(["text/html", "application/octet-stream"])
+    return best == "application/octet-stream"
+
+def digest_headers(sha256: bytes):
+    """RFC 9530 Repr-Digest plus the older RFC 3230 Digest form"""
+    b64 = base64.b64encode(sha256).decode()
+    return {"Repr-Digest": f"sha-256=:{b64}:", "Digest": f"sha-256={b64}"}
+
+def integrity_failure(token, row, error):
+    get_metrics().inc("download_corruption_total")
+    log.error("Integrity check failed: %s", error, extra={"stage": "integrity"})
+    return render_template(
+        "modern-verify.html", token=token, expires_at=expires_iso(row),
+        error="This file failed its integrity check and cannot be delivered."
+    ), 500
+
+def stream_download(token, row, secret_key):
+    """Send the plaintext as an attachment while hashing it; a mismatch cuts
+    the body short of its Content-Length, withholding the final segment"""
+    token_b = row["token"]
+    f = open_row_blob(row)
+    if f is None:
+        purge_row_and_files(row, event="purged")
         return render_template("modern-verify.html", token=token, already_erased=True)
 
+    chunks = blobcrypt.verified(plaintext_chunks(row, secret_key, f), row["sha256"])
     try:
-        nonce = base64.b64decode(row["nonce_b64"])
-        plaintext = decrypt_file(secret_key, nonce, ciphertext)
+        # Authenticate the start of the blob before the link is spent
+        first = next(chunks, b"")
+    except blobcrypt.IntegrityError as e:
+        f.close()
+        return integrity_failure(token, row, e)
 
-        # Mark as downloaded in database
-        con = db()
-        con.execute("UPDATE transfers SET used=1, downloaded_from_ip=? WHERE token=?", (client_ip(), token))
-        con.commit()
-        con.close()
+    claimed, orphan = store.mark_downloaded(token_b, client_ip(), duration_ms=request_elapsed_ms() or 0)
+    forget_transfer(token_b)
+    if not claimed:
+        f.close()
+        return render_template("modern-verify.html", token=token, already_erased=True)
+    _notify_sender_download(row, client_ip())
+    metrics = get_metrics()
+    metrics.inc("downloads_total", delivery="stream")
 
-        # Send download notification
-        _notify_sender_download(row, client_ip())
+    started = time.perf_counter()
 
-        # Encode file data for client-side download
-        file_data_b64 = base64.b64encode(plaintext).decode()
-        
-        # Schedule cleanup - remove encrypted file from server
+    def generate():
+        sent = 0
         try:
-            os.remove(row["filepath"])
-        except FileNotFoundError:
-            pass
+            yield first
+            sent += len(first)
+            for chunk in chunks:
+                yield chunk
+                sent += len(chunk)
+            # stream_with_context keeps the request (and its connection) open
+            store.record_event("downloaded", token_b, sent, (time.perf_counter() - started) * 1000)
+        except blobcrypt.IntegrityError as e:
+            metrics.inc("download_corruption_total")
+            log.error("Integrity check failed mid-stream, aborting response: %s", e,
+                      extra={"stage": "integrity"})
+            raise
+        finally:
+            f.close()
+            remove_blob(orphan)
 
-        # Return success page with auto-download and redirect
-        return render_template(
-            "download-success.html",
-            filename=row["filename_orig"],
-            file_data=file_data_b64,
-            file_size=len(plaintext)
-        )
-    except Exception as e:
-        app.logger.error(f"Decryption error: {e}")
-        expires_at = to_dt(row["expires_at"])
-        expires_at_iso = expires_at.isoformat() + 'Z' if expires_at else None
-        return render_template("modern-verify.html", token=token, error="Decryption failed. Please check your Secret Key.", expires_at=expires_at_iso)
+    resp = Response(stream_with_context(generate()), mimetype="application/octet-stream")
+    resp.headers["Content-Length"] = str(plaintext_size(row))
+    resp.headers["Content-Disposition"] = f'attachment; filename="{secure_filename(row["filename_orig"]) or "download"}"'
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers.update(digest_headers(row["sha256"]))
+    return resp
 
-@app.errorhandler(404)
 def not_found(e):
+    if is_api_request():
+        return api_error("Not found.", 404)
     return render_template("modern-404.html"), 404
 
-@app.errorhandler(413)
 def too_large(e):
+    if is_api_request():
+        return api_error("File too large. Maximum size is 10MB.", 413)
     flash("File too large. Maximum size is 10MB.")
     return redirect(url_for("index"))
 
+# -------------------- JSON API (/api/v1) --------------------
+# The same operations as the HTML flow for automation, behind a bearer
+# token. OTPs still only go out by email; the caller gets the links and
+# the secret key.
+API_PREFIX = "/api/v1"
+
+def is_api_request():
+    return request.path.startswith(API_PREFIX + "/")
+
+def api_error(message: str, status: int):
+    resp = jsonify(error=message)
+    resp.status_code = status
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def api_authorized():
+    token = current_app.config["API_TOKEN"]
+    supplied = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+
+def api_transfer_json(row):
+    token = row["token"].hex()
+    return {
+        "token": token,
+        "recipient": row["recipient_email"],
+        "filename": row["filename_orig"],
+        "state": transfer_state(row),
+        "created_at": row["created_at"],
+        "expires_at": row["expires_at"],
+        "attempts": row["attempts"],
+        "locked_until": row["locked_until"],
+    }
+
+def api_lookup(token):
+    # No token filter here: API callers are authenticated, not scanners,
+    # and must see a token minted on another worker a moment ago.
+    token_b = token_bytes(token)
+    if token_b is None:
+        return None
+    return store.get_transfer(token_b)
+
+def api_before_request():
+    if is_api_request() and not api_authorized():
+        if not current_app.config["API_TOKEN"]:
+            return api_error("The API is disabled; set API_TOKEN to enable it.", 403)
+        return api_error("Unauthorized.", 401)
+
+def api_create_transfer():
+    """Multipart like the upload form (file, recipients, expiry), or a raw
+    body with filename/recipients/expiry in the query string so clients can
+    stream the file without multipart encoding"""
+    if request.mimetype == "multipart/form-data":
+        params = request.form
+        file = request.files.get("file")
+        filename = file.filename if file else ""
+        file_bytes = file.read() if file else b""
+    else:
+        params = request.args
+        filename = params.get("filename", "")
+        file_bytes = request.get_data(cache=False)
+
+    recipients = parse_recipients(params.get("recipients", params.get("email", "")))
+    try:
+        expiry = int(params.get("expiry", "10"))
+    except ValueError:
+        expiry = None
+    error = check_transfer_request(recipients, expiry)
+    if error:
+        return api_error(error, 400)
+    filename_orig = secure_filename(filename)
+    if not filename_orig:
+        return api_error("A filename is required.", 400)
+    if not file_bytes:
+        return api_error("Uploaded file is empty.", 400)
+
+    try:
+        secret_key, issued, sha256, expires_at = create_transfers(
+            file_bytes, filename_orig, recipients, expiry, sender=client_ip()
+        )
+    except StorageFull as e:
+        return api_error(f"Out of storage ({e.reason} limit).", 507)
+    except Exception as e:
+        log.error("API upload failed: %s", e, exc_info=True, extra={"stage": "api_upload"})
+        return api_error("An error occurred during file upload.", 500)
+
+    send_transfer_emails(issued, filename_orig, expires_at)
+
+    resp = jsonify(
+        secret_key=encode_secret_key(secret_key),
+        sha256=sha256.hex(),
+        filename=filename_orig,
+        expires_at=expires_at,
+        transfers=[
+            {"token": token, "recipient": email, "link": verify_link(token),
+             "status_url": url_for("api_transfer", token=token, _external=True)}
+            for token, email, _ in issued
+        ],
+    )
+    resp.status_code = 201
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def api_transfer(token):
+    row = api_lookup(token)
+    if not row:
+        return api_error("Not found.", 404)
+    if request.method == "DELETE":
+        # Revokes this recipient only; the blob goes with its last token
+        purge_row_and_files(row, event="revoked")
+        return jsonify(token=token, state="revoked")
+    resp = jsonify(api_transfer_json(row))
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+MAX_STATS_HOURS = 24 * 90
+
+def api_hourly_stats():
+    """Event counts, bytes and total durations per hour and kind, read
+    from the rollup table only"""
+    try:
+        hours = int(request.args.get("hours", "24"))
+    except ValueError:
+        return api_error("hours must be an integer.", 400)
+    hours = min(max(hours, 1), MAX_STATS_HOURS)
+    now = now_ts()
+    since = now - now % 3600 - (hours - 1) * 3600
+    buckets, totals = {}, {}
+    for row in store.hourly_usage(since):
+        stats = {"events": row["events"], "bytes": row["bytes"], "duration_ms": row["duration_ms"]}
+        buckets.setdefault(row["hour"], {"hour": row["hour"]})[row["kind"]] = stats
+        total = totals.setdefault(row["kind"], dict.fromkeys(stats, 0))
+        for key, value in stats.items():
+            total[key] += value
+    resp = jsonify(since=since, hours=list(buckets.values()), totals=totals)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def log_request(response):
+    log.info("%s %s %s", request.method, request.url_rule or "<unmatched>", response.status_code,
+             extra={"stage": "request", "status": response.status_code, "ip": client_ip()})
+    return response
+
+# -------------------- Static assets --------------------
+def static_version(endpoint, values):
+    """Add ?v=<content hash> to static URLs so bundles can be cached for a
+    long time and still change the moment a file does"""
+    if endpoint != "static" or "filename" not in values:
+        return
+    path = os.path.join(current_app.static_folder, values["filename"])
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return
+    versions = current_app.extensions.setdefault("static_versions", {})
+    cached = versions.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = versions[path] = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+    values["v"] = cached[1]
+
+# -------------------- Startup checks --------------------
+# Placeholders shipped in .env.example / DEPLOYMENT.md and the old fallback
+PLACEHOLDER_SECRETS = {
+    "dev-secret-change-me",
+    "your-super-secret-key-here-change-me",
+    "your-super-secret-key-change-this",
+}
+
+def validate_config(app):
+    """Refuse to start a multi-node deployment with settings that only work
+    on one host; single-node setups get a warning instead"""
+    problems = []
+    secret = app.config.get("SECRET_KEY") or ""
+    if not secret or secret in PLACEHOLDER_SECRETS:
+        problems.append("APP_SECRET is unset or a placeholder; sessions are forgeable")
+    elif len(secret) < 32:
+        problems.append("APP_SECRET is shorter than 32 characters")
+    if app.config["MULTI_NODE"]:
+        if app.config["SECRET_STORE"] == "memory":
+            problems.append("SECRET_STORE=memory keeps secrets on one node; /sent/ pages served by another fail")
+        if not store.is_server_url(app.config["DATABASE_URL"]):
+            if app.config["SQLITE_WAL"]:
+                problems.append("SQLITE_WAL=1 needs every process on one host; WAL does not work over shared storage")
+            log.warning("MULTI_NODE with SQLite: every node must reach the same file on shared storage")
+        if not app.config["SESSION_COOKIE_SECURE"]:
+            log.warning("MULTI_NODE without SESSION_COOKIE_SECURE; enable it behind a TLS load balancer")
+    if not problems:
+        return
+    if app.config["MULTI_NODE"]:
+        raise RuntimeError("Invalid multi-node configuration: " + "; ".join(problems))
+    for problem in problems:
+        log.warning("Insecure configuration: %s", problem)
+
+# -------------------- App factory --------------------
+def create_app(profile=None, config=None):
+    """Build the Flask app for a profile ("default", "optimized", "testing").
+
+    Nothing here touches the database or the uploads folder; both are
+    initialised lazily on first use so a cold start only pays for Flask.
+    """
+    profile = profile or os.environ.get("BLACKFILE_PROFILE", "default")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile: {profile}")
+    overrides = dict(PROFILES[profile])
+    overrides.update(config or {})
+
+    if overrides.get("LOAD_DOTENV", True):
+        from dotenv import load_dotenv
+        # Load environment variables from .env file
+        load_dotenv()
+
+    app = Flask(__name__)
+
+    smtp_user = os.environ.get("SMTP_USER", "")
+    multi_node = os.environ.get("MULTI_NODE", "0") == "1"
+    app.config.update(
+        PROFILE=profile,
+        # Validated below: the fallback is refused in multi-node mode
+        SECRET_KEY=os.environ.get("APP_SECRET", "dev-secret-change-me"),
+        SESSION_COOKIE_SECURE=os.environ.get("SESSION_COOKIE_SECURE", "0") == "1",
+        SESSION_COOKIE_SAMESITE="Lax",
+        MAX_CONTENT_LENGTH=10 * 1024 * 1024,  # 10 MB
+        UPLOADS=os.path.join(ROOT, "uploads"),
+        DB_PATH=os.path.join(ROOT, "blackfile.db"),
+        # sqlite:///path or postgresql://...; empty means DB_PATH
+        DATABASE_URL=os.environ.get("DATABASE_URL", ""),
+        # Several instances behind a load balancer sharing DB + uploads
+        MULTI_NODE=multi_node,
+        NODE_NAME=os.environ.get("NODE_NAME", ""),
+        MAINTENANCE_INTERVAL=int(os.environ.get("MAINTENANCE_INTERVAL", "60")),
+        # 0 means three intervals, so a dead leader is replaced within a few ticks
+        MAINTENANCE_LEASE_SECONDS=int(os.environ.get("MAINTENANCE_LEASE_SECONDS", "0")),
+        ORPHAN_GRACE_SECONDS=int(os.environ.get("ORPHAN_GRACE_SECONDS", "3600")),
+        # WAL needs every process on one host; a file on shared storage keeps the rollback journal
+        SQLITE_WAL=os.environ.get("SQLITE_WAL", "0" if multi_node else "1") == "1",
+        SQLITE_MAINTENANCE=os.environ.get("SQLITE_MAINTENANCE", "1") == "1",
+        SQLITE_WAL_MAX_MB=int(os.environ.get("SQLITE_WAL_MAX_MB", "64")),
+        SQLITE_VACUUM_STEP_PAGES=int(os.environ.get("SQLITE_VACUUM_STEP_PAGES", "256")),
+        SQLITE_IDLE_SECONDS=float(os.environ.get("SQLITE_IDLE_SECONDS", "5")),
+        SQLITE_OPTIMIZE_HOURS=float(os.environ.get("SQLITE_OPTIMIZE_HOURS", "6")),
+        # Where the one-time secret waits for /sent/<token>: "db" works with any
+        # number of workers, "memory" only when every request hits one process
+        SECRET_STORE=os.environ.get("SECRET_STORE", "db"),
+        # Immutable transfer metadata cached per worker for /verify (0 = off)
+        TRANSFER_CACHE_SIZE=int(os.environ.get("TRANSFER_CACHE_SIZE", "4096")),
+        TRANSFER_CACHE_TTL=float(os.environ.get("TRANSFER_CACHE_TTL", "30")),
+        # Raw transfer events older than this are pruned; hourly rollups are kept (0 = keep all)
+        EVENT_RETENTION_DAYS=int(os.environ.get("EVENT_RETENTION_DAYS", "30")),
+        # fsync (every upload), group (batched every BLOB_GROUP_SYNC_MS) or none
+        BLOB_DURABILITY=os.environ.get("BLOB_DURABILITY", "fsync"),
+        BLOB_GROUP_SYNC_MS=float(os.environ.get("BLOB_GROUP_SYNC_MS", "5")),
+        BLOB_RECOVERY=os.environ.get("BLOB_RECOVERY", "1") == "1",
+        # RAM (tmpfs) tier for small blobs of short-expiry uploads (0 = off; node-local,
+        # so off in multi-node mode). HOT_TIER_DIR defaults to a folder in /dev/shm.
+        HOT_TIER_MB=int(os.environ.get("HOT_TIER_MB", "0" if multi_node else "64")),
+        HOT_TIER_DIR=os.environ.get("HOT_TIER_DIR", ""),
+        HOT_TIER_MAX_BLOB_MB=float(os.environ.get("HOT_TIER_MAX_BLOB_MB", "8")),
+        HOT_TIER_MAX_EXPIRY_MIN=int(os.environ.get("HOT_TIER_MAX_EXPIRY_MIN", "10")),
+        # In-flight caps per route class (static, page, verify, upload, download) as
+        # class=slots:queue:wait_ms, per worker process; beyond them requests get
+        # 503 + Retry-After
+        ADMISSION_CONTROL=os.environ.get("ADMISSION_CONTROL", "1") == "1",
+        ADMISSION_LIMITS=os.environ.get("ADMISSION_LIMITS", admission.DEFAULT_LIMITS),
+        ADMISSION_RETRY_AFTER=int(os.environ.get("ADMISSION_RETRY_AFTER", "5")),
+        # Processes sealing/opening blob segments (1 = inline), and how many
+        # 1 MB batches may be in flight ahead of the writer (0 = 2 per worker)
+        CRYPTO_WORKERS=int(os.environ.get("CRYPTO_WORKERS", "1")),
+        CRYPTO_WINDOW=int(os.environ.get("CRYPTO_WINDOW", "0")),
+        # Email settings
+        SMTP_HOST=os.environ.get("SMTP_HOST", ""),
+        SMTP_PORT=int(os.environ.get("SMTP_PORT", "587")),
+        SMTP_USER=smtp_user,
+        SMTP_PASS=os.environ.get("SMTP_PASS", ""),
+        FROM_EMAIL=os.environ.get("FROM_EMAIL", smtp_user or "no-reply@example.com"),
+        # Security settings
+        OTP_MAX_TRIES=int(os.environ.get("OTP_MAX_TRIES", "3")),
+        LOCK_MIN=int(os.environ.get("LOCK_MIN", "10")),
+        SWEEP_EXPIRED_ON_INDEX=False,
+        # Negative-lookup filter in front of /verify
+        TOKEN_FILTER_ENABLED=os.environ.get("TOKEN_FILTER_ENABLED", "1") == "1",
+        TOKEN_FILTER_FP_RATE=float(os.environ.get("TOKEN_FILTER_FP_RATE", "0.01")),
+        TOKEN_FILTER_SYNC_SECONDS=float(os.environ.get("TOKEN_FILTER_SYNC_SECONDS", "1")),
+        # Fan-out: one upload, one blob, up to this many recipient tokens
+        MAX_RECIPIENTS=int(os.environ.get("MAX_RECIPIENTS", "20")),
+        # Storage admission control (0 = unlimited)
+        STORAGE_QUOTA_MB=int(os.environ.get("STORAGE_QUOTA_MB", "0")),
+        STORAGE_SENDER_QUOTA_MB=int(os.environ.get("STORAGE_SENDER_QUOTA_MB", "0")),
+        STORAGE_MIN_FREE_MB=int(os.environ.get("STORAGE_MIN_FREE_MB", "100")),
+        STORAGE_REAP_WINDOW_SECONDS=int(os.environ.get("STORAGE_REAP_WINDOW_SECONDS", "0")),
+        # Reverse proxies in front of the app that append to X-Forwarded-For
+        # (0 = none: the client address is the socket peer)
+        TRUSTED_PROXY_HOPS=int(os.environ.get("TRUSTED_PROXY_HOPS", "0")),
+        METRICS_TOKEN=os.environ.get("METRICS_TOKEN", ""),
+        # Bearer token for /api/v1 (empty = API disabled)
+        API_TOKEN=os.environ.get("API_TOKEN", ""),
+        # Sampling profiler (off unless PROFILING=1)
+        PROFILING=os.environ.get("PROFILING", "0") == "1",
+        PROFILE_SAMPLE_RATE=float(os.environ.get("PROFILE_SAMPLE_RATE", "0.01")),
+        PROFILE_SLOW_MS=int(os.environ.get("PROFILE_SLOW_MS", "1000")),
+        PROFILE_INTERVAL_MS=float(os.environ.get("PROFILE_INTERVAL_MS", "5")),
+        PROFILE_DIR=os.environ.get("PROFILE_DIR", os.path.join(ROOT, "profiles")),
+        PROFILE_MAX_FILES=int(os.environ.get("PROFILE_MAX_FILES", "200")),
+        PROFILE_FORMAT=os.environ.get("PROFILE_FORMAT", "collapsed"),
+        PROFILE_REDACT_FIELDS=os.environ.get("PROFILE_REDACT_FIELDS", "otp,secret_key,email,recipients"),
+        # JSON logs on stderr via a background queue listener
+        LOG_LEVEL=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        LOG_REDACT_EMAILS=os.environ.get("LOG_REDACT_EMAILS", "1") == "1",
+        LOG_REDACT_IPS=os.environ.get("LOG_REDACT_IPS", "1") == "1",
+        LOG_REQUESTS=os.environ.get("LOG_REQUESTS", "0") == "1",
+        # Static URLs carry a content hash (see static_version), so browsers
+        # may keep the CSS/JS bundles for this long without revalidating
+        SEND_FILE_MAX_AGE_DEFAULT=int(os.environ.get("STATIC_MAX_AGE", "31536000")),
+        # gzip (or brotli, when installed) for HTML/JSON bodies between
+        # COMPRESS_MIN_BYTES and COMPRESS_MAX_BYTES (0 = no cap); never downloads
+        COMPRESSION=os.environ.get("COMPRESSION", "1") == "1",
+        COMPRESS_MIN_BYTES=int(os.environ.get("COMPRESS_MIN_BYTES", "1024")),
+        COMPRESS_MAX_BYTES=int(os.environ.get("COMPRESS_MAX_BYTES", str(1024 * 1024))),
+        COMPRESS_GZIP_LEVEL=int(os.environ.get("COMPRESS_GZIP_LEVEL", "5")),
+        COMPRESS_BROTLI_QUALITY=int(os.environ.get("COMPRESS_BROTLI_QUALITY", "4")),
+    )
+    app.config.update(overrides)
+    if app.config["TRUSTED_PROXY_HOPS"]:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config["TRUSTED_PROXY_HOPS"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    if app.config["DATABASE_URL"].startswith("sqlite:///"):
+        app.config["DB_PATH"] = app.config["DATABASE_URL"][len("sqlite:///"):]
+    if app.config["MULTI_NODE"]:
+        # The leader sweeps; request-time sweeps would race it on every node
+        app.config["SWEEP_EXPIRED_ON_INDEX"] = False
+
+    logger = configure_logging(
+        app.config["LOG_LEVEL"],
+        redact_emails=app.config["LOG_REDACT_EMAILS"],
+        redact_ips=app.config["LOG_REDACT_IPS"],
+    )
+    # Flask's own messages (unhandled exceptions) take the same path
+    app.logger.handlers = list(logger.handlers)
+    app.logger.propagate = False
+    if not app.testing:
+        validate_config(app)
+
+    metrics = app.extensions["metrics"] = Metrics()
+    mb = 1024 * 1024
+    storage = app.extensions["storage"] = StorageManager(
+        app.config["UPLOADS"], purge_row_and_files,
+        instance_quota=app.config["STORAGE_QUOTA_MB"] * mb,
+        sender_quota=app.config["STORAGE_SENDER_QUOTA_MB"] * mb,
+        min_free_bytes=app.config["STORAGE_MIN_FREE_MB"] * mb,
+        reap_window=app.config["STORAGE_REAP_WINDOW_SECONDS"],
+        metrics=metrics,
+    )
+    metrics.add_collector(storage.collect)
+    app.extensions["blob_writer"] = blobstore.BlobWriter(
+        app.config["BLOB_DURABILITY"],
+        group_window=app.config["BLOB_GROUP_SYNC_MS"] / 1000,
+        metrics=metrics,
+    )
+    hot_dir = app.config["HOT_TIER_DIR"] or blobstore.default_hot_dir(app.config["UPLOADS"])
+    if app.config["HOT_TIER_MB"] and hot_dir and not app.config["MULTI_NODE"]:
+        tiers = app.extensions["blob_tiers"] = blobstore.BlobTiers(
+            app.config["UPLOADS"], hot_dir,
+            budget=app.config["HOT_TIER_MB"] * mb,
+            max_blob=int(app.config["HOT_TIER_MAX_BLOB_MB"] * mb),
+            max_ttl=app.config["HOT_TIER_MAX_EXPIRY_MIN"] * 60,
+            metrics=metrics,
+        )
+        metrics.add_collector(tiers.collect)
+    if app.config["CRYPTO_WORKERS"] > 1:
+        app.extensions["segment_pool"] = blobcrypt.SegmentPool(
+            app.config["CRYPTO_WORKERS"], window=app.config["CRYPTO_WINDOW"] or None
+        )
+    if app.config["SECRET_STORE"] == "memory":
+        app.extensions["secret_store"] = MemorySecretStore()
+    elif app.config["SECRET_STORE"] == "db":
+        app.extensions["secret_store"] = DbSecretStore()
+    else:
+        raise ValueError(f"SECRET_STORE must be memory or db, not {app.config['SECRET_STORE']!r}")
+    if app.config["PROFILING"]:
+        from profiler import SamplingProfiler
+        profiler = app.extensions["profiler"] = SamplingProfiler(
+            app.config["PROFILE_DIR"],
+            sample_rate=app.config["PROFILE_SAMPLE_RATE"],
+            slow_ms=app.config["PROFILE_SLOW_MS"],
+            interval=app.config["PROFILE_INTERVAL_MS"] / 1000,
+            max_files=app.config["PROFILE_MAX_FILES"],
+            fmt=app.config["PROFILE_FORMAT"],
+            redact_fields=[f.strip() for f in app.config["PROFILE_REDACT_FIELDS"].split(",") if f.strip()],
+            metrics=metrics,
+        )
+        # Registered first so the profile spans the other request hooks,
+        # admission queueing included
+        app.before_request(profiler.start_request)
+        app.teardown_request(profiler.end_request)
+
+    if app.config["ADMISSION_CONTROL"]:
+        gatekeeper = app.extensions["admission"] = admission.AdmissionController(
+            admission.parse_limits(app.config["ADMISSION_LIMITS"]),
+            retry_after=app.config["ADMISSION_RETRY_AFTER"],
+            metrics=metrics,
+        )
+        # Ahead of every hook but the profiler's, so a shed request costs next to nothing
+        app.before_request(gatekeeper.before_request)
+        app.after_request(gatekeeper.after_request)
+        app.teardown_request(gatekeeper.teardown_request)
+        metrics.add_collector(gatekeeper.collect)
+
+    if app.config["TOKEN_FILTER_ENABLED"]:
+        # Built from the database on the first /verify, not at import
+        app.extensions["token_filter"] = TokenFilter(
+            store.all_tokens, store.token_generation,
+            fp_rate=app.config["TOKEN_FILTER_FP_RATE"],
+            sync_interval=app.config["TOKEN_FILTER_SYNC_SECONDS"],
+        )
+
+    if app.config["COMPRESSION"]:
+        from compression import Compressor
+        compressor = app.extensions["compression"] = Compressor(
+            min_bytes=app.config["COMPRESS_MIN_BYTES"],
+            max_bytes=app.config["COMPRESS_MAX_BYTES"],
+            gzip_level=app.config["COMPRESS_GZIP_LEVEL"],
+            brotli_quality=app.config["COMPRESS_BROTLI_QUALITY"],
+            metrics=metrics,
+        )
+        # after_request hooks run in reverse registration order: this runs after
+        # log_request and before admission's hook, which only hangs a release on
+        # streamed responses (never compressed) and leaves the body alone
+        app.after_request(compressor.after_request)
+
+    if app.config["TRANSFER_CACHE_SIZE"]:
+        transfer_cache = app.extensions["transfer_cache"] = TransferCache(
+            max_entries=app.config["TRANSFER_CACHE_SIZE"],
+            ttl=app.config["TRANSFER_CACHE_TTL"],
+        )
+        metrics.add_collector(transfer_cache.collect)
+
+    app.teardown_appcontext(close_db)
+    app.before_request(start_request_timer)
+    if app.config["LOG_REQUESTS"]:
+        app.after_request(log_request)
+    app.url_defaults(static_version)
+
+    app.add_url_rule("/", "index", index)
+    app.add_url_rule("/upload", "upload", upload, methods=["POST"])
+    app.add_url_rule("/sent/<token>", "sent", sent)
+    app.add_url_rule("/verify/<token>", "verify", verify, methods=["GET", "POST"])
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    app.before_request(api_before_request)
+    app.add_url_rule(API_PREFIX + "/transfers", "api_create_transfer", api_create_transfer, methods=["POST"])
+    app.add_url_rule(API_PREFIX + "/transfers/<token>", "api_transfer", api_transfer, methods=["GET", "DELETE"])
+    app.add_url_rule(API_PREFIX + "/stats/hourly", "api_hourly_stats", api_hourly_stats)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(413, too_large)
+
+    if app.config["MAINTENANCE_INTERVAL"]:
+        from maintenance import MaintenanceRunner
+        tasks = [sweep_expired, sweep_orphan_blobs]
+        if app.config["BLOB_RECOVERY"]:
+            app.extensions["blob_recovery"] = {"pid": None}
+            tasks.insert(0, recover_blobs_once)
+        if "blob_tiers" in app.extensions:
+            tasks.append(demote_hot_blobs)
+        if app.config["SQLITE_MAINTENANCE"] and not store.is_server_url(app.config["DATABASE_URL"]):
+            from sqlite_maintenance import SQLiteMaintenance
+            sqlite_upkeep = app.extensions["sqlite_maintenance"] = SQLiteMaintenance(
+                wal_max_bytes=app.config["SQLITE_WAL_MAX_MB"] * 1024 * 1024,
+                vacuum_step_pages=app.config["SQLITE_VACUUM_STEP_PAGES"],
+                idle_seconds=app.config["SQLITE_IDLE_SECONDS"],
+                optimize_interval=app.config["SQLITE_OPTIMIZE_HOURS"] * 3600,
+                metrics=metrics,
+            )
+            tasks.append(sqlite_upkeep)
+            metrics.add_collector(sqlite_upkeep.collect)
+        runner = app.extensions["maintenance"] = MaintenanceRunner(
+            app, tasks,
+            interval=app.config["MAINTENANCE_INTERVAL"],
+            lease_ttl=app.config["MAINTENANCE_LEASE_SECONDS"] or 3 * app.config["MAINTENANCE_INTERVAL"],
+            node_name=app.config["NODE_NAME"] or None,
+            metrics=metrics,
+        )
+        app.before_request(runner.ensure_started)
+
+    if app.config["SWEEP_EXPIRED_ON_INDEX"]:
+        @app.before_request
+        def cleanup_expired():
+            """Clean up expired files when the homepage is hit"""
+            if request.endpoint == "index":
+                try:
+                    sweep_expired()
+                except Exception:
+                    pass  # Ignore cleanup errors
+
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(debug=True, host="0.0.0.0", port=5000)
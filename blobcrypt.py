@@ -0,0 +1,223 @@
+"""
+Segmented AES-GCM for blobs, so files can be encrypted and decrypted a
+segment at a time instead of whole.
+
+Plaintext is cut into `segment_size` pieces; each is sealed separately
+with the upload's key. Segment i uses nonce = base_nonce[:8] + i (4 bytes,
+big-endian), and its associated data says whether it is the last segment,
+so segments cannot be reordered, dropped or truncated without failing
+authentication. On disk every segment is its ciphertext followed by the
+16-byte tag; all but the last carry exactly `segment_size` plaintext bytes.
+
+Segments are independent, so with a SegmentPool they are sealed and
+opened in worker processes and handed back in order. Processes, not
+threads: cryptography's AES-GCM keeps the GIL for the whole call, so
+threads would take turns. Each batch is copied to a worker and back,
+which on a CPU with AES-NI costs more than sealing it in place; the pool
+pays off only with spare cores and slower AES. At most `window` batches are in
+flight, which bounds the memory held ahead of the slowest one.
+
+`verified()` checks the end-to-end SHA-256 recorded at upload while the
+plaintext streams out, holding back the final chunk until it matches.
+"""
+import hashlib
+import multiprocessing
+import os
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+SEGMENT_SIZE = 64 * 1024
+TAG_BYTES = 16
+KEY_BYTES = 32
+NONCE_BYTES = 12
+
+_FINAL, _MORE = b"\x01", b"\x00"
+
+
+class IntegrityError(Exception):
+    """Ciphertext failed authentication or plaintext failed its SHA-256"""
+
+
+def new_key():
+    return secrets.token_bytes(KEY_BYTES)
+
+
+def new_nonce():
+    return secrets.token_bytes(NONCE_BYTES)
+
+
+def segment_nonce(base_nonce: bytes, index: int) -> bytes:
+    return base_nonce[:8] + index.to_bytes(4, "big")
+
+
+def segment_count(plain_len: int, segment_size: int) -> int:
+    return max(1, -(-plain_len // segment_size))
+
+
+def ciphertext_size(plain_len: int, segment_size: int = SEGMENT_SIZE) -> int:
+    return plain_len + TAG_BYTES * segment_count(plain_len, segment_size)
+
+
+def plaintext_size(cipher_len: int, segment_size: int) -> int:
+    return cipher_len - TAG_BYTES * -(-cipher_len // (segment_size + TAG_BYTES))
+
+
+class SegmentPool:
+    """Worker processes that seal or open runs of segments. Work is handed
+    out `batch_bytes` at a time, since a single 64 KB segment is over
+    before a round trip to another process would pay for itself"""
+
+    def __init__(self, workers, window=None, batch_bytes=1024 * 1024):
+        self.workers = workers
+        self.window = window or 2 * workers
+        self.batch_bytes = batch_bytes
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            # A forked worker inherits the executor but not its processes.
+            # They start from a fork server, not from this (threaded) process.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def imap(self, fn, jobs):
+        """fn(job) for each job on the pool, yielded in job order; no more
+        than `window` jobs run ahead of the consumer"""
+        executor = self._get_executor()
+        pending = deque()
+        try:
+            for job in jobs:
+                pending.append(executor.submit(fn, job))
+                if len(pending) >= self.window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def segments_per_batch(self, segment_size):
+        return max(1, self.batch_bytes // segment_size)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._pid = None
+
+
+def _batches(count, per_batch):
+    return (range(i, min(i + per_batch, count)) for i in range(0, count, per_batch))
+
+
+_cipher = (None, None)
+
+
+def _aesgcm(key):
+    """AESGCM for `key`, reused across the batches of one transfer. The key
+    travels with every batch: 32 bytes against a megabyte of data."""
+    global _cipher
+    if _cipher[0] != key:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        _cipher = (key, AESGCM(key))
+    return _cipher[1]
+
+
+def _seal(aesgcm, base_nonce, i, count, chunk):
+    return aesgcm.encrypt(segment_nonce(base_nonce, i), chunk, _FINAL if i == count - 1 else _MORE)
+
+
+def _open(aesgcm, base_nonce, i, count, chunk, sealed):
+    from cryptography.exceptions import InvalidTag
+    final = i == count - 1
+    if len(chunk) < TAG_BYTES or (not final and len(chunk) != sealed):
+        raise IntegrityError(f"blob truncated in segment {i}")
+    try:
+        return aesgcm.decrypt(segment_nonce(base_nonce, i), chunk, _FINAL if final else _MORE)
+    except InvalidTag:
+        raise IntegrityError(f"segment {i} failed authentication") from None
+
+
+def _seal_batch(job):
+    """Pool task: (key, base_nonce, batch, count, segment_size, plaintext)"""
+    key, base_nonce, batch, count, segment_size, data = job
+    aesgcm = _aesgcm(key)
+    view = memoryview(data)
+    return b"".join(
+        _seal(aesgcm, base_nonce, i, count, view[n * segment_size:(n + 1) * segment_size])
+        for n, i in enumerate(batch)
+    )
+
+
+def _open_batch(job):
+    """Pool task: (key, base_nonce, batch, count, sealed, ciphertext)"""
+    key, base_nonce, batch, count, sealed, data = job
+    aesgcm = _aesgcm(key)
+    view = memoryview(data)
+    return b"".join(
+        _open(aesgcm, base_nonce, i, count, view[n * sealed:(n + 1) * sealed], sealed)
+        for n, i in enumerate(batch)
+    )
+
+
+def encrypt_segments(key: bytes, base_nonce: bytes, data, segment_size: int = SEGMENT_SIZE, pool=None):
+    """Yield the ciphertext of `data` (bytes-like) segment by segment, or
+    a batch of segments at a time on `pool`"""
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    aesgcm = AESGCM(key)
+    view = memoryview(data)
+    count = segment_count(len(view), segment_size)
+
+    def seal(i):
+        return _seal(aesgcm, base_nonce, i, count, view[i * segment_size:(i + 1) * segment_size])
+
+    if pool is None or count == 1:
+        return map(seal, range(count))
+
+    def jobs():
+        for batch in _batches(count, pool.segments_per_batch(segment_size)):
+            data = bytes(view[batch.start * segment_size:batch.stop * segment_size])
+            yield key, base_nonce, batch, count, segment_size, data
+
+    return pool.imap(_seal_batch, jobs())
+
+
+def decrypt_segments(key: bytes, base_nonce: bytes, f, cipher_len: int, segment_size: int, pool=None):
+    """Yield plaintext segments read from file object `f`, or a batch of
+    segments at a time on `pool` (reads stay in the calling process)"""
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    aesgcm = AESGCM(key)
+    sealed = segment_size + TAG_BYTES
+    count = max(1, -(-cipher_len // sealed))
+
+    if pool is None or count == 1:
+        return (_open(aesgcm, base_nonce, i, count, f.read(sealed), sealed) for i in range(count))
+
+    def jobs():
+        for batch in _batches(count, pool.segments_per_batch(segment_size)):
+            yield key, base_nonce, batch, count, sealed, f.read(sealed * len(batch))
+
+    return pool.imap(_open_batch, jobs())
+
+
+def verified(chunks, expected_sha256: bytes):
+    """Pass chunks through while hashing them; the last one is released
+    only once the digest matches, otherwise IntegrityError is raised"""
+    digest = hashlib.sha256()
+    held = None
+    for chunk in chunks:
+        if held is not None:
+            yield held
+        digest.update(chunk)
+        held = chunk
+    if digest.digest() != expected_sha256:
+        raise IntegrityError("plaintext does not match the SHA-256 recorded at upload")
+    if held is not None:
+        yield held
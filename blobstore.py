@@ -0,0 +1,266 @@
+"""
+Crash-safe blob writes.
+
+A blob is written to a hidden temp file next to its final name and only
+renamed into place once complete, so a `.blob` file is never partial.
+Upload order is fixed: write temp -> make durable -> rename -> insert the
+database row. After a crash the database is therefore the source of
+truth: a `.blob` with no row, or a leftover `.*.tmp`, is garbage, and
+app.recover_blobs() removes both (plus rows whose file did not survive).
+
+Durability modes (BLOB_DURABILITY):
+  fsync  fsync the file and the directory on every upload (default)
+  group  hand the fsync to a background thread that flushes everything
+         queued within BLOB_GROUP_SYNC_MS in one batch; the upload still
+         waits for its batch, but concurrent uploads share the cost
+  none   rely on the page cache; after a power loss a committed row can
+         point at a short blob, which the download integrity check refuses
+
+BlobTiers adds a RAM-backed hot tier (a tmpfs such as /dev/shm) for the
+blobs that least need a disk: small ones from short-expiry uploads,
+which are usually downloaded or expired within minutes. They are
+written there without fsync while the tier stays within its byte budget;
+everything else goes to the uploads folder. A blob keeps its file name
+in either tier, so resolve() finds it after app.demote_hot_blobs() has
+moved it to disk over a path read earlier. A hot blob does not survive
+a reboot; recover_blobs() then purges its transfers like any other lost
+blob.
+"""
+import hashlib
+import os
+import secrets
+import shutil
+import threading
+import time
+
+MODES = ("fsync", "group", "none")
+TEMP_SUFFIX = ".tmp"
+
+
+def temp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{secrets.token_hex(4)}{TEMP_SUFFIX}")
+
+
+def fsync_dir(directory):
+    """Persist a rename; directories cannot be opened on Windows"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _Ticket:
+    __slots__ = ("fd", "directory", "done", "error")
+
+    def __init__(self, fd, directory):
+        self.fd = fd
+        self.directory = directory
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupSyncer:
+    """Batches fsync calls: the first request in a batch opens a window of
+    `window` seconds, then every file queued so far (and each directory
+    once) is flushed and all of their writers are released together"""
+
+    def __init__(self, window=0.005, metrics=None):
+        self.window = window
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._pending = []
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Called with the lock held; a forked worker needs its own thread
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = []
+            threading.Thread(target=self._run, name="blackfile-fsync", daemon=True).start()
+
+    def sync(self, fd, directory):
+        ticket = _Ticket(fd, directory)
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append(ticket)
+            self._cond.notify()
+        ticket.done.wait()
+        if ticket.error is not None:
+            raise ticket.error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.window)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        failed_dirs = {}
+        for ticket in batch:
+            try:
+                os.fsync(ticket.fd)
+            except OSError as e:
+                ticket.error = e
+        for directory in {t.directory for t in batch}:
+            try:
+                fsync_dir(directory)
+            except OSError as e:
+                failed_dirs[directory] = e
+        for ticket in batch:
+            if ticket.error is None:
+                ticket.error = failed_dirs.get(ticket.directory)
+            ticket.done.set()
+        if self.metrics:
+            self.metrics.inc("blob_fsync_batches_total")
+            self.metrics.inc("blob_fsync_files_total", len(batch))
+            self.metrics.inc("blob_fsync_seconds_total", time.perf_counter() - started)
+
+
+class BlobWriter:
+    def __init__(self, durability="fsync", group_window=0.005, metrics=None):
+        if durability not in MODES:
+            raise ValueError(f"BLOB_DURABILITY must be one of {', '.join(MODES)}, not {durability!r}")
+        self.durability = durability
+        self.metrics = metrics
+        self.syncer = GroupSyncer(group_window, metrics) if durability == "group" else None
+
+    def write(self, path, chunks) -> int:
+        """Write the byte chunks to `path` atomically; returns the size.
+        Returns only once the blob is as durable as the mode promises."""
+        directory = os.path.dirname(path)
+        tmp = temp_path(path)
+        size = 0
+        renamed = False
+        try:
+            with open(tmp, "xb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                if self.durability == "fsync":
+                    started = time.perf_counter()
+                    os.fsync(f.fileno())
+                    os.replace(tmp, path)
+                    renamed = True
+                    fsync_dir(directory)
+                    if self.metrics:
+                        self.metrics.inc("blob_fsync_files_total")
+                        self.metrics.inc("blob_fsync_seconds_total", time.perf_counter() - started)
+                else:
+                    os.replace(tmp, path)
+                    renamed = True
+                    if self.syncer is not None:
+                        # The descriptor stays open until the batch is flushed
+                        self.syncer.sync(f.fileno(), directory)
+        except BaseException:
+            for leftover in (path, tmp) if renamed else (tmp,):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+            raise
+        return size
+
+
+def default_hot_dir(uploads, shm="/dev/shm"):
+    """A tmpfs directory unique to this uploads folder (so to this
+    deployment, shared by its workers), or None without a tmpfs"""
+    if not os.path.isdir(shm):
+        return None
+    tag = hashlib.sha256(os.path.abspath(uploads).encode()).hexdigest()[:12]
+    return os.path.join(shm, f"blackfile-{tag}")
+
+
+class BlobTiers:
+    def __init__(self, disk_dir, hot_dir, budget, max_blob, max_ttl, metrics=None):
+        self.disk_dir = disk_dir
+        self.hot_dir = hot_dir
+        self.budget = budget
+        self.max_blob = max_blob
+        self.max_ttl = max_ttl
+        self.metrics = metrics
+        self.hot_writer = BlobWriter("none", metrics=metrics)
+        self._lock = threading.Lock()
+        self._writing = 0  # hot bytes this process is still writing
+
+    def hot_bytes(self) -> int:
+        """Bytes in the hot tier, every worker's files included"""
+        total = 0
+        try:
+            with os.scandir(self.hot_dir) as entries:
+                for entry in entries:
+                    try:
+                        total += entry.stat().st_size
+                    except FileNotFoundError:
+                        pass
+        except FileNotFoundError:
+            pass
+        return total
+
+    def is_hot(self, path) -> bool:
+        return os.path.dirname(path) == self.hot_dir
+
+    def _reserve_hot(self, size, ttl):
+        if size > self.max_blob or ttl > self.max_ttl:
+            return False
+        with self._lock:
+            if self.hot_bytes() + self._writing + size > self.budget:
+                return False
+            try:
+                os.makedirs(self.hot_dir, mode=0o700, exist_ok=True)
+                # The tmpfs is shared with the rest of the host
+                if shutil.disk_usage(self.hot_dir).free < self._writing + 2 * size:
+                    return False
+            except OSError:
+                return False
+            self._writing += size
+            return True
+
+    def write(self, name, size, ttl, chunks, disk_writer):
+        """Write a blob of about `size` bytes that lives at most `ttl`
+        seconds; returns (path, size written)"""
+        if self._reserve_hot(size, ttl):
+            path = os.path.join(self.hot_dir, name)
+            try:
+                written = self.hot_writer.write(path, chunks)
+            finally:
+                with self._lock:
+                    self._writing -= size
+            tier = "hot"
+        else:
+            path = os.path.join(self.disk_dir, name)
+            written = disk_writer.write(path, chunks)
+            tier = "disk"
+        if self.metrics:
+            self.metrics.inc("blob_tier_writes_total", tier=tier)
+            self.metrics.inc("blob_tier_bytes_total", written, tier=tier)
+        return path, written
+
+    def candidates(self, path):
+        """`path`, then where the same blob would be in the other tier"""
+        name = os.path.basename(path)
+        other = self.disk_dir if self.is_hot(path) else self.hot_dir
+        return path, os.path.join(other, name)
+
+    def resolve(self, path):
+        """The tier that holds the blob now (it may have been demoted)"""
+        for candidate in self.candidates(path):
+            if os.path.exists(candidate):
+                return candidate
+        return path
+
+    def collect(self):
+        """Gauges for the metrics endpoint"""
+        return {
+            "blob_hot_tier_bytes": self.hot_bytes(),
+            "blob_hot_tier_budget_bytes": self.budget,
+        }
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Send many files through the BlackFile JSON API in one go.
+
+Files are streamed as raw request bodies over keep-alive connections, one
+per worker thread, so a nightly batch reuses a handful of connections
+instead of opening one browser session per file. Every result (links,
+secret key, server hash) lands in a JSON manifest.
+
+    python bulk_send.py --url https://blackfile.example.com \\
+        --to alice@example.com,bob@example.com --expiry 60 reports/*.pdf
+
+    python bulk_send.py --url ... --csv batch.csv    # rows: path,recipients[,expiry]
+
+The API token comes from --token or $BLACKFILE_API_TOKEN. The manifest
+holds secret keys and is written readable by the owner only. A file the
+server turns away as busy (503) is sent again after its Retry-After, up
+to --retries times.
+"""
+import argparse
+import csv
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+CHUNK_SIZE = 64 * 1024
+MAX_RETRY_WAIT = 60
+
+
+class HashingReader:
+    """File wrapper that hashes what http.client streams out of it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        self.sha256.update(chunk)
+        return chunk
+
+
+class ApiClient:
+    """Thread-safe client holding one persistent connection per thread"""
+
+    def __init__(self, base_url, token, timeout=120):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/") + "/api/v1"
+        self.token = token
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.netloc, timeout=self.timeout, blocksize=CHUNK_SIZE)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, parsed JSON body)"""
+        headers = dict(headers or {}, Authorization=f"Bearer {self.token}")
+        conn = self._connection()
+        try:
+            conn.request(method, self.prefix + path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError):
+            # Never retried here: a streamed body cannot be replayed
+            self._drop_connection()
+            raise
+        if resp.will_close:
+            self._drop_connection()
+        try:
+            body = json.loads(data or b"{}")
+        except ValueError:
+            body = {"error": data.decode(errors="replace").strip()[:200]}
+        if resp.status == 503:
+            try:
+                body["retry_after"] = int(resp.getheader("Retry-After", "1"))
+            except ValueError:
+                body["retry_after"] = 1
+        return resp.status, body
+
+    def send_file(self, path, recipients, expiry):
+        query = urlencode({
+            "filename": os.path.basename(path),
+            "recipients": ",".join(recipients),
+            "expiry": expiry,
+        })
+        with open(path, "rb") as f:
+            reader = HashingReader(f)
+            status, body = self.request("POST", f"/transfers?{query}", body=reader, headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(os.fstat(f.fileno()).st_size),
+            })
+        return status, body, reader.sha256.hexdigest()
+
+
+def send_one(client, job, retries=3):
+    path, recipients, expiry = job
+    started = time.monotonic()
+    result = {"file": path, "recipients": recipients, "expiry": expiry}
+    for attempt in range(retries + 1):
+        try:
+            status, body, local_sha256 = client.send_file(path, recipients, expiry)
+        except (OSError, http.client.HTTPException) as e:
+            result.update(ok=False, error=str(e))
+            break
+        if status == 503 and attempt < retries:
+            # Shed before the upload was handled, so sending it again is safe
+            time.sleep(min(body.get("retry_after", 1), MAX_RETRY_WAIT))
+            continue
+        result["status"] = status
+        if status == 201:
+            result.update(body)
+            result["ok"] = body.get("sha256") == local_sha256
+            if not result["ok"]:
+                result["error"] = "server hash does not match the file that was sent"
+        else:
+            result.update(ok=False, error=body.get("error", f"HTTP {status}"))
+        break
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def load_jobs(args):
+    jobs = []
+    if args.csv:
+        with open(args.csv, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#"):
+                    continue
+                recipients = [r for r in row[1].replace(";", ",").split(",") if r.strip()]
+                expiry = int(row[2]) if len(row) > 2 and row[2].strip() else args.expiry
+                jobs.append((row[0], [r.strip() for r in recipients], expiry))
+    recipients = [r.strip() for r in (args.to or "").split(",") if r.strip()]
+    for path in args.files:
+        if not recipients:
+            sys.exit("--to is required when files are given on the command line")
+        jobs.append((path, recipients, args.expiry))
+    return jobs
+
+
+def write_manifest(path, results):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"created_at": int(time.time()), "results": results}, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("files", nargs="*", help="files to send to --to")
+    parser.add_argument("--url", required=True, help="BlackFile base URL")
+    parser.add_argument("--token", default=os.environ.get("BLACKFILE_API_TOKEN", ""))
+    parser.add_argument("--to", help="comma-separated recipients for the files given")
+    parser.add_argument("--expiry", type=int, default=60, help="minutes (5, 10 or 60)")
+    parser.add_argument("--csv", help="batch file with path,recipients[,expiry] rows")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3, help="resends of a file the server sheds (503)")
+    parser.add_argument("--manifest", default="blackfile-manifest.json")
+    args = parser.parse_args(argv)
+
+    if not args.token:
+        sys.exit("An API token is required (--token or BLACKFILE_API_TOKEN)")
+    jobs = load_jobs(args)
+    if not jobs:
+        sys.exit("Nothing to send")
+
+    client = ApiClient(args.url, args.token)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = list(pool.map(lambda job: send_one(client, job, args.retries), jobs))
+
+    write_manifest(args.manifest, results)
+    failed = [r for r in results if not r["ok"]]
+    for r in failed:
+        print(f"FAILED {r['file']}: {r['error']}", file=sys.stderr)
+    print(f"{len(results) - len(failed)}/{len(results)} sent; manifest: {args.manifest}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Response compression for dynamic text (HTML pages, JSON API, metrics).
+
+An after_request hook picks an encoding from Accept-Encoding: brotli when
+the `brotli` package is installed and the client prefers or accepts it,
+else gzip. It compresses bodies of COMPRESS_MIMETYPES between
+`min_bytes` and `max_bytes` long and leaves alone anything already
+encoded, streamed (file downloads, static files served by send_file), not
+a 200-class body, or a download: the page POST /verify returns inlines
+the whole file, usually already compressed, and deflating megabytes of
+it on the request thread costs far more than the bytes it saves. Every response whose type could be compressed carries
+`Vary: Accept-Encoding`, compressed or not, so shared caches keep the
+variants apart; a strong ETag is weakened once the bytes change.
+
+gzip uses one zlib compressor primed with the level and gzip framing;
+each response compresses with a copy of it rather than a fresh deflate
+setup. Bytes saved are counted per endpoint and encoding.
+
+Pages that show a secret (the sent page) show it once, so an attacker
+cannot make the repeated requests a compression side channel needs.
+"""
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone covers every browser
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    "text/html", "text/plain", "text/css", "application/json",
+    "application/javascript", "text/javascript", "image/svg+xml",
+)
+
+# (endpoint, method) pairs whose bodies are file contents
+DOWNLOAD_ROUTES = frozenset({("verify", "POST")})
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class Compressor:
+    def __init__(self, min_bytes=1024, max_bytes=1024 * 1024, gzip_level=5, brotli_quality=4,
+                 mimetypes=DEFAULT_MIMETYPES, metrics=None):
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.brotli_quality = brotli_quality
+        self.mimetypes = frozenset(mimetypes)
+        self.metrics = metrics
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+        self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, _GZIP_WBITS)
+
+    def _gzip_compress(self, data):
+        c = self._gzip.copy()
+        return c.compress(data) + c.flush()
+
+    def _encode(self, encoding, data):
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        return self._gzip_compress(data)
+
+    def after_request(self, response):
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (response.direct_passthrough or response.is_streamed
+                or "Content-Encoding" in response.headers
+                or not 200 <= response.status_code < 300 or response.status_code == 204
+                or request.method == "HEAD"
+                or (request.endpoint, request.method) in DOWNLOAD_ROUTES):
+            return response
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_bytes or (self.max_bytes and len(data) > self.max_bytes):
+            return response
+
+        compressed = self._encode(encoding, data)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        if self.metrics:
+            endpoint = request.endpoint or "unmatched"
+            self.metrics.inc("compression_responses_total", endpoint=endpoint, encoding=encoding)
+            self.metrics.inc("compression_bytes_saved_total", len(data) - len(compressed),
+                             endpoint=endpoint, encoding=encoding)
+        return response
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Shared test fixtures: an app on a temporary database and uploads directory
+with outgoing mail captured, and helpers that drive an upload through to
+the credentials a recipient would receive.
+"""
+import base64
+import io
+import os
+import pathlib
+import re
+
+import pytest
+
+import app as blackfile
+
+# Credentials as they appear on the /sent page and in the notification mail
+SECRET_RE = re.compile(r'value="([A-Za-z0-9_\-]{40,})"')
+TOKEN_RE = re.compile(r"/verify/([0-9a-f]{32})")
+OTP_RE = re.compile(r">(\d{6})<")
+FILE_DATA_RE = re.compile(rb'data-file-data="([^"]*)"')
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """(to, subject, html) for every mail the app sends"""
+    sent = []
+    monkeypatch.setattr(blackfile, "send_email_batch", lambda msgs: sent.extend(msgs))
+    return sent
+
+
+@pytest.fixture
+def make_app(tmp_path, outbox):
+    """create_app("testing") on tmp_path; keyword arguments override config.
+    Apps made in one test share a database, like workers of one deployment."""
+    def make(**config):
+        application = blackfile.create_app("testing", {
+            "DB_PATH": str(tmp_path / "blackfile.db"),
+            "UPLOADS": str(tmp_path / "uploads"),
+            **config,
+        })
+        application.outbox = outbox
+        return application
+    return make
+
+
+@pytest.fixture
+def make_client(make_app):
+    def make(**config):
+        application = make_app(**config)
+        test_client = application.test_client()
+        test_client.outbox = application.outbox
+        test_client.uploads = pathlib.Path(application.config["UPLOADS"])
+        return test_client
+    return make
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
+
+
+def upload(client, emails, payload):
+    """Upload `payload` to `emails`: (secret, [(token, otp) per recipient])"""
+    del client.outbox[:]
+    resp = client.post("/upload", data={
+        "email": emails, "expiry": "10",
+        "file": (io.BytesIO(payload), "deck.pdf", "application/pdf"),
+    })
+    assert resp.status_code == 302
+    page = client.get(resp.headers["Location"]).get_data(as_text=True)
+    secret = SECRET_RE.search(page).group(1)
+    creds = [(TOKEN_RE.search(html).group(1), OTP_RE.search(html).group(1)) for _, _, html in client.outbox]
+    return secret, creds
+
+
+def send(client, size, expiry=5):
+    """Upload `size` random bytes to one recipient: (token, otp, secret)"""
+    del client.outbox[:]
+    resp = client.post("/upload", data={
+        "email": "a@example.com", "expiry": str(expiry),
+        "file": (io.BytesIO(os.urandom(size)), "a.bin", "application/octet-stream"),
+    })
+    page = client.get(resp.headers["Location"]).get_data(as_text=True)
+    [(_, _, html)] = client.outbox
+    return TOKEN_RE.search(html).group(1), OTP_RE.search(html).group(1), SECRET_RE.search(page).group(1)
+
+
+def download(client, token, otp, secret):
+    """The plaintext from the verify page, or None if it was refused"""
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret})
+    match = FILE_DATA_RE.search(resp.data)
+    return base64.b64decode(match.group(1)) if match else None
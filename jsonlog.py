@@ -0,0 +1,176 @@
+"""
+Structured JSON logging that never blocks a request thread.
+
+Loggers under "blackfile" hand records to a QueueHandler; a single
+QueueListener thread per process formats them as one JSON object per line
+and writes them to stderr. A worker forked after logging was configured
+(gunicorn --preload) starts its own queue and listener on its first record. Messages use %-style arguments, so nothing is
+formatted for a disabled level.
+
+Records logged inside a request carry request_id, endpoint, the token
+prefix from the URL and elapsed_ms since the request started. Pass
+`extra={"stage": ...}` to say which step logged. Work handed to another
+thread can carry the same fields via `log_context()`. Emails and IP
+addresses are masked when writing, on the listener thread, if the
+redaction flags are set.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+ROOT_LOGGER = "blackfile"
+
+EMAIL_RE = re.compile(r"\b([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b")
+IPV4_RE = re.compile(r"\b(\d{1,3}\.\d{1,3}\.\d{1,3})\.\d{1,3}\b")
+IPV6_RE = re.compile(r"\b((?:[0-9a-fA-F]{1,4}:){3})[0-9a-fA-F:]*:[0-9a-fA-F]{1,4}\b")
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_handler = None
+_formatter = None
+
+
+def get_logger(name=None):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}" if name else ROOT_LOGGER)
+
+
+def log_context():
+    """Correlation fields of the current request ({} outside one)"""
+    if not has_request_context():
+        return {}
+    if "log_request_id" not in g:
+        g.log_request_id = request.headers.get("X-Request-ID", "")[:64] or uuid.uuid4().hex[:12]
+    ctx = {"request_id": g.log_request_id, "endpoint": request.endpoint}
+    token = (request.view_args or {}).get("token")
+    if token:
+        ctx["token"] = token[:8]
+    return ctx
+
+
+def start_request_timer():
+    g.log_started = time.perf_counter()
+
+
+def request_elapsed_ms():
+    """Milliseconds since the request started, or None outside one"""
+    started = g.get("log_started") if has_request_context() else None
+    if started is None:
+        return None
+    return (time.perf_counter() - started) * 1000
+
+
+class RequestContextFilter(logging.Filter):
+    """Runs in the thread that called the logger, before the record is
+    queued, so the request context is still visible"""
+
+    def filter(self, record):
+        for key, value in log_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        elapsed = request_elapsed_ms()
+        if elapsed is not None and not hasattr(record, "elapsed_ms"):
+            record.elapsed_ms = round(elapsed, 1)
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def __init__(self, sink):
+        super().__init__(None)
+        self.sink = sink
+        self.listener = None
+        self._pid = None
+
+    def _ensure_listener(self):
+        # Called with the handler lock held (logging re-creates it after a
+        # fork); a forked worker inherits the queue but not the thread
+        # draining it, so it gets a fresh pair
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.sink, respect_handler_level=False)
+            self.listener.start()
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        self.queue.put_nowait(record)
+
+    def stop(self):
+        """atexit: flush this process's listener"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def prepare(self, record):
+        # Resolve the message and traceback now; keep extras as fields
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, redact_emails=False, redact_ips=False):
+        super().__init__()
+        self.redact_emails = redact_emails
+        self.redact_ips = redact_ips
+
+    def redact(self, value):
+        if not isinstance(value, str):
+            return value
+        if self.redact_emails:
+            value = EMAIL_RE.sub(r"\1***@\2", value)
+        if self.redact_ips:
+            value = IPV4_RE.sub(r"\1.x", value)
+            value = IPV6_RE.sub(r"\1x", value)
+        return value
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": self.redact(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD and not key.startswith("_"):
+                entry[key] = self.redact(value)
+        if record.exc_text:
+            entry["exc"] = self.redact(record.exc_text)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level="INFO", redact_emails=False, redact_ips=False, stream=None):
+    """Route the "blackfile" loggers through the queue; safe to call again
+    (settings are process-wide, the last call wins)"""
+    global _handler, _formatter
+    if _formatter is None:
+        _formatter = JsonFormatter()
+        sink = logging.StreamHandler(stream or sys.stderr)
+        sink.setFormatter(_formatter)
+        _handler = _QueueHandler(sink)
+        _handler.addFilter(RequestContextFilter())
+        atexit.register(_handler.stop)
+
+    _formatter.redact_emails = redact_emails
+    _formatter.redact_ips = redact_ips
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,84 @@
+"""
+Leader-run background maintenance.
+
+Every process runs a MaintenanceRunner thread. Each tick it tries to take
+or renew the "maintenance" lease in the shared metadata store, and only
+the holder runs the tasks (expiry sweep, orphaned blob cleanup, SQLite
+upkeep). With several gunicorn workers or several nodes, a lease
+outlives a few ticks, so a node that dies is replaced once its lease
+lapses, and two nodes never sweep at the same time.
+
+The thread starts on the first request rather than in create_app, so it
+survives a pre-forking server (gunicorn --preload) and a cold start never
+touches the database.
+"""
+import os
+import socket
+import threading
+
+import store
+from jsonlog import get_logger
+
+LEASE_NAME = "maintenance"
+
+log = get_logger("maintenance")
+
+
+class MaintenanceRunner:
+    def __init__(self, app, tasks, interval=60, lease_ttl=180, node_name=None, metrics=None):
+        self.app = app
+        self.tasks = tasks
+        self.interval = interval
+        self.lease_ttl = lease_ttl
+        # Workers on one host share a node name; the pid keeps holders unique
+        self.node_name = node_name or socket.gethostname()
+        self.node_id = f"{self.node_name}:{os.getpid()}"
+        self.metrics = metrics
+        self.is_leader = False
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        """before_request hook: (re)start the thread in this process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.node_id = f"{self.node_name}:{self._pid}"
+            self.is_leader = False
+            threading.Thread(target=self._run, name="blackfile-maintenance", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                log.error("Maintenance tick failed", exc_info=True, extra={"node": self.node_id})
+
+    def tick(self) -> bool:
+        """Run the tasks if this node holds the lease; returns leadership"""
+        with self.app.app_context():
+            leader = store.try_acquire_lease(LEASE_NAME, self.node_id, self.lease_ttl)
+            if leader != self.is_leader:
+                log.info("Maintenance leadership %s", "acquired" if leader else "lost",
+                         extra={"node": self.node_id})
+            self.is_leader = leader
+            if self.metrics:
+                self.metrics.set("maintenance_leader", int(leader))
+            if not leader:
+                return False
+            for task in self.tasks:
+                task()
+            if self.metrics:
+                self.metrics.inc("maintenance_runs_total")
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self.is_leader:
+            with self.app.app_context():
+                store.release_lease(LEASE_NAME, self.node_id)
+            self.is_leader = False
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Measure the HTML each page sends: total bytes and how much of it is inline
+<style>/<script> that the browser cannot cache.
+
+Every page is rendered through the Flask test client against a throwaway
+database, with email delivery stubbed out, so nothing leaves the machine.
+
+    python measure_html.py                        # this checkout
+    python measure_html.py --against /tmp/before  # compare with another one
+    python measure_html.py --json sizes.json
+
+A checkout to compare against can come from `git worktree add /tmp/before HEAD`.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+INLINE_STYLE = re.compile(rb"<style[^>]*>(.*?)</style>", re.S | re.I)
+INLINE_SCRIPT = re.compile(rb"<script(?![^>]*\bsrc=)[^>]*>(.*?)</script>", re.S | re.I)
+
+
+def page_sizes(html):
+    return {
+        "total": len(html),
+        "inline_css": sum(len(m) for m in INLINE_STYLE.findall(html)),
+        "inline_js": sum(len(m) for m in INLINE_SCRIPT.findall(html)),
+    }
+
+
+def render_pages():
+    """Render each page of the app found on sys.path; returns {page: html}"""
+    import io
+    import tempfile
+
+    import app as blackfile
+
+    outbox = []
+    blackfile.send_email_batch = outbox.extend
+    tmp = tempfile.mkdtemp(prefix="measure-html-")
+    client = blackfile.create_app("testing", {
+        "DB_PATH": os.path.join(tmp, "measure.db"),
+        "UPLOADS": os.path.join(tmp, "uploads"),
+    }).test_client()
+
+    pages = {"index": client.get("/").data}
+    resp = client.post("/upload", data={
+        "email": "someone@example.com", "expiry": "10",
+        "file": (io.BytesIO(b"x" * 1024), "report.pdf", "application/pdf"),
+    })
+    pages["sent"] = client.get(resp.headers["Location"]).data
+    secret = re.search(rb'value="([A-Za-z0-9_\-]{40,})"', pages["sent"]).group(1).decode()
+    mail = outbox[0][2]
+    token = re.search(r"/verify/([0-9a-f]{32})", mail).group(1)
+    otp = re.search(r">(\d{6})<", mail).group(1)
+    pages["verify"] = client.get(f"/verify/{token}").data
+    pages["download-success"] = client.post(
+        f"/verify/{token}", data={"otp": otp, "secret_key": secret}).data
+    pages["404"] = client.get("/no-such-page").data
+    return pages
+
+
+def measure(root):
+    """Sizes for the checkout at `root`, measured in a fresh interpreter"""
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker"],
+        cwd=root, env=dict(os.environ, PYTHONPATH=root),
+        capture_output=True, check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--against", metavar="DIR", help="another checkout to compare with")
+    parser.add_argument("--json", metavar="FILE", help="also write the results here")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, os.getcwd())
+        pages = render_pages()
+        print(json.dumps({name: page_sizes(html) for name, html in pages.items()}))
+        return
+
+    after = measure(ROOT)
+    before = measure(os.path.abspath(args.against)) if args.against else None
+
+    print(f"{'page':<18}{'html':>9}{'inline css':>12}{'inline js':>11}", end="")
+    print(f"{'before':>9}{'saved':>9}" if before else "")
+    for name, sizes in after.items():
+        print(f"{name:<18}{sizes['total']:>9}{sizes['inline_css']:>12}{sizes['inline_js']:>11}", end="")
+        if before and name in before:
+            old = before[name]["total"]
+            print(f"{old:>9}{old - sizes['total']:>9}")
+        else:
+            print()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"after": after, "before": before}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
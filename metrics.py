@@ -0,0 +1,83 @@
+"""
+Process-local metrics for BlackFile.
+
+Counters and gauges live in memory per worker; collectors registered with
+`add_collector()` are called at scrape time for values that are cheaper to
+read on demand (database counters, disk usage). `/metrics` serves the
+Prometheus text format, or JSON when asked for it, to requests bearing
+METRICS_TOKEN; with no token configured it is a 404 outside testing.
+"""
+import hmac
+import json
+import threading
+
+from flask import Response, current_app, request
+
+from jsonlog import get_logger
+
+log = get_logger("metrics")
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def add_collector(self, fn):
+        """`fn()` returns {name: value} gauges, read at scrape time"""
+        self._collectors.append(fn)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        for fn in self._collectors:
+            try:
+                gauges.update(fn())
+            except Exception as e:
+                log.warning("Metrics collector failed: %s", e)
+        return {"counters": counters, "gauges": gauges}
+
+    def render_prometheus(self):
+        snap = self.snapshot()
+        lines = [f"{k} {v}" for k, v in sorted(snap["counters"].items())]
+        lines += [f"{k} {v}" for k, v in sorted(snap["gauges"].items())]
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics():
+    return current_app.extensions["metrics"]
+
+
+def metrics_view():
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        if not current_app.testing:
+            return Response("not found\n", 404, mimetype="text/plain")
+    elif not hmac.compare_digest(request.headers.get("Authorization", "").encode(),
+                                 f"Bearer {token}".encode()):
+        return Response("unauthorized\n", 401, mimetype="text/plain")
+    m = get_metrics()
+    if request.args.get("format") == "json" or request.accept_mimetypes.best == "application/json":
+        return Response(json.dumps(m.snapshot()), mimetype="application/json",
+                        headers={"Cache-Control": "no-store"})
+    return Response(m.render_prometheus(), mimetype="text/plain; version=0.0.4",
+                    headers={"Cache-Control": "no-store"})
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the crypto, hashing and encoding helpers on the
+upload and download paths.
+
+Each bulk helper is swept over payload sizes (1 KB .. 100 MB) and, where
+it works in pieces, chunk sizes (16 KB .. 4 MB; for the blob cipher the
+chunk is the segment size). Results report the best-of-N time per call,
+throughput in MB/s and the peak memory a call allocates (tracemalloc),
+which is the number that shows extra copies of the payload.
+
+The blob cipher is also run on a SegmentPool of 1, 2, 4 and 8 processes at
+the default segment size, giving single-file throughput per worker count
+(it only scales with as many cores as the machine has; see "cpus" in the
+saved environment).
+
+    python microbench.py                               # full sweep
+    python microbench.py --quick                       # sizes up to 1 MB
+    python microbench.py --json bench.json             # save results
+    python microbench.py --only encrypt_parallel --workers 1,4
+    python microbench.py --baseline bench.json --threshold 0.15
+
+With --baseline, any case whose time per call grew by more than the
+threshold (a fraction) is listed and the exit status is 1.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+KB, MB = 1024, 1024 * 1024
+SIZES = [KB, 64 * KB, MB, 10 * MB, 100 * MB]
+CHUNKS = [16 * KB, 64 * KB, 256 * KB, MB, 4 * MB]
+WORKERS = [1, 2, 4, 8]
+
+
+def _sha256_chunked(data, chunk):
+    view = memoryview(data)
+    digest = hashlib.sha256()
+    for i in range(0, len(view), chunk):
+        digest.update(view[i:i + chunk])
+    return digest.digest()
+
+
+def bulk_cases(blackfile):
+    """name -> (uses_chunk, setup(size, chunk) -> zero-argument call)"""
+    import blobcrypt
+
+    key, nonce = blobcrypt.new_key(), blobcrypt.new_nonce()
+
+    def encrypt(size, chunk):
+        data = os.urandom(size)
+        return lambda: b"".join(blobcrypt.encrypt_segments(key, nonce, data, chunk))
+
+    def decrypt(size, chunk):
+        blob = b"".join(blobcrypt.encrypt_segments(key, nonce, os.urandom(size), chunk))
+        return lambda: b"".join(blobcrypt.decrypt_segments(key, nonce, io.BytesIO(blob), len(blob), chunk))
+
+    def decrypt_legacy(size, chunk):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        blob = AESGCM(key).encrypt(nonce, os.urandom(size), None)
+        return lambda: blackfile.decrypt_file(key, nonce, blob)
+
+    def sha256(size, chunk):
+        data = os.urandom(size)
+        return lambda: _sha256_chunked(data, chunk)
+
+    def b64encode(size, chunk):
+        # verify(): the whole plaintext is inlined into the success page
+        data = os.urandom(size)
+        return lambda: base64.b64encode(data).decode()
+
+    def b64decode(size, chunk):
+        # Mirrors the atob() in static/js/pages/download-success.js; no server path decodes it
+        text = base64.b64encode(os.urandom(size))
+        return lambda: base64.b64decode(text)
+
+    return {
+        "encrypt_segments": (True, encrypt),
+        "decrypt_segments": (True, decrypt),
+        "decrypt_file": (False, decrypt_legacy),
+        "sha256": (True, sha256),
+        "b64encode": (False, b64encode),
+        "b64decode": (False, b64decode),
+    }
+
+
+def parallel_cases():
+    """name -> setup(size, pool) -> zero-argument call"""
+    import blobcrypt
+
+    key, nonce = blobcrypt.new_key(), blobcrypt.new_nonce()
+
+    def encrypt(size, pool):
+        data = os.urandom(size)
+        return lambda: b"".join(blobcrypt.encrypt_segments(key, nonce, data, pool=pool))
+
+    def decrypt(size, pool):
+        blob = b"".join(blobcrypt.encrypt_segments(key, nonce, os.urandom(size)))
+        segment = blobcrypt.SEGMENT_SIZE
+        return lambda: b"".join(blobcrypt.decrypt_segments(key, nonce, io.BytesIO(blob), len(blob), segment, pool=pool))
+
+    return {"encrypt_parallel": encrypt, "decrypt_parallel": decrypt}
+
+
+def small_cases(blackfile):
+    """Fixed-size helpers, measured per call rather than per byte"""
+    import blobcrypt
+
+    secret_key = blobcrypt.new_key()
+    encoded = blackfile.encode_secret_key(secret_key)
+    token = os.urandom(16).hex()
+    salt = os.urandom(16)
+    return {
+        "key_fingerprint": lambda: blackfile.key_fingerprint(secret_key, token),
+        "hash_otp": lambda: blackfile.hash_otp("123456", salt),
+        "encode_secret_key": lambda: blackfile.encode_secret_key(secret_key),
+        "decode_secret_key": lambda: base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)),
+        "to_dt": lambda: blackfile.to_dt(1_700_000_000),
+    }
+
+
+def time_call(fn, min_time=0.2, max_runs=1000):
+    """Best time per call over as many runs as fit in about min_time"""
+    best, spent, runs = float("inf"), 0.0, 0
+    while runs < max_runs and (runs < 3 or spent < min_time):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best, spent, runs = min(best, elapsed), spent + elapsed, runs + 1
+    return best, runs
+
+
+def time_small(fn, min_time=0.2):
+    """Per-call time for sub-microsecond helpers, timed in batches"""
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        batch *= 10
+    best, _ = time_call(lambda: [fn() for _ in range(batch)], min_time, max_runs=10)
+    return best / batch, batch * 10
+
+
+def peak_alloc(fn):
+    """Peak bytes allocated while `fn` runs"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes=SIZES, chunks=CHUNKS, only=None, min_time=0.2, log=print, workers=WORKERS):
+    import app as blackfile
+    import blobcrypt
+
+    tmp = tempfile.mkdtemp(prefix="microbench-")
+    application = blackfile.create_app("testing", {"DB_PATH": os.path.join(tmp, "bench.db")})
+    results = {}
+    with application.app_context():
+        for name, (uses_chunk, setup) in bulk_cases(blackfile).items():
+            if only and name not in only:
+                continue
+            for size in sizes:
+                for chunk in chunks if uses_chunk else [None]:
+                    fn = setup(size, chunk)
+                    seconds, runs = time_call(fn, min_time)
+                    case = f"{name}/size={size}" + (f"/chunk={chunk}" if chunk else "")
+                    results[case] = {
+                        "seconds": seconds,
+                        "runs": runs,
+                        "mb_per_s": size / MB / seconds,
+                        "peak_alloc_bytes": peak_alloc(fn),
+                    }
+                    log(format_row(case, results[case]))
+        for name, setup in parallel_cases().items():
+            if only and name not in only:
+                continue
+            for size in sizes:
+                for n in workers:
+                    pool = blobcrypt.SegmentPool(n)
+                    fn = setup(size, pool)
+                    seconds, runs = time_call(fn, min_time)
+                    case = f"{name}/size={size}/workers={n}"
+                    results[case] = {
+                        "seconds": seconds,
+                        "runs": runs,
+                        "mb_per_s": size / MB / seconds,
+                        "peak_alloc_bytes": peak_alloc(fn),
+                    }
+                    pool.shutdown()
+                    log(format_row(case, results[case]))
+        for name, fn in small_cases(blackfile).items():
+            if only and name not in only:
+                continue
+            seconds, runs = time_small(fn, min_time)
+            results[name] = {"seconds": seconds, "runs": runs, "peak_alloc_bytes": peak_alloc(fn)}
+            log(format_row(name, results[name]))
+    return results
+
+
+def format_row(case, r):
+    rate = f"{r['mb_per_s']:>10.1f} MB/s" if "mb_per_s" in r else f"{r['seconds'] * 1e6:>10.2f} us  "
+    return f"{case:<48}{rate}{r['peak_alloc_bytes']:>14,} B peak"
+
+
+def compare(results, baseline, threshold):
+    """Cases present in both whose time per call grew by more than threshold"""
+    regressions = []
+    for case, r in results.items():
+        old = baseline.get(case)
+        if old and r["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append((case, old["seconds"], r["seconds"]))
+    return regressions
+
+
+def environment():
+    import cryptography
+    return {
+        "python": platform.python_version(),
+        "cryptography": cryptography.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--quick", action="store_true", help="payload sizes up to 1 MB only")
+    parser.add_argument("--sizes", help="comma-separated payload sizes in bytes")
+    parser.add_argument("--chunks", help="comma-separated chunk sizes in bytes")
+    parser.add_argument("--workers", help="comma-separated worker counts for the *_parallel cases")
+    parser.add_argument("--only", help="comma-separated benchmark names")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend per case")
+    parser.add_argument("--json", metavar="FILE", help="write the results here")
+    parser.add_argument("--baseline", metavar="FILE", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown against the baseline, as a fraction (default 0.10)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else SIZES
+    if args.quick:
+        sizes = [s for s in sizes if s <= MB]
+    chunks = [int(c) for c in args.chunks.split(",")] if args.chunks else CHUNKS
+    workers = [int(n) for n in args.workers.split(",")] if args.workers else WORKERS
+    only = set(args.only.split(",")) if args.only else None
+
+    results = run(sizes, chunks, only, args.min_time, workers=workers)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for case, old, new in regressions:
+            print(f"REGRESSION {case}: {old * 1e6:.1f} us -> {new * 1e6:.1f} us ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
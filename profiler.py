@@ -0,0 +1,202 @@
+"""
+Opt-in statistical profiler for requests.
+
+One background thread wakes every `interval` seconds, reads the current
+stack of each request thread that is being watched, and counts the stacks.
+Requests are watched when picked by `sample_rate`, or always when
+`slow_ms` is set, since a request can only be known to be slow once it ends.
+At the end of a request its profile is kept if it was sampled or slower
+than `slow_ms`, and the sampler thread writes it to `out_dir`. Files are
+either collapsed stacks (flamegraph.pl / speedscope import) or speedscope
+JSON. Only the newest `max_files` are kept.
+
+Profiles hold function names, the URL rule (never the token in the path)
+and form field names. Form values are written only for fields outside
+`redact_fields`. When profiling is off, create_app registers no hooks.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import request
+
+REDACTED = "[redacted]"
+
+
+class RequestProfile:
+    __slots__ = ("started", "sampled", "stacks")
+
+    def __init__(self, sampled):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.stacks = Counter()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+class SamplingProfiler:
+    def __init__(self, out_dir, sample_rate=0.0, slow_ms=0, interval=0.005,
+                 max_files=200, fmt="collapsed", redact_fields=(), metrics=None):
+        if fmt not in ("collapsed", "speedscope"):
+            raise ValueError(f"Unknown profile format: {fmt}")
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval
+        self.max_files = max_files
+        self.fmt = fmt
+        self.redact_fields = {f.lower() for f in redact_fields}
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._active = {}    # thread id -> RequestProfile
+        self._pending = []   # finished profiles waiting to be written
+        self._thread = None
+
+    # ---- request hooks ----
+    def start_request(self):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and not self.slow_ms:
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._active[threading.get_ident()] = RequestProfile(sampled)
+
+    def end_request(self, exc=None):
+        with self._lock:
+            profile = self._active.pop(threading.get_ident(), None)
+        if profile is None:
+            return
+        duration_ms = (time.perf_counter() - profile.started) * 1000
+        slow = bool(self.slow_ms) and duration_ms >= self.slow_ms
+        if not (profile.sampled or slow) or not profile.stacks:
+            return
+        meta = self._request_meta(duration_ms, "slow" if slow else "sampled", exc)
+        with self._lock:
+            self._pending.append((meta, profile.stacks))
+
+    def _request_meta(self, duration_ms, reason, exc):
+        rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+        # Only a form that was already parsed; never read the body from here
+        form = request.__dict__.get("form")
+        fields = {}
+        for key in (form or {}):
+            fields[key] = REDACTED if key.lower() in self.redact_fields else form.get(key)
+        return {
+            "method": request.method,
+            "rule": rule,
+            "endpoint": request.endpoint,
+            "duration_ms": round(duration_ms, 1),
+            "reason": reason,
+            "error": type(exc).__name__ if exc else None,
+            "form": fields,
+            "interval_ms": self.interval * 1000,
+            "time": int(time.time()),
+        }
+
+    # ---- sampler thread ----
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="blackfile-profiler", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+                pending, self._pending = self._pending, []
+            if active:
+                frames = sys._current_frames()
+                for tid, profile in active.items():
+                    frame = frames.get(tid)
+                    if frame is not None and tid != me:
+                        profile.stacks[_stack(frame)] += 1
+                del frames
+            for meta, stacks in pending:
+                self._write(meta, stacks)
+
+    def _write(self, meta, stacks):
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            name = f"{int(time.time() * 1000)}-{meta['endpoint'] or 'none'}-{int(meta['duration_ms'])}ms"
+            if self.fmt == "speedscope":
+                path = os.path.join(self.out_dir, name + ".speedscope.json")
+                body = json.dumps(to_speedscope(meta, stacks))
+            else:
+                path = os.path.join(self.out_dir, name + ".collapsed.txt")
+                body = to_collapsed(meta, stacks)
+            with open(path, "w") as f:
+                f.write(body)
+            self._rotate()
+            if self.metrics:
+                self.metrics.inc("profiles_written_total", reason=meta["reason"])
+        except OSError:
+            pass  # profiling must never take the app down
+
+    def _rotate(self):
+        files = sorted(
+            f for f in os.listdir(self.out_dir)
+            if f.endswith((".collapsed.txt", ".speedscope.json"))
+        )
+        for old in files[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.out_dir, old))
+            except FileNotFoundError:
+                pass
+
+
+def to_collapsed(meta, stacks):
+    lines = ["# " + json.dumps(meta)]
+    lines += [f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(meta, stacks):
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in stacks.items():
+        ids = []
+        for name in stack:
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            ids.append(index[name])
+        samples.append(ids)
+        weights.append(count * meta["interval_ms"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{meta['method']} {meta['rule']} {meta['duration_ms']}ms ({meta['reason']})",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": f"{meta['method']} {meta['rule']}",
+        "exporter": "blackfile",
+        "metadata": meta,
+    }
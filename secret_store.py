@@ -0,0 +1,109 @@
+"""
+One-time secrets for the page shown after an upload.
+
+The secret key of a new upload has to survive the redirect to
+/sent/<token> and be shown there exactly once. Instead of riding in the
+signed session cookie, which grew with every unviewed upload and was
+re-sent and re-verified on every request, it is kept server-side and the
+browser gets a random handle in a cookie scoped to that one /sent/ path.
+
+The handle is the only way in: entries are filed under an HMAC of the
+handle and sealed (AES-GCM, bound to the transfer token) with a key
+derived from it, so the stored value is useless without the cookie.
+`pop` is atomic: of two concurrent requests with the same handle, only
+one gets the secret. Entries expire with their transfer.
+
+MemorySecretStore keeps entries in the process (single worker).
+DbSecretStore keeps them in the metadata store, so the redirect may land
+on any worker or node.
+"""
+import base64
+import hashlib
+import heapq
+import hmac
+import secrets
+import threading
+
+import store
+from store import now_ts
+
+HANDLE_BYTES = 24
+NONCE_BYTES = 12
+
+
+def _decode_handle(handle: str):
+    try:
+        raw = base64.urlsafe_b64decode(handle + "=" * (-len(handle) % 4))
+    except (ValueError, TypeError):
+        return None
+    return raw if len(raw) == HANDLE_BYTES else None
+
+
+def _derive(raw: bytes, label: bytes) -> bytes:
+    return hmac.new(raw, label, hashlib.sha256).digest()
+
+
+def _seal(raw, token_b, value: str) -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    nonce = secrets.token_bytes(NONCE_BYTES)
+    return nonce + AESGCM(_derive(raw, b"seal")).encrypt(nonce, value.encode(), token_b)
+
+
+def _unseal(raw, token_b, sealed: bytes):
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    try:
+        return AESGCM(_derive(raw, b"seal")).decrypt(sealed[:NONCE_BYTES], sealed[NONCE_BYTES:], token_b).decode()
+    except InvalidTag:
+        return None  # handle issued for another transfer
+
+
+class _SecretStore:
+    def put(self, token_b: bytes, value: str, expires_at: int) -> str:
+        """Keep `value` for the transfer until expires_at; returns the handle"""
+        raw = secrets.token_bytes(HANDLE_BYTES)
+        self._put(_derive(raw, b"id")[:16], _seal(raw, token_b, value), expires_at)
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def pop(self, token_b: bytes, handle: str):
+        """The value, once; None for unknown, expired or already used handles"""
+        raw = _decode_handle(handle or "")
+        if raw is None:
+            return None
+        sealed = self._pop(_derive(raw, b"id")[:16], now_ts())
+        return _unseal(raw, token_b, sealed) if sealed is not None else None
+
+
+class MemorySecretStore(_SecretStore):
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._expiry = []  # heap of (expires_at, entry_id)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._expiry and (self._expiry[0][0] <= now or len(self._entries) > self.max_entries):
+            _, entry_id = heapq.heappop(self._expiry)
+            self._entries.pop(entry_id, None)
+
+    def _put(self, entry_id, sealed, expires_at):
+        with self._lock:
+            self._entries[entry_id] = (sealed, expires_at)
+            heapq.heappush(self._expiry, (expires_at, entry_id))
+            self._evict(now_ts())
+
+    def _pop(self, entry_id, now):
+        with self._lock:
+            sealed, expires_at = self._entries.pop(entry_id, (None, 0))
+        return sealed if expires_at > now else None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DbSecretStore(_SecretStore):
+    def _put(self, entry_id, sealed, expires_at):
+        store.put_secret(entry_id, sealed, expires_at)
+
+    def _pop(self, entry_id, now):
+        return store.pop_secret(entry_id, now)
@@ -4,6 +4,8 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+from jsonlog import configure_logging, get_logger
+
 # Load .env file
 load_dotenv()
 
@@ -13,6 +15,8 @@ SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 FROM_EMAIL = os.getenv("FROM_EMAIL")
 
+log = get_logger("email")
+
 def send_email(to_email, subject, body):
     try:
         # Create email
@@ -29,10 +33,11 @@ def send_email(to_email, subject, body):
         server.sendmail(FROM_EMAIL, to_email, msg.as_string())
         server.quit()
 
-        print(f"✅ Email sent to {to_email}")
-    except Exception as e:
-        print(f"❌ Failed to send email: {e}")
+        log.info("Email sent", extra={"to": to_email})
+    except Exception:
+        log.error("Failed to send email", exc_info=True, extra={"to": to_email})
 
 # --- Test ---
 if __name__ == "__main__":
+    configure_logging(os.getenv("LOG_LEVEL", "INFO"), redact_emails=os.getenv("LOG_REDACT_EMAILS", "1") == "1")
     send_email("testreceiver@example.com", "BlackFile Test", "This is a test email from BlackFile 🚀")
@@ -0,0 +1,121 @@
+"""
+Upkeep for the SQLite metadata file, run as a MaintenanceRunner task.
+
+Transfers are inserted, updated and deleted within minutes, so without
+help the file keeps every page it ever grew to and the planner works
+from statistics gathered (if ever) on a very different table. Each tick:
+
+  - converts a file created without auto_vacuum to INCREMENTAL, once,
+    at the first idle tick (files created by this version start that way)
+  - when idle, hands free pages back in steps of `vacuum_step_pages`,
+    re-checking between steps
+  - every `optimize_interval` seconds runs PRAGMA optimize (a full
+    ANALYZE the first time a file has no statistics)
+  - checkpoints the WAL (PASSIVE), or TRUNCATE once it is over
+    `wal_max_bytes`, so the WAL is reset instead of growing
+
+Idle means no transfer event (the append-only log every state change
+writes to) for `idle_seconds`, so it reflects every worker's writes,
+not just the requests this process has seen.
+
+collect() reports file size, WAL size and free pages on /metrics.
+On PostgreSQL the task does nothing; autovacuum covers it there.
+"""
+import threading
+import time
+
+from flask import current_app
+
+import store
+from jsonlog import get_logger
+
+log = get_logger("sqlite")
+
+
+class SQLiteMaintenance:
+    def __init__(self, wal_max_bytes=64 * 1024 * 1024, vacuum_step_pages=256,
+                 vacuum_max_steps=16, idle_seconds=5, optimize_interval=6 * 3600,
+                 metrics=None, clock=store.now_ts):
+        self.wal_max_bytes = wal_max_bytes
+        self.vacuum_step_pages = vacuum_step_pages
+        self.vacuum_max_steps = vacuum_max_steps
+        self.idle_seconds = idle_seconds
+        self.optimize_interval = optimize_interval
+        self.metrics = metrics
+        self.clock = clock  # wall-clock seconds, comparable with event timestamps
+        self.last_optimize = None
+        self._converted = False
+        self._lock = threading.Lock()
+
+    def idle(self, con) -> bool:
+        last_write = store.last_event_ts(con)
+        return last_write is None or self.clock() - last_write >= self.idle_seconds
+
+    def _inc(self, name, value=1, **labels):
+        if self.metrics:
+            self.metrics.inc(name, value, **labels)
+
+    def __call__(self):
+        con = store.db()
+        if not store.is_sqlite(con):
+            return
+        with self._lock:
+            path = current_app.config["DB_PATH"]
+            idle = self.idle(con)
+            if not self._converted and idle:
+                self.ensure_incremental(con)
+            if idle:
+                self.vacuum(con)
+            now = self.clock()
+            if self.last_optimize is None or now - self.last_optimize >= self.optimize_interval:
+                full = not store.has_statistics(con)
+                store.optimize(con, full=full)
+                self.last_optimize = now
+                self._inc("sqlite_optimize_total", full=str(full).lower())
+            # Last, so the pages written above are folded in too
+            self.checkpoint(con, path)
+
+    def ensure_incremental(self, con):
+        """The VACUUM holds the write lock for the whole rewrite, so the
+        caller runs this only while the database is idle"""
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            started = time.perf_counter()
+            store.enable_incremental_vacuum(con)
+            log.info("Converted database to auto_vacuum=INCREMENTAL in %.0f ms",
+                     (time.perf_counter() - started) * 1000, extra={"stage": "maintenance"})
+        self._converted = True
+
+    def checkpoint(self, con, path):
+        stats = store.sqlite_stats(con, path)
+        if stats["journal_mode"] != "wal":
+            return None
+        mode = "TRUNCATE" if stats["wal_bytes"] > self.wal_max_bytes else "PASSIVE"
+        result = store.wal_checkpoint(con, mode)
+        self._inc("sqlite_checkpoints_total", mode=mode.lower())
+        if result[0]:
+            self._inc("sqlite_checkpoints_busy_total")
+        return result
+
+    def vacuum(self, con) -> int:
+        freed = 0
+        for _ in range(self.vacuum_max_steps):
+            step = store.incremental_vacuum(con, self.vacuum_step_pages)
+            freed += step
+            if step < self.vacuum_step_pages or not self.idle(con):
+                break
+        if freed:
+            self._inc("sqlite_vacuum_pages_total", freed)
+        return freed
+
+    def collect(self):
+        """Gauges for the metrics endpoint"""
+        con = store.db()
+        if not store.is_sqlite(con):
+            return {}
+        stats = store.sqlite_stats(con, current_app.config["DB_PATH"])
+        return {
+            "sqlite_file_bytes": stats["file_bytes"],
+            "sqlite_wal_bytes": stats["wal_bytes"],
+            "sqlite_freelist_pages": stats["freelist_count"],
+            "sqlite_freelist_bytes": stats["freelist_count"] * stats["page_size"],
+        }
@@ -269,7 +269,8 @@ function initializeUtilities() {
             // Email validation
             if (input.type === 'email' && value) {
                 const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
-                fieldValid = emailRegex.test(value);
+                const emails = input.multiple ? value.split(/[,;\s]+/).filter(Boolean) : [value];
+                fieldValid = emails.every(e => emailRegex.test(e));
             }
             
             // File validation
@@ -0,0 +1,62 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Add easter egg - Konami code
+    let konamiCode = [];
+    const konamiSequence = ['ArrowUp', 'ArrowUp', 'ArrowDown', 'ArrowDown', 'ArrowLeft', 'ArrowRight', 'ArrowLeft', 'ArrowRight', 'KeyB', 'KeyA'];
+    
+    document.addEventListener('keydown', function(e) {
+        konamiCode.push(e.code);
+        
+        if (konamiCode.length > konamiSequence.length) {
+            konamiCode.shift();
+        }
+        
+        if (JSON.stringify(konamiCode) === JSON.stringify(konamiSequence)) {
+            showEasterEgg();
+        }
+    });
+    
+    function showEasterEgg() {
+        const body = document.body;
+        body.style.animation = 'rainbow 2s infinite';
+        
+        showNotification('🎉 Konami Code activated! You found the easter egg!', 'success', 5000);
+        
+        // Add rainbow animation
+        const style = document.createElement('style');
+        style.textContent = `
+            @keyframes rainbow {
+                0% { filter: hue-rotate(0deg); }
+                25% { filter: hue-rotate(90deg); }
+                50% { filter: hue-rotate(180deg); }
+                75% { filter: hue-rotate(270deg); }
+                100% { filter: hue-rotate(360deg); }
+            }
+        `;
+        document.head.appendChild(style);
+        
+        setTimeout(() => {
+            body.style.animation = '';
+            document.head.removeChild(style);
+        }, 10000);
+    }
+    
+    // Auto-redirect to home after 30 seconds
+    let countdown = 30;
+    const countdownInterval = setInterval(() => {
+        countdown--;
+        if (countdown <= 0) {
+            clearInterval(countdownInterval);
+            showNotification('Auto-redirecting to homepage...', 'info', 2000);
+            setTimeout(() => {
+                window.location.href = document.body.dataset.homeUrl;
+            }, 2000);
+        }
+    }, 1000);
+    
+    // Cancel auto-redirect on user interaction
+    ['click', 'keydown', 'scroll'].forEach(event => {
+        document.addEventListener(event, () => {
+            clearInterval(countdownInterval);
+        }, { once: true });
+    });
+});
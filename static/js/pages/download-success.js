@@ -0,0 +1,74 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const countdownNumber = document.getElementById('countdownNumber');
+    const countdownText = document.getElementById('countdownText');
+    const countdownCircle = document.getElementById('countdownCircle');
+    
+    let timeLeft = 5;
+    
+    // Auto-download file
+    downloadFile();
+    
+    // Update countdown every second
+    const countdownInterval = setInterval(function() {
+        timeLeft--;
+        
+        if (timeLeft > 0) {
+            countdownNumber.textContent = timeLeft;
+            countdownText.textContent = timeLeft;
+            
+            // Update circle progress
+            const progress = ((5 - timeLeft) / 5) * 360;
+            countdownCircle.style.background = `conic-gradient(var(--accent-solid) ${progress}deg, rgba(255,255,255,0.1) ${progress}deg)`;
+        } else {
+            clearInterval(countdownInterval);
+            
+            // Show completion
+            countdownNumber.textContent = '✓';
+            countdownText.textContent = '0';
+            countdownCircle.style.background = 'conic-gradient(var(--success) 360deg, transparent 360deg)';
+            
+            // Redirect to homepage
+            window.location.href = document.body.dataset.homeUrl;
+        }
+    }, 1000);
+    
+    // Show notification
+    showNotification('File downloaded successfully! Link has been deleted for security.', 'success');
+});
+
+// Download file function
+function downloadFile() {
+    try {
+        const payload = document.getElementById('downloadPayload');
+        const fileData = payload.dataset.fileData;
+        const fileName = payload.dataset.filename;
+        
+        // Convert base64 to blob
+        const byteCharacters = atob(fileData);
+        const byteNumbers = new Array(byteCharacters.length);
+        for (let i = 0; i < byteCharacters.length; i++) {
+            byteNumbers[i] = byteCharacters.charCodeAt(i);
+        }
+        const byteArray = new Uint8Array(byteNumbers);
+        const blob = new Blob([byteArray], { type: 'application/octet-stream' });
+        
+        // Create download link
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = url;
+        a.download = fileName;
+        
+        // Trigger download
+        document.body.appendChild(a);
+        a.click();
+        
+        // Cleanup
+        window.URL.revokeObjectURL(url);
+        document.body.removeChild(a);
+        
+    } catch (error) {
+        console.error('Download failed:', error);
+        showNotification('Download failed. Please try again.', 'error');
+    }
+}
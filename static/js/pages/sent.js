@@ -0,0 +1,102 @@
+// WhatsApp sharing
+function shareViaWhatsApp() {
+    const secretKey = document.getElementById('secretKey').value;
+    const message = encodeURIComponent(`🔒 BlackFile Secret Key: ${secretKey}\n\nUse this key along with the download link to access your secure file. Keep this confidential!`);
+    window.open(`https://wa.me/?text=${message}`, '_blank');
+}
+
+// SMS sharing (works on mobile devices)
+function shareViaSMS() {
+    const secretKey = document.getElementById('secretKey').value;
+    const message = encodeURIComponent(`BlackFile Secret Key: ${secretKey}\n\nUse this with the download link to access your secure file.`);
+    window.open(`sms:?body=${message}`, '_blank');
+}
+
+// Download key as text file
+function downloadAsText() {
+    const secretKey = document.getElementById('secretKey').value;
+    const downloadLink = document.getElementById('downloadLink').value;
+    const fileHash = document.getElementById('fileHash').value;
+    const expiryMinutes = document.getElementById('secretKey').dataset.expiryMinutes;
+    
+    const content = `BlackFile Transfer Details
+========================
+
+Secret Key: ${secretKey}
+Download Link: ${downloadLink}
+SHA-256 Hash: ${fileHash}
+
+Instructions:
+1. Share the secret key separately from the download link
+2. Recipient needs both the link and key to access the file
+3. File expires in ${expiryMinutes} minutes
+4. File will be permanently deleted after download
+
+Generated: ${new Date().toLocaleString()}
+`;
+    
+    const blob = new Blob([content], { type: 'text/plain' });
+    const url = window.URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = 'blackfile-transfer-details.txt';
+    document.body.appendChild(a);
+    a.click();
+    window.URL.revokeObjectURL(url);
+    document.body.removeChild(a);
+    
+    showNotification('Transfer details downloaded successfully!', 'success');
+}
+
+// Print page
+function printPage() {
+    window.print();
+}
+
+// Auto-focus on secret key for easy copying
+document.addEventListener('DOMContentLoaded', function() {
+    // Add click to select all for readonly inputs
+    document.querySelectorAll('input[readonly]').forEach(input => {
+        input.addEventListener('click', function() {
+            this.select();
+        });
+    });
+    
+    // Add animation to steps
+    const steps = document.querySelectorAll('.d-flex.align-center');
+    steps.forEach((step, index) => {
+        step.style.opacity = '0';
+        step.style.transform = 'translateX(-20px)';
+        step.style.animation = `slideInRight 0.6s ease forwards ${index * 0.2}s`;
+    });
+    
+    // Show success notification
+    showNotification('Transfer completed successfully! Share the secret key separately.', 'success');
+});
+
+// Add print styles
+const style = document.createElement('style');
+style.textContent = `
+@media print {
+    .navbar, .footer, .btn, .floating-particles {
+        display: none !important;
+    }
+    .glass-card, .glass {
+        background: white !important;
+        border: 1px solid #ccc !important;
+        box-shadow: none !important;
+    }
+    body {
+        background: white !important;
+        color: black !important;
+    }
+    .copy-group {
+        flex-direction: column !important;
+        gap: 0.5rem !important;
+    }
+    .copy-btn {
+        display: none !important;
+    }
+}
+`;
+document.head.appendChild(style);
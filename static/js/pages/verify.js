@@ -0,0 +1,311 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const otpInput = document.getElementById('otp');
+    const secretKeyInput = document.getElementById('secret_key');
+    const verifyForm = document.getElementById('verifyForm');
+    const verifyBtn = document.getElementById('verifyBtn');
+    
+    // Debug logging
+    console.log('Verify page loaded');
+    console.log('OTP Input found:', !!otpInput);
+    console.log('Secret Key Input found:', !!secretKeyInput);
+    
+    // Ensure inputs are accessible
+    if (otpInput) {
+        otpInput.style.pointerEvents = 'auto';
+        console.log('OTP input configured');
+    }
+    
+    if (secretKeyInput) {
+        secretKeyInput.style.pointerEvents = 'auto';
+        console.log('Secret key input configured');
+    }
+
+    // OTP input formatting with dash (123-456)
+    if (otpInput) {
+        otpInput.addEventListener('input', function(e) {
+            // Remove everything except numbers
+            let value = this.value.replace(/[^0-9]/g, '');
+            
+            // Limit to 6 digits
+            value = value.substring(0, 6);
+            
+            // Format as 123-456
+            if (value.length > 3) {
+                value = value.substring(0, 3) + '-' + value.substring(3);
+            }
+            
+            this.value = value;
+            
+            // Auto-submit when 6 digits are entered (if secret key is also filled)
+            if (value.replace('-', '').length === 6 && secretKeyInput.value.trim()) {
+                setTimeout(() => {
+                    if (validateForm(verifyForm)) {
+                        verifyForm.submit();
+                    }
+                }, 300);
+            }
+        });
+
+        // Handle paste for OTP
+        otpInput.addEventListener('paste', function(e) {
+            e.preventDefault();
+            const paste = (e.clipboardData || window.clipboardData).getData('text');
+            let numericPaste = paste.replace(/[^0-9]/g, '').substring(0, 6);
+            
+            // Format as 123-456
+            if (numericPaste.length > 3) {
+                numericPaste = numericPaste.substring(0, 3) + '-' + numericPaste.substring(3);
+            }
+            
+            this.value = numericPaste;
+            
+            // Auto-focus secret key if OTP is complete
+            if (numericPaste.replace('-', '').length === 6) {
+                secretKeyInput.focus();
+            }
+        });
+    }
+
+    // Secret key input formatting
+    if (secretKeyInput) {
+        secretKeyInput.addEventListener('paste', function(e) {
+            // Trim whitespace from pasted content
+            setTimeout(() => {
+                this.value = this.value.trim();
+            }, 10);
+        });
+
+        // Auto-resize textarea
+        secretKeyInput.addEventListener('input', function() {
+            this.style.height = 'auto';
+            this.style.height = this.scrollHeight + 'px';
+        });
+    }
+
+    // Form submission
+    if (verifyForm) {
+        verifyForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+            
+            if (!validateForm(this)) {
+                showNotification('Please fill in all required fields.', 'error');
+                return;
+            }
+
+            // Validate OTP format (123-456)
+            const otp = otpInput.value;
+            const otpDigits = otp.replace('-', '');
+            if (!/^\d{3}-\d{3}$/.test(otp) || otpDigits.length !== 6) {
+                showNotification('Please enter a valid 6-digit OTP in format 123-456.', 'error');
+                otpInput.focus();
+                return;
+            }
+
+            // Validate secret key
+            const secretKey = secretKeyInput.value.trim();
+            if (secretKey.length < 10) {
+                showNotification('Secret key appears to be incomplete. Please verify and try again.', 'error');
+                secretKeyInput.focus();
+                return;
+            }
+
+            // Show loading state
+            setButtonLoading(verifyBtn, true);
+            
+            // Submit form
+            this.submit();
+        });
+    }
+
+    // Eye toggle removed - secret key remains password field
+
+    // Countdown timer - only show if expires_at is provided
+    const timerAlert = document.getElementById('timerAlert');
+    const expiresAtStr = timerAlert ? timerAlert.dataset.expiresAt : '';
+    
+    if (expiresAtStr && expiresAtStr !== 'None' && timerAlert) {
+        const expiresAt = new Date(expiresAtStr).getTime();
+        
+        if (!isNaN(expiresAt)) {
+            timerAlert.style.display = 'block';
+        
+        function updateCountdown() {
+            const now = new Date().getTime();
+            const timeLeft = expiresAt - now;
+            
+            if (timeLeft > 0) {
+                const minutes = Math.floor(timeLeft / (1000 * 60));
+                const seconds = Math.floor((timeLeft % (1000 * 60)) / 1000);
+                
+                document.getElementById('countdown').innerHTML = 
+                    `${minutes}:${seconds.toString().padStart(2, '0')}`;
+                    
+                // Change color and add blinking effect
+                const countdownEl = document.getElementById('countdown');
+                const timerAlert = document.getElementById('timerAlert');
+                
+                if (timeLeft <= 1000) {
+                    // Blink when 1 second or less remains
+                    countdownEl.style.color = 'var(--error)';
+                    timerAlert.style.animation = 'pulse 0.8s ease-in-out infinite';
+                    countdownEl.style.animation = 'pulse 0.8s ease-in-out infinite';
+                } else if (minutes <= 2) {
+                    countdownEl.style.color = 'var(--error)';
+                    timerAlert.style.animation = 'none';
+                    countdownEl.style.animation = 'none';
+                } else if (minutes <= 5) {
+                    countdownEl.style.color = 'var(--warning)';
+                    timerAlert.style.animation = 'none';
+                    countdownEl.style.animation = 'none';
+                }
+            } else {
+                document.getElementById('countdown').innerHTML = 'EXPIRED';
+                document.getElementById('countdown').style.color = 'var(--error)';
+                
+                // Disable form
+                if (verifyBtn) {
+                    verifyBtn.disabled = true;
+                    verifyBtn.innerHTML = '<i class="fas fa-clock"></i> Link Expired';
+                    verifyBtn.classList.add('btn-danger');
+                    verifyBtn.classList.remove('btn-primary');
+                }
+                
+                // Show expiration message
+                showNotification('This download link has expired for security reasons.', 'error');
+            }
+        }
+        
+            updateCountdown();
+            setInterval(updateCountdown, 1000);
+        }
+    }
+
+    // Interactive step indicators
+    function updateStepIndicators() {
+        const stepItems = document.querySelectorAll('.step-item');
+        const otpFilled = otpInput && otpInput.value && otpInput.value.replace('-', '').length === 6;
+        const secretFilled = secretKeyInput && secretKeyInput.value.trim().length > 0;
+        
+        // Update step 1 (OTP)
+        if (otpFilled) {
+            stepItems[0].classList.add('completed');
+            stepItems[0].querySelector('.step-circle').style.background = 'var(--success)';
+            stepItems[0].querySelector('i').className = 'fas fa-check';
+            stepItems[0].querySelector('span').style.color = 'var(--success)';
+        } else {
+            stepItems[0].classList.remove('completed');
+            stepItems[0].querySelector('.step-circle').style.background = 'var(--accent)';
+            stepItems[0].querySelector('i').className = 'fas fa-key';
+            stepItems[0].querySelector('span').style.color = 'var(--accent-solid)';
+        }
+        
+        // Update step 2 (Secret Key)
+        if (secretFilled) {
+            stepItems[1].classList.add('active', 'completed');
+            stepItems[1].querySelector('.step-circle').style.background = 'var(--success)';
+            stepItems[1].querySelector('.step-circle').style.border = '2px solid var(--success)';
+            stepItems[1].querySelector('i').className = 'fas fa-check';
+            stepItems[1].querySelector('i').style.color = 'white';
+            stepItems[1].querySelector('span').style.color = 'var(--success)';
+        } else if (otpFilled) {
+            stepItems[1].classList.add('active');
+            stepItems[1].querySelector('.step-circle').style.background = 'var(--secondary-solid)';
+            stepItems[1].querySelector('.step-circle').style.border = '2px solid var(--secondary-solid)';
+            stepItems[1].querySelector('i').style.color = 'white';
+            stepItems[1].querySelector('span').style.color = 'var(--secondary-solid)';
+        } else {
+            stepItems[1].classList.remove('active', 'completed');
+            stepItems[1].querySelector('.step-circle').style.background = 'rgba(113, 128, 150, 0.2)';
+            stepItems[1].querySelector('.step-circle').style.border = '2px solid rgba(113, 128, 150, 0.3)';
+            stepItems[1].querySelector('i').style.color = 'var(--text-muted)';
+            stepItems[1].querySelector('span').style.color = 'var(--text-muted)';
+        }
+        
+        // Update submit button state
+        if (otpFilled && secretFilled) {
+            verifyBtn.disabled = false;
+            verifyBtn.style.opacity = '1';
+            verifyBtn.style.cursor = 'pointer';
+            verifyBtn.style.background = 'linear-gradient(135deg, var(--accent-solid) 0%, #3b82f6 100%)';
+        } else {
+            verifyBtn.disabled = true;
+            verifyBtn.style.opacity = '0.6';
+            verifyBtn.style.cursor = 'not-allowed';
+            verifyBtn.style.background = 'rgba(113, 128, 150, 0.3)';
+        }
+    }
+    
+    // Add event listeners for real-time step updates
+    if (otpInput) {
+        otpInput.addEventListener('input', updateStepIndicators);
+        otpInput.addEventListener('paste', () => setTimeout(updateStepIndicators, 100));
+    }
+    
+    if (secretKeyInput) {
+        secretKeyInput.addEventListener('input', updateStepIndicators);
+        secretKeyInput.addEventListener('paste', () => setTimeout(updateStepIndicators, 100));
+    }
+    
+    // Initial step update
+    setTimeout(updateStepIndicators, 100);
+    
+    // Auto-focus first empty field with enhanced animation
+    if (otpInput && !otpInput.value) {
+        setTimeout(() => {
+            otpInput.focus();
+            otpInput.click(); // Ensure input is properly focused
+            // Add a subtle pulse effect
+            otpInput.style.animation = 'inputPulse 0.6s ease-in-out';
+        }, 800);
+    } else if (secretKeyInput && !secretKeyInput.value) {
+        setTimeout(() => {
+            secretKeyInput.focus();
+            secretKeyInput.click(); // Ensure input is properly focused
+        }, 800);
+    }
+    
+    // Add click handlers to ensure inputs are clickable
+    if (otpInput) {
+        otpInput.addEventListener('click', function(e) {
+            e.stopPropagation();
+            this.focus();
+        });
+    }
+    
+    if (secretKeyInput) {
+        secretKeyInput.addEventListener('click', function(e) {
+            e.stopPropagation();
+            this.focus();
+        });
+    }
+
+    // Add visual feedback for form validation
+    [otpInput, secretKeyInput].forEach(input => {
+        if (input) {
+            input.addEventListener('blur', function() {
+                if (this.hasAttribute('required') && !this.value.trim()) {
+                    this.style.borderColor = 'var(--error)';
+                } else {
+                    this.style.borderColor = '';
+                }
+            });
+
+            input.addEventListener('input', function() {
+                if (this.style.borderColor === 'var(--error)' && this.value.trim()) {
+                    this.style.borderColor = '';
+                }
+            });
+        }
+    });
+});
+
+// Add keyboard shortcuts
+document.addEventListener('keydown', function(e) {
+    // Ctrl/Cmd + Enter to submit form
+    if ((e.ctrlKey || e.metaKey) && e.key === 'Enter') {
+        const form = document.getElementById('verifyForm');
+        if (form) {
+            form.dispatchEvent(new Event('submit'));
+        }
+    }
+});
@@ -0,0 +1,102 @@
+"""
+Disk-capacity admission control for blob writes.
+
+Usage is never measured by walking uploads/: live blob bytes are counted
+in the database (see store.reserve_storage) and moved in the same
+transaction that adds or drops a blob, so every gunicorn worker sees the
+same numbers. Space is reserved before a blob is written; a failed write
+hands the reservation back.
+"""
+import shutil
+from contextlib import contextmanager
+
+from flask import current_app
+
+import store
+from store import now_ts
+
+
+class StorageFull(Exception):
+    """No room for the blob; `reason` is "disk", "instance" or "sender"."""
+
+    def __init__(self, reason):
+        super().__init__(f"storage exhausted ({reason})")
+        self.reason = reason
+
+
+class StorageManager:
+    def __init__(self, uploads, purge, instance_quota=0, sender_quota=0,
+                 min_free_bytes=0, reap_window=0, metrics=None):
+        """`purge(row)` deletes a transfer row, returning the blob path it
+        orphaned (if it held the last reference)"""
+        self.uploads = uploads
+        self.purge = purge
+        self.instance_quota = instance_quota
+        self.sender_quota = sender_quota
+        self.min_free_bytes = min_free_bytes
+        # Seconds ahead of expiry a live transfer may be reaped early to make
+        # room; 0 only ever reaps transfers that have already expired.
+        self.reap_window = reap_window
+        self.metrics = metrics
+
+    def _disk_free(self):
+        try:
+            return shutil.disk_usage(self.uploads).free
+        except FileNotFoundError:
+            return shutil.disk_usage(current_app.root_path).free
+
+    def _try_reserve(self, sender, nbytes):
+        if self._disk_free() - nbytes < self.min_free_bytes:
+            return "disk"
+        return store.reserve_storage(sender, nbytes, self.instance_quota, self.sender_quota)
+
+    def _reap(self, nbytes, window):
+        """Purge transfers expiring within `window` seconds, soonest first,
+        until about nbytes have been freed"""
+        freed = 0
+        for row in store.soonest_expiring_live(limit=100, before=now_ts() + window):
+            if self.purge(row):
+                freed += row["blob_size"] or 0
+            if self.metrics:
+                self.metrics.inc("storage_reaped_total")
+            if freed >= nbytes:
+                break
+        return freed
+
+    def reserve(self, sender, nbytes):
+        reason = self._try_reserve(sender, nbytes)
+        if reason in ("disk", "instance"):
+            # Expired transfers are fair game; early reaping only if enabled
+            self._reap(nbytes, 0)
+            reason = self._try_reserve(sender, nbytes)
+            if reason in ("disk", "instance") and self.reap_window:
+                self._reap(nbytes, self.reap_window)
+                reason = self._try_reserve(sender, nbytes)
+        if reason:
+            if self.metrics:
+                self.metrics.inc("storage_rejections_total", reason=reason)
+            raise StorageFull(reason)
+
+    @contextmanager
+    def reservation(self, sender, nbytes):
+        """Hold nbytes for a blob write; released if the block raises"""
+        self.reserve(sender, nbytes)
+        try:
+            yield nbytes
+        except BaseException:
+            store.release_storage(sender, nbytes)
+            raise
+
+    def collect(self):
+        """Gauges for the metrics endpoint"""
+        gauges = {
+            "storage_used_bytes": store.storage_usage(),
+            "storage_disk_free_bytes": self._disk_free(),
+        }
+        if self.instance_quota:
+            gauges["storage_quota_bytes"] = self.instance_quota
+        return gauges
+
+
+def get_storage():
+    return current_app.extensions["storage"]
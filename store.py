@@ -0,0 +1,791 @@
+"""
+SQLite data layer for BlackFile transfers.
+
+Schema history (tracked in PRAGMA user_version):
+  1 - original layout: AUTOINCREMENT id, TEXT token, ISO TIMESTAMP columns,
+      base64/hex text for nonces and digests
+  2 - WITHOUT ROWID table keyed on the raw 16-byte token, epoch-second
+      INTEGER times, BLOB nonces/digests and a partial index over live rows
+  3 - `meta` key/value table; `token_generation` is bumped with every
+      transfer insert/delete so workers can tell when their token filter
+      is stale
+  4 - `blobs` table; transfers reference a (possibly shared) ciphertext by
+      `blob_id` instead of carrying a file path, so one upload can fan out
+      to several recipients. A blob is unlinked when its refcount hits 0.
+  5 - storage accounting: blobs record their `sender`; live blob bytes are
+      kept in meta.storage_bytes and per-sender in `sender_usage`, moved in
+      the same transaction as the blob row (or its reservation) changes
+  6 - blobs record their `segment_size`: new blobs are sealed in segments
+      (see blobcrypt.py) so downloads can stream; 0 marks a blob written
+      as a single AES-GCM message by earlier versions
+  7 - `leases` table: time-limited named locks, so that in a multi-node
+      deployment exactly one node runs maintenance (see maintenance.py)
+  8 - append-only `transfer_events` (created, verified, downloaded, ...)
+      and `usage_hourly` rollups, each event adding to its hour's row in
+      the same transaction, so stats never need to scan the events
+  9 - `pending_secrets`: sealed one-time secrets waiting for the sender's
+      /sent/ page (see secret_store.py), replacing cookie-held secrets
+
+The same layout is available on PostgreSQL (store_pg.py) for deployments
+where several hosts share the metadata; DATABASE_URL picks the backend.
+"""
+import os
+import base64
+import binascii
+import calendar
+import datetime
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+SCHEMA_VERSION = 9
+
+# -------------------- Schema --------------------
+TRANSFERS_V2 = """
+    CREATE TABLE transfers (
+        token BLOB PRIMARY KEY,          -- 16 raw bytes of the hex link token
+        recipient_email TEXT NOT NULL,
+        otp_hash BLOB NOT NULL,          -- sha256(salt_hex + otp)
+        otp_salt BLOB NOT NULL,
+        key_id BLOB NOT NULL,            -- 16-byte fingerprint of the secret key
+        filename_orig TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        nonce BLOB NOT NULL,
+        sha256 BLOB NOT NULL,            -- integrity hash of plaintext
+        created_at INTEGER NOT NULL,     -- epoch seconds, UTC
+        expires_at INTEGER NOT NULL,
+        used INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        locked_until INTEGER,
+        downloaded_from_ip TEXT
+    ) WITHOUT ROWID
+"""
+TRANSFERS_V4 = """
+    CREATE TABLE transfers (
+        token BLOB PRIMARY KEY,
+        recipient_email TEXT NOT NULL,
+        otp_hash BLOB NOT NULL,
+        otp_salt BLOB NOT NULL,
+        key_id BLOB NOT NULL,
+        filename_orig TEXT NOT NULL,
+        blob_id BLOB NOT NULL,           -- blobs.blob_id, shared by fan-out rows
+        nonce BLOB NOT NULL,
+        sha256 BLOB NOT NULL,
+        created_at INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL,
+        used INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        locked_until INTEGER,
+        downloaded_from_ip TEXT
+    ) WITHOUT ROWID
+"""
+BLOBS = """
+    CREATE TABLE blobs (
+        blob_id BLOB PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,           -- ciphertext bytes on disk
+        refcount INTEGER NOT NULL        -- transfers with used=0 pointing here
+    ) WITHOUT ROWID
+"""
+# Only rows still waiting for a download need expiry lookups by time
+LIVE_EXPIRES_INDEX = """
+    CREATE INDEX idx_transfers_live_expires ON transfers(expires_at) WHERE used = 0
+"""
+
+
+def _create_v2(con):
+    con.execute(TRANSFERS_V2)
+    con.execute(LIVE_EXPIRES_INDEX)
+
+
+def _epoch(val):
+    """Epoch seconds for a v1 TIMESTAMP value (ISO text written by sqlite3)"""
+    if val is None or val == "":
+        return None
+    if isinstance(val, (int, float)):
+        return int(val)
+    dt = datetime.datetime.fromisoformat(val)
+    return calendar.timegm(dt.timetuple())
+
+
+def _migrate_v1_to_v2(con):
+    rows = con.execute("SELECT * FROM transfers").fetchall()
+    con.execute("ALTER TABLE transfers RENAME TO transfers_v1")
+    _create_v2(con)
+    for row in rows:
+        try:
+            values = (
+                bytes.fromhex(row["token"]),
+                row["recipient_email"],
+                bytes.fromhex(row["otp_hash"]),
+                bytes.fromhex(row["otp_salt"]),
+                bytes.fromhex(row["key_id"]),
+                row["filename_orig"],
+                row["filepath"],
+                base64.b64decode(row["nonce_b64"]),
+                bytes.fromhex(row["sha256_hex"]),
+                _epoch(row["created_at"]),
+                _epoch(row["expires_at"]),
+                row["used"] or 0,
+                row["attempts"] or 0,
+                _epoch(row["locked_until"]),
+                row["downloaded_from_ip"],
+            )
+        except (TypeError, ValueError, binascii.Error):
+            # Unreadable legacy row: its link could never verify anyway
+            continue
+        con.execute("""
+            INSERT OR IGNORE INTO transfers (
+                token, recipient_email, otp_hash, otp_salt, key_id,
+                filename_orig, filepath, nonce, sha256, created_at, expires_at,
+                used, attempts, locked_until, downloaded_from_ip
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, values)
+    con.execute("DROP TABLE transfers_v1")
+
+
+def _migrate_v2_to_v3(con):
+    con.execute("""
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    con.execute("INSERT INTO meta (key, value) VALUES ('token_generation', 0)")
+
+
+def _migrate_v3_to_v4(con):
+    con.execute(BLOBS)
+    con.execute("ALTER TABLE transfers RENAME TO transfers_v3")
+    con.execute("DROP INDEX idx_transfers_live_expires")
+    con.execute(TRANSFERS_V4)
+    con.execute(LIVE_EXPIRES_INDEX)
+    # Every v3 row owned its own file; reuse the token as its blob id
+    con.execute("""
+        INSERT INTO transfers (
+            token, recipient_email, otp_hash, otp_salt, key_id, filename_orig,
+            blob_id, nonce, sha256, created_at, expires_at,
+            used, attempts, locked_until, downloaded_from_ip
+        )
+        SELECT token, recipient_email, otp_hash, otp_salt, key_id, filename_orig,
+               token, nonce, sha256, created_at, expires_at,
+               used, attempts, locked_until, downloaded_from_ip
+        FROM transfers_v3
+    """)
+    for token_b, path in con.execute("SELECT token, filepath FROM transfers_v3 WHERE used=0").fetchall():
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        con.execute(
+            "INSERT INTO blobs (blob_id, path, size, refcount) VALUES (?, ?, ?, 1)",
+            (token_b, path, size)
+        )
+    con.execute("DROP TABLE transfers_v3")
+
+
+def _migrate_v4_to_v5(con):
+    con.execute("ALTER TABLE blobs ADD COLUMN sender TEXT NOT NULL DEFAULT ''")
+    con.execute("""
+        CREATE TABLE sender_usage (
+            sender TEXT PRIMARY KEY,
+            bytes INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    con.execute("""
+        INSERT INTO meta (key, value)
+        SELECT 'storage_bytes', COALESCE(SUM(size), 0) FROM blobs
+    """)
+    con.execute("""
+        INSERT INTO sender_usage (sender, bytes)
+        SELECT sender, SUM(size) FROM blobs GROUP BY sender
+    """)
+
+
+def _migrate_v5_to_v6(con):
+    con.execute("ALTER TABLE blobs ADD COLUMN segment_size INTEGER NOT NULL DEFAULT 0")
+
+
+LEASES = """
+    CREATE TABLE leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at INTEGER NOT NULL      -- epoch seconds; free after this
+    ) WITHOUT ROWID
+"""
+
+
+def _migrate_v6_to_v7(con):
+    con.execute(LEASES)
+
+
+TRANSFER_EVENTS = """
+    CREATE TABLE transfer_events (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,             -- epoch seconds
+        kind TEXT NOT NULL,              -- one of EVENT_KINDS
+        token BLOB,                      -- outlives the transfers row
+        bytes INTEGER NOT NULL DEFAULT 0,
+        duration_ms INTEGER NOT NULL DEFAULT 0
+    )
+"""
+USAGE_HOURLY = """
+    CREATE TABLE usage_hourly (
+        hour INTEGER NOT NULL,           -- epoch seconds at the start of the hour
+        kind TEXT NOT NULL,
+        events INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        duration_ms INTEGER NOT NULL,
+        PRIMARY KEY (hour, kind)
+    ) WITHOUT ROWID
+"""
+
+
+def _migrate_v7_to_v8(con):
+    con.execute(TRANSFER_EVENTS)
+    con.execute("CREATE INDEX idx_transfer_events_ts ON transfer_events(ts)")
+    con.execute(USAGE_HOURLY)
+
+
+PENDING_SECRETS = """
+    CREATE TABLE pending_secrets (
+        id BLOB PRIMARY KEY,             -- HMAC of the cookie handle
+        sealed BLOB NOT NULL,            -- nonce + AES-GCM under a handle-derived key
+        expires_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+"""
+
+
+def _migrate_v8_to_v9(con):
+    con.execute(PENDING_SECRETS)
+
+
+# from_version -> callable upgrading the file to from_version + 1
+MIGRATIONS = {
+    1: _migrate_v1_to_v2,
+    2: _migrate_v2_to_v3,
+    3: _migrate_v3_to_v4,
+    4: _migrate_v4_to_v5,
+    5: _migrate_v5_to_v6,
+    6: _migrate_v6_to_v7,
+    7: _migrate_v7_to_v8,
+    8: _migrate_v8_to_v9,
+}
+
+
+def init_db(con):
+    """Bring the file up to SCHEMA_VERSION, skipping all DDL when current"""
+    if con.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    # Only takes effect before the first table exists (it cannot change
+    # inside a transaction); older files are converted once by
+    # sqlite_maintenance.py
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # IMMEDIATE takes the write lock up front so concurrent workers queue
+    # behind a single migration instead of racing it.
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        has_table = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='transfers'"
+        ).fetchone()
+        if version == 0 and has_table:
+            version = 1  # pre-versioning files carry the v1 layout
+        if version == 0:
+            _create_v2(con)
+            version = 2
+        while version < SCHEMA_VERSION:
+            MIGRATIONS[version](con)
+            version += 1
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+
+# -------------------- Connections --------------------
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def connect(path):
+    con = sqlite3.connect(path, check_same_thread=False)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+def is_server_url(url) -> bool:
+    return bool(url) and url.startswith(("postgres://", "postgresql://"))
+
+
+def db():
+    """Connection for the current app context, opened on first use"""
+    con = g.get("_db")
+    if con is None:
+        url = current_app.config.get("DATABASE_URL")
+        if is_server_url(url):
+            import store_pg
+            key, con, init = url, store_pg.acquire(url), store_pg.init_db
+        else:
+            key = current_app.config["DB_PATH"]
+            con, init = connect(key), init_db
+        if key not in _schema_ready:
+            with _schema_lock:
+                if key not in _schema_ready:
+                    init(con)
+                    if current_app.config.get("SQLITE_WAL") and isinstance(con, sqlite3.Connection):
+                        # Persistent in the file; readers stop blocking the writer
+                        con.execute("PRAGMA journal_mode = WAL")
+                    _schema_ready.add(key)
+        g._db = con
+    return con
+
+
+def close_db(exc=None):
+    con = g.pop("_db", None)
+    if con is not None:
+        con.close()
+
+
+def _begin_write(con):
+    """Start a transaction that holds the write lock until commit"""
+    if isinstance(con, sqlite3.Connection):
+        con.execute("BEGIN IMMEDIATE")
+    else:
+        con.begin_write()
+
+
+# -------------------- Helpers --------------------
+def now_ts() -> int:
+    return int(time.time())
+
+
+def token_bytes(token: str):
+    """Primary-key form of a link token, or None if it cannot be one"""
+    if len(token) != 32:
+        return None
+    try:
+        return bytes.fromhex(token)
+    except ValueError:
+        return None
+
+
+# -------------------- Queries --------------------
+def _bump_generation(con) -> int:
+    """Advance token_generation inside the caller's transaction"""
+    return con.execute(
+        "UPDATE meta SET value = value + 1 WHERE key='token_generation' RETURNING value"
+    ).fetchone()[0]
+
+
+def token_generation() -> int:
+    return db().execute("SELECT value FROM meta WHERE key='token_generation'").fetchone()[0]
+
+
+def all_tokens():
+    return [row[0] for row in db().execute("SELECT token FROM transfers")]
+
+
+# Transfer rows joined with their blob; blob_path is NULL once released
+TRANSFER_SELECT = """
+    SELECT t.*, b.path AS blob_path, b.size AS blob_size, b.segment_size
+    FROM transfers t LEFT JOIN blobs b ON b.blob_id = t.blob_id
+"""
+
+
+def get_transfer(token_b: bytes):
+    return db().execute(TRANSFER_SELECT + " WHERE t.token=?", (token_b,)).fetchone()
+
+
+def transfer_state(token_b: bytes):
+    """The columns that change after creation, by primary key alone"""
+    return db().execute(
+        "SELECT used, attempts, locked_until, downloaded_from_ip FROM transfers WHERE token=?", (token_b,)
+    ).fetchone()
+
+
+def transfers_for_blob(blob_id: bytes):
+    return db().execute(
+        "SELECT token, recipient_email FROM transfers WHERE blob_id=?", (blob_id,)
+    ).fetchall()
+
+
+def insert_transfers(blob_id, path, size, rows, sender="", reserved=None, segment_size=0,
+                     duration_ms=0):
+    """Store one blob and the transfer rows sharing it, atomically.
+
+    `rows` holds (token_b, recipient_email, otp_hash, otp_salt, key_id,
+    filename_orig, nonce, sha256, created_at, expires_at) tuples. `reserved`
+    is the byte count taken by reserve_storage(); any difference from the
+    final size is settled here. Each row gets a "created" event.
+    """
+    con = db()
+    try:
+        con.execute(
+            "INSERT INTO blobs (blob_id, path, size, refcount, sender, segment_size) VALUES (?, ?, ?, ?, ?, ?)",
+            (blob_id, path, size, len(rows), sender, segment_size)
+        )
+        if reserved is not None and reserved != size:
+            _adjust_usage(con, sender, size - reserved)
+        con.executemany("""
+            INSERT INTO transfers (
+                token, recipient_email, otp_hash, otp_salt, key_id,
+                filename_orig, nonce, sha256, created_at, expires_at, blob_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [r + (blob_id,) for r in rows])
+        for r in rows:
+            _record_event(con, "created", r[0], size, duration_ms, ts=r[8])
+        generation = _bump_generation(con)
+        con.commit()
+    except Exception:
+        # Else the next commit on this connection (release_storage) keeps the blob row
+        con.rollback()
+        raise
+    return generation
+
+
+def _release_blob(con, blob_id):
+    """Drop one reference; returns the path to unlink if it was the last"""
+    row = con.execute(
+        "UPDATE blobs SET refcount = refcount - 1 WHERE blob_id=? RETURNING refcount, path, size, sender",
+        (blob_id,)
+    ).fetchone()
+    if row is None or row["refcount"] > 0:
+        return None
+    con.execute("DELETE FROM blobs WHERE blob_id=?", (blob_id,))
+    _adjust_usage(con, row["sender"], -row["size"])
+    return row["path"]
+
+
+# -------------------- Storage accounting --------------------
+def _adjust_usage(con, sender, delta):
+    con.execute("UPDATE meta SET value = value + ? WHERE key='storage_bytes'", (delta,))
+    con.execute("""
+        INSERT INTO sender_usage (sender, bytes) VALUES (?, ?)
+        ON CONFLICT(sender) DO UPDATE SET bytes = sender_usage.bytes + excluded.bytes
+    """, (sender, delta))
+    con.execute("DELETE FROM sender_usage WHERE sender=? AND bytes <= 0", (sender,))
+
+
+def reserve_storage(sender, nbytes, instance_quota, sender_quota):
+    """Atomically claim nbytes against both quotas (0 = unlimited).
+
+    Returns None on success, or "instance"/"sender" naming the quota that
+    would be exceeded, in which case nothing was claimed.
+    """
+    con = db()
+    _begin_write(con)
+    try:
+        used = con.execute("SELECT value FROM meta WHERE key='storage_bytes'").fetchone()[0]
+        if instance_quota and used + nbytes > instance_quota:
+            con.rollback()
+            return "instance"
+        if sender_quota:
+            row = con.execute("SELECT bytes FROM sender_usage WHERE sender=?", (sender,)).fetchone()
+            if (row["bytes"] if row else 0) + nbytes > sender_quota:
+                con.rollback()
+                return "sender"
+        _adjust_usage(con, sender, nbytes)
+        con.commit()
+        return None
+    except Exception:
+        con.rollback()
+        raise
+
+
+def release_storage(sender, nbytes):
+    """Return a reservation whose blob never made it into the table"""
+    con = db()
+    _adjust_usage(con, sender, -nbytes)
+    con.commit()
+
+
+def storage_usage(sender=None):
+    con = db()
+    if sender is None:
+        return con.execute("SELECT value FROM meta WHERE key='storage_bytes'").fetchone()[0]
+    row = con.execute("SELECT bytes FROM sender_usage WHERE sender=?", (sender,)).fetchone()
+    return row["bytes"] if row else 0
+
+
+def soonest_expiring_live(limit: int, before: int):
+    """Undownloaded rows expiring before `before`, soonest first"""
+    return db().execute(
+        TRANSFER_SELECT + " WHERE t.used=0 AND t.expires_at < ? ORDER BY t.expires_at LIMIT ?",
+        (before, limit)
+    ).fetchall()
+
+
+def delete_transfer(token_b: bytes, event="expired"):
+    """Delete a row; returns (generation, orphaned blob path or None), or
+    (None, None) when there was no row, e.g. another worker purged it first.
+    Only a real delete bumps the generation. Deleting a row still waiting
+    for its download records `event`."""
+    con = db()
+    try:
+        row = con.execute(
+            "DELETE FROM transfers WHERE token=? RETURNING blob_id, used", (token_b,)
+        ).fetchone()
+        if row is None:
+            con.rollback()
+            return None, None
+        orphan = None
+        if not row["used"]:
+            orphan = _release_blob(con, row["blob_id"])
+            _record_event(con, event, token_b)
+        generation = _bump_generation(con)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return generation, orphan
+
+
+def set_attempts(token_b: bytes, attempts: int, locked_until=None, event="otp_failed"):
+    con = db()
+    try:
+        _record_event(con, event, token_b)
+        if locked_until is None:
+            con.execute("UPDATE transfers SET attempts=? WHERE token=?", (attempts, token_b))
+        else:
+            con.execute(
+                "UPDATE transfers SET attempts=?, locked_until=? WHERE token=?",
+                (attempts, locked_until, token_b)
+            )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+
+def mark_downloaded(token_b: bytes, ip: str, duration_ms=0, delivered=None):
+    """Flag a row used; returns (claimed, blob path to unlink if this was
+    the last reference). Only one of two concurrent downloads claims it.
+
+    A claim records "verified"; `delivered` (plaintext bytes) also records
+    "downloaded" when the file has already been handed over whole. A
+    streamed download records that itself once the body is sent."""
+    con = db()
+    try:
+        row = con.execute(
+            "UPDATE transfers SET used=1, downloaded_from_ip=? WHERE token=? AND used=0 RETURNING blob_id",
+            (ip, token_b)
+        ).fetchone()
+        orphan = None
+        if row is not None:
+            orphan = _release_blob(con, row["blob_id"])
+            _record_event(con, "verified", token_b, duration_ms=duration_ms)
+            if delivered is not None:
+                _record_event(con, "downloaded", token_b, delivered, duration_ms)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return row is not None, orphan
+
+
+def expired_live_transfers(now: int):
+    """Expired rows that still hold a blob reference (partial index)"""
+    return db().execute(
+        TRANSFER_SELECT + " WHERE t.used=0 AND t.expires_at < ?", (now,)
+    ).fetchall()
+
+
+def delete_expired_used(now: int):
+    """Drop downloaded rows past expiry; they no longer hold a blob"""
+    con = db()
+    if con.execute("DELETE FROM transfers WHERE used=1 AND expires_at < ?", (now,)).rowcount:
+        _bump_generation(con)
+    con.commit()
+
+
+def blob_paths():
+    """Every blob file the table still references"""
+    return {row[0] for row in db().execute("SELECT path FROM blobs")}
+
+
+def blob_files():
+    return db().execute("SELECT blob_id, path, size FROM blobs").fetchall()
+
+
+def blobs_in(directory: str):
+    """Blobs stored under `directory`, the longest-lived first"""
+    prefix = directory.rstrip("/") + "/"
+    return db().execute(
+        "SELECT b.blob_id, b.path, b.size, MAX(t.expires_at) AS expires_at FROM blobs b"
+        " JOIN transfers t ON t.blob_id = b.blob_id"
+        " WHERE substr(b.path, 1, ?) = ? GROUP BY b.blob_id, b.path, b.size ORDER BY 4 DESC",
+        (len(prefix), prefix)
+    ).fetchall()
+
+
+def move_blob(blob_id: bytes, old_path: str, new_path: str) -> bool:
+    """Point a blob row at its new file; False if the blob is gone"""
+    con = db()
+    moved = con.execute(
+        "UPDATE blobs SET path=? WHERE blob_id=? AND path=?", (new_path, blob_id, old_path)
+    ).rowcount
+    con.commit()
+    return bool(moved)
+
+
+# -------------------- Events --------------------
+EVENT_KINDS = ("created", "verified", "downloaded", "otp_failed", "key_failed",
+               "expired", "revoked", "purged")
+
+
+def _record_event(con, kind, token_b=None, nbytes=0, duration_ms=0, ts=None):
+    """Append an event and fold it into its hour; the caller commits"""
+    ts = now_ts() if ts is None else ts
+    duration_ms = int(duration_ms)
+    con.execute(
+        "INSERT INTO transfer_events (ts, kind, token, bytes, duration_ms) VALUES (?, ?, ?, ?, ?)",
+        (ts, kind, token_b, nbytes, duration_ms)
+    )
+    con.execute("""
+        INSERT INTO usage_hourly (hour, kind, events, bytes, duration_ms) VALUES (?, ?, 1, ?, ?)
+        ON CONFLICT(hour, kind) DO UPDATE SET
+            events = usage_hourly.events + 1,
+            bytes = usage_hourly.bytes + excluded.bytes,
+            duration_ms = usage_hourly.duration_ms + excluded.duration_ms
+    """, (ts - ts % 3600, kind, nbytes, duration_ms))
+
+
+def record_event(kind, token_b=None, nbytes=0, duration_ms=0):
+    """Record an event that has no state change to ride along with"""
+    con = db()
+    _record_event(con, kind, token_b, nbytes, duration_ms)
+    con.commit()
+
+
+def hourly_usage(since: int, until=None):
+    """Rollup rows for hours starting in [since, until); reads the
+    primary key range only"""
+    until = now_ts() + 3600 if until is None else until
+    return db().execute(
+        "SELECT hour, kind, events, bytes, duration_ms FROM usage_hourly WHERE hour >= ? AND hour < ? ORDER BY hour, kind",
+        (since - since % 3600, until)
+    ).fetchall()
+
+
+def prune_events(before: int):
+    """Drop raw events older than `before`; the hourly rollups stay"""
+    con = db()
+    deleted = con.execute("DELETE FROM transfer_events WHERE ts < ?", (before,)).rowcount
+    con.commit()
+    return deleted
+
+
+def last_event_ts(con=None):
+    """When the newest event was recorded, or None. Every transfer state
+    change appends one, so this is the last write any worker made."""
+    return (con or db()).execute("SELECT MAX(ts) FROM transfer_events").fetchone()[0]
+
+
+# -------------------- One-time secrets --------------------
+def put_secret(entry_id: bytes, sealed: bytes, expires_at: int):
+    con = db()
+    con.execute(
+        "INSERT INTO pending_secrets (id, sealed, expires_at) VALUES (?, ?, ?)",
+        (entry_id, sealed, expires_at)
+    )
+    con.commit()
+
+
+def pop_secret(entry_id: bytes, now: int):
+    """Delete and return a live entry; a second pop finds nothing"""
+    con = db()
+    row = con.execute(
+        "DELETE FROM pending_secrets WHERE id=? RETURNING sealed, expires_at", (entry_id,)
+    ).fetchone()
+    con.commit()
+    return row["sealed"] if row is not None and row["expires_at"] > now else None
+
+
+def delete_expired_secrets(now: int):
+    con = db()
+    con.execute("DELETE FROM pending_secrets WHERE expires_at <= ?", (now,))
+    con.commit()
+
+
+# -------------------- SQLite upkeep --------------------
+def is_sqlite(con) -> bool:
+    return isinstance(con, sqlite3.Connection)
+
+
+def sqlite_stats(con, path):
+    """File, WAL and free-page figures; PRAGMAs only, no table scans"""
+    page_size = con.execute("PRAGMA page_size").fetchone()[0]
+    stats = {
+        "page_size": page_size,
+        "page_count": con.execute("PRAGMA page_count").fetchone()[0],
+        "freelist_count": con.execute("PRAGMA freelist_count").fetchone()[0],
+        "auto_vacuum": con.execute("PRAGMA auto_vacuum").fetchone()[0],
+        "journal_mode": con.execute("PRAGMA journal_mode").fetchone()[0],
+    }
+    for key, suffix in (("file_bytes", ""), ("wal_bytes", "-wal")):
+        try:
+            stats[key] = os.path.getsize(path + suffix)
+        except OSError:
+            stats[key] = 0
+    return stats
+
+
+def enable_incremental_vacuum(con):
+    """One-time conversion of a file created without auto_vacuum; VACUUM
+    rewrites the whole file and holds the write lock while it does"""
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    con.execute("VACUUM")
+
+
+def incremental_vacuum(con, pages: int) -> int:
+    """Return up to `pages` free pages to the filesystem; returns how many"""
+    before = con.execute("PRAGMA freelist_count").fetchone()[0]
+    # The pragma frees one page per step; execute() would only step it once
+    con.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    return before - con.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def wal_checkpoint(con, mode="PASSIVE"):
+    """(busy, wal frames, frames checkpointed) as PRAGMA wal_checkpoint reports"""
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Unknown checkpoint mode: {mode}")
+    return tuple(con.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+
+def optimize(con, full=False):
+    """Refresh planner statistics: a full ANALYZE, or PRAGMA optimize,
+    which re-analyzes only tables whose statistics have drifted"""
+    con.execute("ANALYZE" if full else "PRAGMA optimize")
+    con.commit()
+
+
+def has_statistics(con) -> bool:
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+    ).fetchone() is not None
+
+
+# -------------------- Leases --------------------
+def try_acquire_lease(name: str, holder: str, ttl: int, now=None) -> bool:
+    """Take or renew lease `name` for `ttl` seconds; False while another
+    holder's lease is still running"""
+    now = now_ts() if now is None else now
+    con = db()
+    row = con.execute("""
+        INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+        RETURNING holder
+    """, (name, holder, now + ttl, now)).fetchone()
+    con.commit()
+    return row is not None
+
+
+def release_lease(name: str, holder: str):
+    con = db()
+    con.execute("DELETE FROM leases WHERE name=? AND holder=?", (name, holder))
+    con.commit()
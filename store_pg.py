@@ -0,0 +1,229 @@
+"""
+PostgreSQL backend for the data layer, for deployments where several
+hosts share transfer metadata (DATABASE_URL=postgresql://...).
+
+store.py issues the same SQL against either backend. The connection
+wrapper here turns its `?` placeholders into psycopg's `%s` and returns
+rows that index like sqlite3.Row (by position or by column name).
+Differences in the schema live in SCHEMA below; BYTEA stands in for BLOB
+and BIGINT for epoch INTEGER columns. The version is kept in
+meta.schema_version, since PostgreSQL has no PRAGMA user_version.
+
+psycopg (3.x) is only imported when a server URL is configured.
+"""
+import threading
+from functools import lru_cache
+
+SCHEMA_VERSION = 9
+
+# Key for pg_advisory_xact_lock; serialises what SQLite does with BEGIN IMMEDIATE
+WRITE_LOCK_ID = 0x626C6B66  # "blkf"
+
+SCHEMA = [
+    """
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value BIGINT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE blobs (
+        blob_id BYTEA PRIMARY KEY,
+        path TEXT NOT NULL,
+        size BIGINT NOT NULL,
+        refcount INTEGER NOT NULL,
+        sender TEXT NOT NULL DEFAULT '',
+        segment_size INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE transfers (
+        token BYTEA PRIMARY KEY,
+        recipient_email TEXT NOT NULL,
+        otp_hash BYTEA NOT NULL,
+        otp_salt BYTEA NOT NULL,
+        key_id BYTEA NOT NULL,
+        filename_orig TEXT NOT NULL,
+        blob_id BYTEA NOT NULL,
+        nonce BYTEA NOT NULL,
+        sha256 BYTEA NOT NULL,
+        created_at BIGINT NOT NULL,
+        expires_at BIGINT NOT NULL,
+        used INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        locked_until BIGINT,
+        downloaded_from_ip TEXT
+    )
+    """,
+    "CREATE INDEX idx_transfers_live_expires ON transfers(expires_at) WHERE used = 0",
+    """
+    CREATE TABLE sender_usage (
+        sender TEXT PRIMARY KEY,
+        bytes BIGINT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at BIGINT NOT NULL
+    )
+    """,
+    "INSERT INTO meta (key, value) VALUES ('token_generation', 0), ('storage_bytes', 0)",
+]
+
+V8 = [
+    """
+    CREATE TABLE transfer_events (
+        id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        ts BIGINT NOT NULL,
+        kind TEXT NOT NULL,
+        token BYTEA,
+        bytes BIGINT NOT NULL DEFAULT 0,
+        duration_ms BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX idx_transfer_events_ts ON transfer_events(ts)",
+    """
+    CREATE TABLE usage_hourly (
+        hour BIGINT NOT NULL,
+        kind TEXT NOT NULL,
+        events BIGINT NOT NULL,
+        bytes BIGINT NOT NULL,
+        duration_ms BIGINT NOT NULL,
+        PRIMARY KEY (hour, kind)
+    )
+    """,
+]
+V9 = [
+    """
+    CREATE TABLE pending_secrets (
+        id BYTEA PRIMARY KEY,
+        sealed BYTEA NOT NULL,
+        expires_at BIGINT NOT NULL
+    )
+    """,
+]
+SCHEMA += V8 + V9
+
+# from_version -> list of statements upgrading to from_version + 1
+MIGRATIONS = {7: V8, 8: V9}
+
+POOL_SIZE = 8
+
+
+class Row:
+    """Read-only row addressable by index or column name"""
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._values[self._index[key]]
+        return self._values[key]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def keys(self):
+        return list(self._index)
+
+
+def _row_factory(cursor):
+    index = {col.name: i for i, col in enumerate(cursor.description or ())}
+    return lambda values: Row(index, values)
+
+
+@lru_cache(maxsize=256)
+def _sql(statement: str) -> str:
+    return statement.replace("%", "%%").replace("?", "%s")
+
+
+class Connection:
+    """The subset of sqlite3.Connection that store.py uses"""
+
+    def __init__(self, url):
+        import psycopg
+        self.url = url
+        self._con = psycopg.connect(url, row_factory=_row_factory)
+
+    def execute(self, statement, params=()):
+        return self._con.execute(_sql(statement), params)
+
+    def executemany(self, statement, seq):
+        cur = self._con.cursor()
+        cur.executemany(_sql(statement), list(seq))
+        return cur
+
+    def begin_write(self):
+        self._con.execute("SELECT pg_advisory_xact_lock(%s)", (WRITE_LOCK_ID,))
+
+    def commit(self):
+        self._con.commit()
+
+    def rollback(self):
+        self._con.rollback()
+
+    def close(self):
+        """Hand the connection back to the pool"""
+        release(self)
+
+    @property
+    def broken(self):
+        return self._con.closed or self._con.broken
+
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def acquire(url) -> Connection:
+    with _pool_lock:
+        idle = _pool.get(url)
+        while idle:
+            con = idle.pop()
+            if not con.broken:
+                return con
+    return Connection(url)
+
+
+def release(con: Connection):
+    if con.broken:
+        return
+    con.rollback()
+    with _pool_lock:
+        idle = _pool.setdefault(con.url, [])
+        if len(idle) < POOL_SIZE:
+            idle.append(con)
+            return
+    con._con.close()
+
+
+def init_db(con: Connection):
+    """Create or upgrade the schema; serialised across hosts by the lock"""
+    con.begin_write()
+    try:
+        exists = con.execute("SELECT to_regclass('meta')").fetchone()[0]
+        if exists is None:
+            for statement in SCHEMA:
+                con.execute(statement)
+            version = SCHEMA_VERSION
+            con.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (version,))
+        else:
+            row = con.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()
+            version = row[0]
+            while version < SCHEMA_VERSION:
+                for statement in MIGRATIONS[version]:
+                    con.execute(statement)
+                version += 1
+            con.execute("UPDATE meta SET value=? WHERE key='schema_version'", (version,))
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
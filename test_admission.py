@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Admission control: heavy route classes are queued and shed with 503 +
+Retry-After while light ones keep being served, streamed downloads hold
+their slot until closed, and queue time is counted per class.
+"""
+import os
+import threading
+
+import pytest
+
+import admission
+from conftest import upload
+
+STREAM = {"Accept": "application/octet-stream"}
+
+
+@pytest.fixture
+def client(make_client):
+    test_client = make_client(
+        ADMISSION_LIMITS="page=8:8:500,verify=8:8:500,upload=2:2:1000,download=1:1:50",
+        ADMISSION_RETRY_AFTER=7,
+    )
+    test_client.gates = test_client.application.extensions["admission"].gates
+    return test_client
+
+
+def counters(client):
+    return client.application.extensions["metrics"].snapshot()["counters"]
+
+
+def test_classify():
+    assert admission.classify("static", "GET") == "static"
+    assert admission.classify("verify", "GET") == "verify"
+    assert admission.classify("verify", "POST") == "download"
+    assert admission.classify("api_create_transfer", "POST") == "upload"
+    assert admission.classify(None, "GET") == "page"
+    with pytest.raises(ValueError):
+        admission.parse_limits("uploads=1:1:1")
+
+
+def test_heavy_class_shed_while_light_routes_served(client):
+    secret, [(token, otp)] = upload(client, "a@example.com", os.urandom(3000))
+    gate = client.gates["download"]
+    assert gate.acquire()[0]  # a download already in progress
+
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret})
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "7"
+    assert client.get("/").status_code == 200
+    assert client.get(f"/verify/{token}").status_code == 200
+
+    stats = counters(client)
+    assert stats['admission_shed_total{class="download",reason="timeout"}'] == 1
+    assert stats['admission_queue_seconds_total{class="download"}'] >= 0.05
+    assert stats['admission_admitted_total{class="page"}'] >= 1
+
+    gate.release()
+    assert client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}).status_code == 200
+    assert gate.in_flight == 0
+
+
+def test_streamed_download_holds_slot_until_closed(client):
+    payload = os.urandom(200_000)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}, headers=STREAM)
+    assert client.gates["download"].in_flight == 1
+    assert resp.data == payload
+    resp.close()
+    assert client.gates["download"].in_flight == 0
+    gauges = client.get("/metrics?format=json").get_json()["gauges"]
+    assert gauges['admission_in_flight{class="download"}'] == 0
+
+
+def test_gate_queue_then_admit_or_shed():
+    gate = admission.Gate(1, queue=1, wait=5)
+    assert gate.acquire() == (True, 0.0, None)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+    waiter.start()
+    while not gate.waiting:
+        pass
+    assert gate.acquire() == (False, 0.0, "queue_full")
+    gate.release()
+    waiter.join()
+    admitted, waited, reason = results[0]
+    assert admitted and reason is None and gate.in_flight == 1
+
+
+def test_gate_admits_waiters_oldest_first():
+    gate = admission.Gate(1, queue=3, wait=5)
+    gate.acquire()
+    order = []
+
+    def wait_turn(n):
+        gate.acquire()
+        order.append(n)
+
+    threads = []
+    for n in range(3):
+        threads.append(threading.Thread(target=wait_turn, args=(n,)))
+        threads[-1].start()
+        while gate.waiting < n + 1:
+            pass
+    for n in range(3):
+        gate.release()
+        threads[n].join()
+    assert order == [0, 1, 2] and gate.in_flight == 1 and gate.waiting == 0
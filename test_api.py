@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+JSON API: create, inspect and revoke transfers; bearer auth for the API
+and /metrics; bulk_send.py against a live server.
+"""
+import io
+import json
+import os
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import bulk_send
+
+AUTH = {"Authorization": "Bearer test-api-token"}
+
+
+@pytest.fixture
+def application(make_app):
+    return make_app(API_TOKEN="test-api-token", ADMISSION_RETRY_AFTER=1)
+
+
+@pytest.fixture
+def client(application):
+    return application.test_client()
+
+
+def test_create_status_revoke(client):
+    resp = client.post("/api/v1/transfers", headers=AUTH, data={
+        "recipients": "a@example.com, b@example.com", "expiry": "10",
+        "file": (io.BytesIO(b"quarterly numbers"), "q3.csv", "text/csv"),
+    })
+    assert resp.status_code == 201
+    body = resp.get_json()
+    assert len(body["transfers"]) == 2 and body["secret_key"]
+    assert len(client.application.outbox) == 2
+
+    token = body["transfers"][0]["token"]
+    status = client.get(f"/api/v1/transfers/{token}", headers=AUTH).get_json()
+    assert status["state"] == "active" and status["recipient"] == "a@example.com"
+
+    assert client.delete(f"/api/v1/transfers/{token}", headers=AUTH).get_json()["state"] == "revoked"
+    assert client.get(f"/api/v1/transfers/{token}", headers=AUTH).status_code == 404
+    other = body["transfers"][1]["token"]
+    assert client.get(f"/api/v1/transfers/{other}", headers=AUTH).get_json()["state"] == "active"
+
+
+def test_raw_body_upload_and_validation(client):
+    resp = client.post("/api/v1/transfers?filename=raw.bin&recipients=a@example.com&expiry=5",
+                       headers=AUTH, data=b"\x00" * 100, content_type="application/octet-stream")
+    assert resp.status_code == 201 and resp.get_json()["filename"] == "raw.bin"
+
+    resp = client.post("/api/v1/transfers?filename=raw.bin&recipients=nope&expiry=5",
+                       headers=AUTH, data=b"x", content_type="application/octet-stream")
+    assert resp.status_code == 400 and "email" in resp.get_json()["error"]
+
+
+def test_auth(client):
+    assert client.get("/api/v1/transfers/" + "ab" * 16).status_code == 401
+    client.application.config["API_TOKEN"] = ""
+    assert client.get("/api/v1/transfers/" + "ab" * 16, headers=AUTH).status_code == 403
+
+
+def test_metrics_auth(application):
+    client = application.test_client()
+    assert client.get("/metrics").status_code == 200  # testing profile: open
+    application.testing = False
+    assert client.get("/metrics").status_code == 404
+    application.config["METRICS_TOKEN"] = "scrape-token"
+    assert client.get("/metrics", headers=AUTH).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).status_code == 200
+
+
+def test_bulk_send(application, tmp_path):
+    server = make_server("127.0.0.1", 0, application, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        files = []
+        for i in range(5):
+            path = tmp_path / f"report-{i}.bin"
+            path.write_bytes(os.urandom(1000 + i))
+            files.append(str(path))
+        manifest = tmp_path / "manifest.json"
+        code = bulk_send.main([
+            "--url", f"http://127.0.0.1:{server.server_port}", "--token", "test-api-token",
+            "--to", "ops@example.com", "--expiry", "60", "--workers", "3",
+            "--manifest", str(manifest), *files,
+        ])
+    finally:
+        server.shutdown()
+
+    assert code == 0
+    results = json.loads(manifest.read_text())["results"]
+    assert [r["file"] for r in results] == files
+    assert all(r["ok"] and len(r["transfers"]) == 1 for r in results)
+    assert len(application.outbox) == 5
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Blob tiers: small short-expiry blobs go to the RAM tier within its budget,
+are demoted to disk past it, and stay readable and purgeable wherever
+they are, including through paths cached before a demotion.
+"""
+import os
+
+import pytest
+
+import app as blackfile
+import store
+from conftest import download, send
+
+
+@pytest.fixture
+def client(tmp_path, make_client):
+    test_client = make_client(HOT_TIER_MB=1, HOT_TIER_DIR=str(tmp_path / "shm"), HOT_TIER_MAX_BLOB_MB=0.5)
+    test_client.tiers = test_client.application.extensions["blob_tiers"]
+    return test_client
+
+
+def blob_dirs(client):
+    with client.application.app_context():
+        return sorted(os.path.basename(os.path.dirname(p)) for p in store.blob_paths())
+
+
+def test_placement_by_size_expiry_and_budget(client):
+    send(client, 100_000)               # small, 5 min: hot
+    send(client, 100_000, expiry=60)    # long-lived: disk
+    send(client, 600_000)               # over the per-blob cap: disk
+    for _ in range(9):
+        send(client, 100_000)           # hot until the 1 MB budget is used up
+    dirs = blob_dirs(client)
+    assert dirs.count("shm") == 10 and dirs.count("uploads") == 2
+    assert client.tiers.hot_bytes() <= client.tiers.budget
+
+    counters = client.application.extensions["metrics"].snapshot()["counters"]
+    assert counters['blob_tier_writes_total{tier="hot"}'] == 10
+
+
+def test_demotion_keeps_cached_paths_readable(client):
+    creds = [send(client, 50_000) for _ in range(3)]
+    for token, _, _ in creds:
+        client.get(f"/verify/{token}")  # paths now cached
+    client.tiers.budget = 60_000
+    with client.application.app_context():
+        assert blackfile.demote_hot_blobs() == 2
+    assert blob_dirs(client) == ["shm", "uploads", "uploads"]
+
+    for token, otp, secret in creds:
+        assert len(download(client, token, otp, secret)) == 50_000
+    assert os.listdir(client.tiers.hot_dir) == [] and os.listdir(client.application.config["UPLOADS"]) == []
+
+
+def test_lost_hot_blob_purged_and_orphans_swept(client):
+    token, _, _ = send(client, 10_000)
+    [name] = os.listdir(client.tiers.hot_dir)
+    os.remove(os.path.join(client.tiers.hot_dir, name))  # host rebooted
+    stray = os.path.join(client.tiers.hot_dir, "ff" * 16 + ".blob")
+    open(stray, "wb").close()
+    os.utime(stray, (0, 0))
+    with client.application.app_context():
+        assert blackfile.recover_blobs() == (1, 1)
+        assert store.get_transfer(bytes.fromhex(token)) is None
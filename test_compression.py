@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Response compression: negotiated per request, limited to text bodies
+within the size bounds, never applied to downloads or static files.
+"""
+import gzip
+import os
+
+import pytest
+
+import compression
+from conftest import upload
+
+GZIP = {"Accept-Encoding": "gzip, deflate"}
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(API_TOKEN="test-api-token")
+
+
+def saved(client, endpoint):
+    counters = client.application.extensions["metrics"].snapshot()["counters"]
+    return counters.get(f'compression_bytes_saved_total{{encoding="gzip",endpoint="{endpoint}"}}', 0)
+
+
+def test_html_is_gzipped_when_accepted(client):
+    plain = client.get("/")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    resp = client.get("/", headers=GZIP)
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data) == plain.data
+    assert int(resp.headers["Content-Length"]) == len(resp.data) < len(plain.data)
+    assert saved(client, "index") == len(plain.data) - len(resp.data)
+
+    refused = client.get("/", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in refused.headers
+
+
+def test_small_binary_and_streamed_responses_untouched(client):
+    small = client.get("/api/v1/transfers/" + "0" * 32, headers=dict(GZIP, Authorization="Bearer test-api-token"))
+    assert small.status_code == 404 and "Content-Encoding" not in small.headers
+
+    css = client.get("/static/css/modern-style.css", headers=GZIP)
+    assert css.status_code == 200 and "Content-Encoding" not in css.headers
+    css.close()
+
+    payload = os.urandom(50_000)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret},
+                       headers=dict(GZIP, Accept="application/octet-stream"))
+    assert "Content-Encoding" not in resp.headers and resp.data == payload
+
+
+def test_download_page_and_oversized_bodies_untouched(client):
+    payload = os.urandom(50_000)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+    page = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}, headers=GZIP)
+    assert b"data-file-data" in page.data and "Content-Encoding" not in page.headers
+
+    client.application.extensions["compression"].max_bytes = 2048
+    home = client.get("/", headers=GZIP)
+    assert len(home.data) > 2048 and "Content-Encoding" not in home.headers
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli not installed")
+def test_brotli_preferred_when_available(client):
+    resp = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    assert compression.brotli.decompress(resp.data) == client.get("/").data
+
+
+def test_compressor_copies_are_independent():
+    c = compression.Compressor()
+    a, b = b"a" * 5000, b"b" * 5000
+    assert gzip.decompress(c._gzip_compress(a)) == a
+    assert gzip.decompress(c._gzip_compress(b)) == b
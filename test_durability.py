@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Crash-safe blob writes: temp file + rename under every durability mode,
+group fsync batching, and the startup recovery pass and its safeguards.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+import app as blackfile
+import blobstore
+from metrics import Metrics
+from conftest import upload
+
+
+@pytest.mark.parametrize("mode", blobstore.MODES)
+def test_write_is_atomic(tmp_path, mode):
+    writer = blobstore.BlobWriter(mode, group_window=0.001)
+    path = str(tmp_path / "a.blob")
+    assert writer.write(path, [b"abc", b"def"]) == 6
+    assert open(path, "rb").read() == b"abcdef"
+    assert os.listdir(tmp_path) == ["a.blob"]
+
+    def failing():
+        yield b"partial"
+        raise OSError("disk went away")
+
+    with pytest.raises(OSError):
+        writer.write(str(tmp_path / "b.blob"), failing())
+    assert os.listdir(tmp_path) == ["a.blob"]
+
+
+def test_group_mode_shares_fsyncs(tmp_path):
+    metrics = Metrics()
+    writer = blobstore.BlobWriter("group", group_window=0.05, metrics=metrics)
+    threads = [
+        threading.Thread(target=writer.write, args=(str(tmp_path / f"{i}.blob"), [b"x" * 1000]))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counters = metrics.snapshot()["counters"]
+    assert counters["blob_fsync_files_total"] == 8
+    assert counters["blob_fsync_batches_total"] < 8
+    assert len(os.listdir(tmp_path)) == 8
+
+
+def test_unknown_mode_rejected(make_app):
+    with pytest.raises(ValueError, match="BLOB_DURABILITY"):
+        make_app(BLOB_DURABILITY="sometimes")
+
+
+def test_recovery_pass(client):
+    secret, [(token, _)] = upload(client, "a@example.com", os.urandom(5000))
+    [blob] = client.uploads.iterdir()
+    blob.write_bytes(blob.read_bytes()[:100])  # lost its tail in a crash
+
+    old = time.time() - 120
+    for name in ("feed.blob", ".feed.blob.1234.tmp"):
+        (client.uploads / name).write_bytes(b"junk")
+        os.utime(client.uploads / name, (old, old))
+    (client.uploads / ".live.blob.5678.tmp").write_bytes(b"being written")
+
+    with client.application.app_context():
+        assert blackfile.recover_blobs() == (1, 2)  # the short blob goes with its row
+        assert blackfile.store.get_transfer(bytes.fromhex(token)) is None
+    assert os.listdir(client.uploads) == [".live.blob.5678.tmp"]
+
+
+def test_recovery_runs_once_under_the_lease(make_app, monkeypatch):
+    application = make_app(MAINTENANCE_INTERVAL=60)
+    calls = []
+    monkeypatch.setattr(blackfile, "recover_blobs", lambda: calls.append(1))
+    application.test_client().get("/")
+    assert calls == []  # not on requests
+
+    runner = application.extensions["maintenance"]
+    assert runner.tick() and runner.tick()
+    assert calls == [1]
+    with application.app_context():
+        assert not blackfile.store.try_acquire_lease("maintenance", "other-node:1", 60)
+
+
+def test_recovery_refuses_missing_uploads(client):
+    upload(client, "a@example.com", os.urandom(5000))
+    client.uploads.rename(client.uploads.with_name("unmounted"))
+    with client.application.app_context():
+        assert blackfile.recover_blobs() == (0, 0)
+        assert blackfile.store.db().execute("SELECT COUNT(*) FROM transfers").fetchone()[0] == 1
+    counters = client.application.extensions["metrics"].snapshot()["counters"]
+    assert counters["blob_recovery_skipped_total"] == 1
+
+
+def test_recovery_refuses_mass_loss(client):
+    for _ in range(blackfile.RECOVERY_MAX_LOST + 1):
+        upload(client, "a@example.com", os.urandom(500))
+    for blob in client.uploads.iterdir():
+        blob.unlink()  # an empty mount point where the volume should be
+    with client.application.app_context():
+        assert blackfile.recover_blobs() == (0, 0)
+        assert blackfile.store.db().execute("SELECT COUNT(*) FROM transfers").fetchone()[0] == 4
+
+
+@pytest.mark.parametrize("headers", [{}, {"Accept": "application/octet-stream"}])
+def test_missing_blob_file_purges_the_transfer(client, headers):
+    secret, [(token, otp)] = upload(client, "a@example.com", os.urandom(1000))
+    for name in os.listdir(client.uploads):
+        os.remove(client.uploads / name)
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}, headers=headers)
+    assert b"File Already Downloaded" in resp.data
+    with client.application.app_context():
+        assert blackfile.store.get_transfer(bytes.fromhex(token)) is None
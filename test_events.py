@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Transfer events: every state change appends an event and bumps its hourly
+rollup in the same transaction; the stats endpoint reads rollups only.
+"""
+import os
+import sqlite3
+
+import pytest
+
+import app as blackfile
+import store
+from conftest import download, upload
+
+AUTH = {"Authorization": "Bearer test-api-token"}
+STREAM = {"Accept": "application/octet-stream"}
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(API_TOKEN="test-api-token")
+
+
+def events(client):
+    with client.application.app_context():
+        return [(r["kind"], r["bytes"]) for r in store.db().execute(
+            "SELECT kind, bytes FROM transfer_events ORDER BY id")]
+
+
+def test_lifecycle_events_and_rollups(client):
+    payload = os.urandom(3000)
+    secret, [(t1, otp1), (t2, otp2), (t3, _)] = upload(
+        client, "a@example.com, b@example.com, c@example.com", payload)
+    wrong = f"{(int(otp1) + 1) % 1000000:06d}"
+    client.post(f"/verify/{t1}", data={"otp": wrong, "secret_key": secret})
+    assert download(client, t1, otp1, secret) == payload
+    assert client.post(f"/verify/{t2}", data={"otp": otp2, "secret_key": secret}, headers=STREAM).data == payload
+    assert client.delete(f"/api/v1/transfers/{t3}", headers=AUTH).status_code == 200
+
+    kinds = [kind for kind, _ in events(client)]
+    assert kinds == ["created"] * 3 + ["otp_failed", "verified", "downloaded",
+                                       "verified", "downloaded", "revoked"]
+    assert [b for kind, b in events(client) if kind == "downloaded"] == [3000, 3000]
+
+    stats = client.get("/api/v1/stats/hourly?hours=2", headers=AUTH).get_json()
+    totals = stats["totals"]
+    assert totals["created"]["events"] == 3 and totals["downloaded"]["bytes"] == 6000
+    assert totals["verified"]["events"] == 2 and totals["revoked"]["events"] == 1
+    assert len(stats["hours"]) == 1 and stats["hours"][0]["otp_failed"]["events"] == 1
+
+
+def test_prune_keeps_rollups(client):
+    upload(client, "a@example.com", b"x" * 100)
+    with client.application.app_context():
+        assert store.prune_events(store.now_ts() + 1) == 1
+        [row] = store.hourly_usage(0)
+        assert (row["kind"], row["events"]) == ("created", 1)
+    assert client.get("/api/v1/stats/hourly?hours=x", headers=AUTH).status_code == 400
+
+
+def test_v7_file_gains_event_tables(tmp_path):
+    path = tmp_path / "v7.db"
+    con = sqlite3.connect(path)
+    store._create_v2(con)
+    for version in range(2, 7):
+        store.MIGRATIONS[version](con)
+    con.execute("PRAGMA user_version = 7")
+    con.commit()
+    con.close()
+
+    application = blackfile.create_app("testing", {"DB_PATH": str(path)})
+    with application.app_context():
+        store.record_event("expired")
+        assert store.db().execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
+        assert [r["kind"] for r in store.hourly_usage(0)] == ["expired"]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Fan-out uploads: one ciphertext blob shared by per-recipient tokens,
+unlinked only when the last reference is downloaded or purged.
+"""
+import io
+import os
+
+import app as blackfile
+from conftest import download, upload
+
+
+def test_one_blob_many_tokens(client):
+    payload = os.urandom(4096)
+    secret, creds = upload(client, "a@example.com, b@example.com; c@example.com", payload)
+
+    assert len(creds) == 3 and len({token for token, _ in creds}) == 3
+    assert len(os.listdir(client.uploads)) == 1
+
+    for i, (token, otp) in enumerate(creds):
+        assert download(client, token, otp, secret) == payload
+        remaining = len(os.listdir(client.uploads))
+        assert remaining == (0 if i == len(creds) - 1 else 1)
+
+
+def test_expired_recipient_keeps_shared_blob(client):
+    payload = os.urandom(1024)
+    secret, creds = upload(client, "a@example.com, b@example.com", payload)
+
+    with client.application.app_context():
+        row = blackfile.store.get_transfer(bytes.fromhex(creds[0][0]))
+        blackfile.purge_row_and_files(row)
+    assert len(os.listdir(client.uploads)) == 1
+
+    token, otp = creds[1]
+    assert download(client, token, otp, secret) == payload
+    assert os.listdir(client.uploads) == []
+
+
+def test_recipient_limit(client):
+    client.application.config["MAX_RECIPIENTS"] = 2
+    resp = client.post("/upload", data={
+        "email": "a@example.com,b@example.com,c@example.com", "expiry": "10",
+        "file": (io.BytesIO(b"x"), "x.txt", "text/plain"),
+    })
+    assert resp.status_code == 302 and resp.headers["Location"] == "/"
+    assert client.outbox == []
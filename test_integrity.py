@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Download integrity: segmented blobs stream out with Digest headers, and a
+plaintext that does not match the stored SHA-256 is never fully delivered.
+"""
+import base64
+import hashlib
+import io
+import os
+
+import pytest
+
+import app as blackfile
+import blobcrypt
+from conftest import upload
+
+STREAM = {"Accept": "application/octet-stream"}
+
+
+def corruption_count(client):
+    counters = client.application.extensions["metrics"].snapshot()["counters"]
+    return counters.get("download_corruption_total", 0)
+
+
+def test_segments_roundtrip_and_detect_truncation():
+    key, nonce = blobcrypt.new_key(), blobcrypt.new_nonce()
+    data = os.urandom(2 * 1000 + 7)
+    blob = b"".join(blobcrypt.encrypt_segments(key, nonce, data, segment_size=1000))
+    assert len(blob) == blobcrypt.ciphertext_size(len(data), 1000)
+    assert blobcrypt.plaintext_size(len(blob), 1000) == len(data)
+
+    out = blobcrypt.decrypt_segments(key, nonce, io.BytesIO(blob), len(blob), 1000)
+    assert b"".join(out) == data
+
+    # Dropping the final segment is caught: the new last one is not marked final
+    cut = blob[:2 * (1000 + blobcrypt.TAG_BYTES)]
+    with pytest.raises(blobcrypt.IntegrityError):
+        b"".join(blobcrypt.decrypt_segments(key, nonce, io.BytesIO(cut), len(cut), 1000))
+
+
+def test_pool_matches_inline_and_catches_truncation():
+    pool = blobcrypt.SegmentPool(3, window=2, batch_bytes=2000)
+    key, nonce = blobcrypt.new_key(), blobcrypt.new_nonce()
+    data = os.urandom(9 * 1000 + 7)
+    blob = b"".join(blobcrypt.encrypt_segments(key, nonce, data, segment_size=1000))
+    assert b"".join(blobcrypt.encrypt_segments(key, nonce, data, 1000, pool=pool)) == blob
+    assert b"".join(blobcrypt.decrypt_segments(key, nonce, io.BytesIO(blob), len(blob), 1000, pool=pool)) == data
+
+    for cut in (len(blob) - 5, 4 * (1000 + blobcrypt.TAG_BYTES)):
+        with pytest.raises(blobcrypt.IntegrityError):
+            b"".join(blobcrypt.decrypt_segments(key, nonce, io.BytesIO(blob[:cut]), cut, 1000, pool=pool))
+    pool.shutdown()
+
+
+def test_parallel_upload_and_stream(make_client):
+    client = make_client(CRYPTO_WORKERS=4)
+    payload = os.urandom(5 * 1024 * 1024 + 99)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}, headers=STREAM)
+    assert resp.status_code == 200 and resp.data == payload
+
+
+def test_stream_download_with_digest(client):
+    payload = os.urandom(3 * blobcrypt.SEGMENT_SIZE + 123)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}, headers=STREAM)
+    assert resp.status_code == 200 and resp.data == payload
+    assert int(resp.headers["Content-Length"]) == len(payload)
+    digest = base64.b64encode(hashlib.sha256(payload).digest()).decode()
+    assert resp.headers["Repr-Digest"] == f"sha-256=:{digest}:"
+    assert resp.headers["Content-Disposition"] == 'attachment; filename="deck.pdf"'
+    assert os.listdir(client.uploads) == []
+
+
+def test_hash_mismatch_aborts_stream(client):
+    payload = os.urandom(3 * blobcrypt.SEGMENT_SIZE)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+    with client.application.app_context():
+        con = blackfile.store.db()
+        con.execute("UPDATE transfers SET sha256=? WHERE token=?", (b"\0" * 32, bytes.fromhex(token)))
+        con.commit()
+    # Written behind the app's back, so the cached copy is dropped too
+    client.application.extensions["transfer_cache"].discard(bytes.fromhex(token))
+
+    with pytest.raises(blobcrypt.IntegrityError):
+        client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret},
+                    headers=STREAM, buffered=True)
+    assert corruption_count(client) == 1
+
+
+def test_corrupt_blob_refused_before_link_is_spent(client):
+    payload = os.urandom(5000)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+    [blob] = client.uploads.iterdir()
+    data = bytearray(blob.read_bytes())
+    data[10] ^= 0xFF
+    blob.write_bytes(bytes(data))
+
+    resp = client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret})
+    assert resp.status_code == 500 and b"integrity check" in resp.data
+    assert corruption_count(client) == 1
+    with client.application.app_context():
+        assert not blackfile.store.get_transfer(bytes.fromhex(token))["used"]
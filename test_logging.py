@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+JSON log records: correlation fields from the request, masking of emails
+and IPs, no formatting work for disabled levels, and a listener of their
+own for forked workers.
+"""
+import json
+import logging
+import os
+
+import app as blackfile
+import jsonlog
+from jsonlog import JsonFormatter, RequestContextFilter, get_logger
+
+
+def make_record(msg, *args, **extra):
+    record = logging.LogRecord("blackfile.test", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_redaction_and_extras():
+    formatter = JsonFormatter(redact_emails=True, redact_ips=True)
+    line = formatter.format(make_record("mail to %s from %s", "alice@example.com", "198.51.100.23",
+                                        stage="email", to="bob@example.org"))
+    entry = json.loads(line)
+    assert entry["msg"] == "mail to a***@example.com from 198.51.100.x"
+    assert entry["to"] == "b***@example.org" and entry["stage"] == "email"
+
+
+def test_request_correlation(tmp_path):
+    application = blackfile.create_app("testing", {"DB_PATH": str(tmp_path / "log.db")})
+    token = "0123456789abcdef" * 2
+    with application.test_request_context(f"/verify/{token}", headers={"X-Request-ID": "req-42"}):
+        application.preprocess_request()
+        record = make_record("checking")
+        RequestContextFilter().filter(record)
+    assert record.request_id == "req-42"
+    assert record.token == token[:8] and record.endpoint == "verify"
+    assert record.elapsed_ms >= 0
+
+
+def test_disabled_level_does_not_format():
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("formatted although DEBUG is off")
+
+    logger = get_logger("test")
+    logger.parent.setLevel(logging.INFO)
+    logger.debug("value: %s", Expensive())
+
+
+def test_forked_worker_gets_its_own_listener(tmp_path):
+    path = tmp_path / "log.jsonl"
+    sink = logging.StreamHandler(open(path, "a", buffering=1))
+    sink.setFormatter(JsonFormatter())
+    handler = jsonlog._QueueHandler(sink)
+    logger = logging.getLogger("blackfile.forktest")
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    logger.info("parent")  # listener thread started before the fork, as with --preload
+    pid = os.fork()
+    if pid == 0:
+        logger.info("child")
+        handler.stop()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    handler.stop()
+    assert sorted(json.loads(line)["msg"] for line in path.read_text().splitlines()) == ["child", "parent"]
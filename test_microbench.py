@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+microbench.py: a tiny sweep produces every case, and the baseline
+comparison flags slowdowns past the threshold.
+"""
+import json
+
+import microbench
+
+
+def test_sweep_and_baseline(tmp_path):
+    argv = ["--sizes", "1024", "--chunks", "16384", "--workers", "1,2", "--min-time", "0.001",
+            "--json", str(tmp_path / "bench.json")]
+    assert microbench.main(argv) == 0
+    results = json.loads((tmp_path / "bench.json").read_text())["results"]
+    assert results["encrypt_segments/size=1024/chunk=16384"]["mb_per_s"] > 0
+    assert results["b64encode/size=1024"]["peak_alloc_bytes"] > 0
+    assert results["decrypt_parallel/size=1024/workers=2"]["mb_per_s"] > 0
+    assert "key_fingerprint" in results and "to_dt" in results
+
+    assert microbench.main(argv[:-2] + ["--baseline", str(tmp_path / "bench.json"),
+                                        "--threshold", "1000"]) == 0
+
+
+def test_compare_threshold():
+    baseline = {"sha256/size=1024/chunk=16384": {"seconds": 1.0}, "hash_otp": {"seconds": 1.0}}
+    results = {"sha256/size=1024/chunk=16384": {"seconds": 1.05}, "hash_otp": {"seconds": 1.5},
+               "to_dt": {"seconds": 9.0}}
+    assert microbench.compare(results, baseline, 0.10) == [("hash_otp", 1.0, 1.5)]
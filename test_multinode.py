@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Multi-node mode: one maintenance leader per shared database, startup
+refusal of placeholder secrets and node-local settings, and (with
+BLACKFILE_TEST_DATABASE_URL set) the full transfer flow against PostgreSQL.
+"""
+import os
+import time
+
+import pytest
+
+import app as blackfile
+import store
+from conftest import download, upload
+
+STRONG_SECRET = "x" * 48
+
+
+@pytest.fixture
+def make_node(make_app):
+    return lambda **config: make_app(SECRET_KEY=STRONG_SECRET, **config)
+
+
+def test_lease_has_one_holder(make_node):
+    node_a, node_b = make_node(), make_node()
+    with node_a.app_context():
+        assert store.try_acquire_lease("maintenance", "a", ttl=30, now=1000)
+    with node_b.app_context():
+        assert not store.try_acquire_lease("maintenance", "b", ttl=30, now=1010)
+    with node_a.app_context():
+        assert store.try_acquire_lease("maintenance", "a", ttl=30, now=1020)  # renewal
+    with node_b.app_context():
+        assert not store.try_acquire_lease("maintenance", "b", ttl=30, now=1049)
+        assert store.try_acquire_lease("maintenance", "b", ttl=30, now=1050)  # a lapsed
+
+
+def test_only_leader_sweeps(tmp_path, make_node):
+    config = {"MAINTENANCE_INTERVAL": 60, "ORPHAN_GRACE_SECONDS": 0}
+    node_a = make_node(NODE_NAME="a", **config)
+    node_b = make_node(NODE_NAME="b", **config)
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    orphan = uploads / "deadbeef.blob"
+    orphan.write_bytes(b"left behind by a crash")
+    old = time.time() - 10
+    os.utime(orphan, (old, old))
+
+    runner_a = node_a.extensions["maintenance"]
+    runner_b = node_b.extensions["maintenance"]
+    runner_b.node_id = "b:1"  # same process here; distinct holders
+    assert runner_a.tick() is True
+    assert not orphan.exists()
+    assert runner_b.tick() is False
+
+    runner_a.stop()
+    assert runner_b.tick() is True
+
+
+def test_multi_node_refuses_placeholder_secret_and_node_local_state(tmp_path, monkeypatch):
+    monkeypatch.setenv("MULTI_NODE", "1")
+    monkeypatch.setenv("MAINTENANCE_INTERVAL", "0")
+    config = {"DB_PATH": str(tmp_path / "x.db"), "LOAD_DOTENV": False, "SMTP_HOST": ""}
+    with pytest.raises(RuntimeError, match="APP_SECRET"):
+        blackfile.create_app("default", dict(config, SECRET_KEY="dev-secret-change-me"))
+    for node_local in ({"SECRET_STORE": "memory"}, {"SQLITE_WAL": True}):
+        with pytest.raises(RuntimeError, match=next(iter(node_local))):
+            blackfile.create_app("default", dict(config, SECRET_KEY=STRONG_SECRET, **node_local))
+    application = blackfile.create_app("default", dict(config, SECRET_KEY=STRONG_SECRET))
+    assert application.config["SWEEP_EXPIRED_ON_INDEX"] is False
+
+
+@pytest.mark.skipif(not os.environ.get("BLACKFILE_TEST_DATABASE_URL"),
+                    reason="set BLACKFILE_TEST_DATABASE_URL=postgresql://... to run")
+def test_postgres_roundtrip(make_client):
+    pytest.importorskip("psycopg")
+    client = make_client(SECRET_KEY=STRONG_SECRET, DATABASE_URL=os.environ["BLACKFILE_TEST_DATABASE_URL"])
+    application = client.application
+    payload = os.urandom(200_000)
+    secret, creds = upload(client, "a@example.com, b@example.com", payload)
+    for token, otp in creds:
+        assert download(client, token, otp, secret) == payload
+    with application.app_context():
+        assert store.try_acquire_lease("maintenance-test", "pg", ttl=1)
+        store.release_lease("maintenance-test", "pg")
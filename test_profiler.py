@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Sampling profiler: slow requests are always captured, form values listed
+in PROFILE_REDACT_FIELDS never reach disk, and nothing is hooked when off.
+"""
+import json
+import time
+
+import pytest
+from flask import request
+
+
+@pytest.fixture
+def make_profiled_app(tmp_path, make_app):
+    return lambda **config: make_app(PROFILE_DIR=str(tmp_path / "profiles"), **config)
+
+
+def wait_for_files(directory, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if directory.exists() and any(directory.iterdir()):
+            return sorted(directory.iterdir())
+        time.sleep(0.01)
+    return []
+
+
+def busy_handler():
+    request.form.get("otp")
+    end = time.perf_counter() + 0.08
+    while time.perf_counter() < end:
+        pass
+    return "ok"
+
+
+def test_slow_request_captured_and_redacted(tmp_path, make_profiled_app):
+    application = make_profiled_app(PROFILING=True, PROFILE_SAMPLE_RATE=0.0,
+                                    PROFILE_SLOW_MS=40, PROFILE_INTERVAL_MS=1)
+    application.add_url_rule("/busy", "busy", busy_handler, methods=["POST"])
+    client = application.test_client()
+
+    client.get("/")  # fast and unsampled: not written
+    client.post("/busy", data={"otp": "123456", "secret_key": "hunter2", "expiry": "10"})
+
+    files = wait_for_files(tmp_path / "profiles")
+    assert len(files) == 1 and files[0].name.endswith(".collapsed.txt")
+    text = files[0].read_text()
+    meta = json.loads(text.splitlines()[0][2:])
+    assert meta["rule"] == "/busy" and meta["reason"] == "slow"
+    assert meta["form"] == {"otp": "[redacted]", "secret_key": "[redacted]", "expiry": "10"}
+    assert "busy_handler" in text
+    assert "123456" not in text and "hunter2" not in text
+
+
+def test_disabled_registers_nothing(tmp_path, make_profiled_app):
+    application = make_profiled_app(PROFILING=False)
+    assert "profiler" not in application.extensions
+    assert application.test_client().get("/").status_code == 200
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_admission_queueing_counts_toward_slow(tmp_path, make_profiled_app):
+    application = make_profiled_app(PROFILING=True, PROFILE_SAMPLE_RATE=0.0, PROFILE_SLOW_MS=40,
+                                    PROFILE_INTERVAL_MS=1, ADMISSION_LIMITS="page=1:1:100")
+    gate = application.extensions["admission"].gates["page"]
+    gate.acquire()  # another page request holds the only slot
+    assert application.test_client().get("/").status_code == 503
+
+    [profile] = wait_for_files(tmp_path / "profiles")
+    text = profile.read_text()
+    assert json.loads(text.splitlines()[0][2:])["reason"] == "slow"
+    assert "acquire" in text
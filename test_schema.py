@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Schema migrations: a v1 file (TEXT tokens, ISO timestamps, hex and base64
+columns) is brought to the current version and its live transfers still
+verify and download.
+"""
+import base64
+import datetime
+import hashlib
+import hmac
+import os
+import sqlite3
+import uuid
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+import store
+from conftest import download
+
+SECRET_KEY = "x" * 48
+
+V1_TRANSFERS = """
+    CREATE TABLE transfers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token TEXT UNIQUE,
+        recipient_email TEXT,
+        otp_hash TEXT,
+        otp_salt TEXT,
+        key_id TEXT,
+        filename_orig TEXT,
+        filepath TEXT,
+        nonce_b64 TEXT,
+        sha256_hex TEXT,
+        created_at TIMESTAMP,
+        expires_at TIMESTAMP,
+        used INTEGER DEFAULT 0,
+        attempts INTEGER DEFAULT 0,
+        locked_until TIMESTAMP NULL,
+        downloaded_from_ip TEXT NULL
+    )
+"""
+
+
+def insert_v1(con, uploads, payload, expires_in):
+    """A transfer as the v1 upload route wrote it: (token, otp, secret)"""
+    token = uuid.uuid4().hex
+    key = AESGCM.generate_key(bit_length=256)
+    nonce = os.urandom(12)
+    path = os.path.join(uploads, f"{token}.blob")
+    with open(path, "wb") as f:
+        f.write(AESGCM(key).encrypt(nonce, payload, None))
+    otp, salt = "123456", uuid.uuid4().hex
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)  # naive UTC, as v1 stored it
+    con.execute("""
+        INSERT INTO transfers (
+            id, token, recipient_email, otp_hash, otp_salt, key_id,
+            filename_orig, filepath, nonce_b64, sha256_hex, created_at, expires_at
+        ) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        token, "a@example.com", hashlib.sha256((salt + otp).encode()).hexdigest(), salt,
+        hmac.new(SECRET_KEY.encode(), key + token.encode(), hashlib.sha256).hexdigest()[:32],
+        "report.pdf", path, base64.b64encode(nonce).decode(), hashlib.sha256(payload).hexdigest(),
+        str(now), str(now + datetime.timedelta(minutes=expires_in)),
+    ))
+    return token, otp, base64.urlsafe_b64encode(key).decode().rstrip("=")
+
+
+def test_v1_transfers_survive_migration(tmp_path, make_client):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    path = tmp_path / "v1.db"
+    con = sqlite3.connect(path)
+    con.execute(V1_TRANSFERS)
+    con.execute("CREATE INDEX idx_expires ON transfers(expires_at)")
+    payload = os.urandom(5000)
+    live = insert_v1(con, uploads, payload, expires_in=10)
+    expired = insert_v1(con, uploads, b"old", expires_in=-10)
+    con.execute("PRAGMA user_version = 1")
+    con.commit()
+    con.close()
+
+    client = make_client(DB_PATH=str(path), SECRET_KEY=SECRET_KEY)
+    with client.application.app_context():
+        assert store.db().execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
+        row = store.get_transfer(bytes.fromhex(live[0]))
+        assert row["filename_orig"] == "report.pdf" and row["expires_at"] > store.now_ts()
+
+    assert b"link has expired" in client.get(f"/verify/{expired[0]}").data
+    assert download(client, *live) == payload
+    assert download(client, *live) is None  # one download only, as before
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+One-time secrets: held server-side behind a path-scoped cookie handle,
+returned once, bound to their transfer and gone at expiry.
+"""
+import io
+import threading
+
+import pytest
+
+import secret_store
+from store import now_ts
+
+TOKEN = bytes(range(16))
+
+
+@pytest.fixture(params=["memory", "db"])
+def application(request, make_app):
+    return make_app(SECRET_STORE=request.param)
+
+
+def test_sent_page_once_without_session_cookie(application):
+    client = application.test_client()
+    resp = client.post("/upload", data={
+        "email": "a@example.com", "expiry": "10",
+        "file": (io.BytesIO(b"payload"), "a.txt", "text/plain"),
+    })
+    [cookie] = resp.headers.getlist("Set-Cookie")
+    token = resp.headers["Location"].rsplit("/", 1)[1]
+    assert cookie.startswith("bf_sent=") and f"Path=/sent/{token}" in cookie and "HttpOnly" in cookie
+    assert len(cookie.split(";")[0]) < 48
+
+    page = client.get(f"/sent/{token}")
+    assert page.status_code == 200 and b"value=" in page.data
+    assert client.get(f"/sent/{token}").status_code == 302
+
+
+def test_pop_is_once_and_bound_to_token(application):
+    store = application.extensions["secret_store"]
+    with application.app_context():
+        handle = store.put(TOKEN, "s3cret", now_ts() + 60)
+        assert store.pop(TOKEN[::-1], handle) is None  # another transfer's page
+        handle = store.put(TOKEN, "s3cret", now_ts() + 60)
+        assert store.pop(TOKEN, "not-a-handle") is None
+        assert store.pop(TOKEN, handle) == "s3cret"
+        assert store.pop(TOKEN, handle) is None
+
+        expired = store.put(TOKEN, "old", now_ts() - 1)
+        assert store.pop(TOKEN, expired) is None
+
+
+def test_concurrent_pops_have_one_winner(application):
+    store = application.extensions["secret_store"]
+    with application.app_context():
+        handle = store.put(TOKEN, "s3cret", now_ts() + 60)
+    results = []
+
+    def pop():
+        with application.app_context():
+            results.append(store.pop(TOKEN, handle))
+
+    threads = [threading.Thread(target=pop) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results, key=str) == [None] * 7 + ["s3cret"]
+
+
+def test_memory_store_evicts():
+    store = secret_store.MemorySecretStore(max_entries=2)
+    for _ in range(5):
+        store.put(TOKEN, "x", now_ts() + 60)
+    assert len(store) == 2
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+SQLite upkeep: incremental auto_vacuum (new files and converted old ones),
+idle-only vacuum steps, WAL checkpoints and planner statistics.
+"""
+import os
+import sqlite3
+
+import pytest
+
+import app as blackfile
+import store
+
+
+class Clock:
+    def __init__(self):
+        self.now = store.now_ts()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def application(make_app):
+    application = make_app(MAINTENANCE_INTERVAL=60, SQLITE_WAL_MAX_MB=0)
+    upkeep = application.extensions["sqlite_maintenance"]
+    upkeep.clock = Clock()
+    return application
+
+
+def churn(n=3000):
+    con = store.db()
+    for _ in range(n):
+        store._record_event(con, "created", os.urandom(16), 1000)
+    con.commit()
+    store.prune_events(store.now_ts() + 1)
+
+
+def test_idle_vacuum_checkpoint_and_analyze(application):
+    upkeep = application.extensions["sqlite_maintenance"]
+    path = application.config["DB_PATH"]
+    with application.app_context():
+        con = store.db()
+        stats = store.sqlite_stats(con, path)
+        assert (stats["auto_vacuum"], stats["journal_mode"]) == (2, "wal")
+        churn()
+        free = store.sqlite_stats(con, path)["freelist_count"]
+        assert free > 0
+
+        store.record_event("verified")  # busy: another worker just wrote
+        upkeep()
+        counters = application.extensions["metrics"].snapshot()["counters"]
+        assert "sqlite_vacuum_pages_total" not in counters
+        assert store.has_statistics(con)
+        assert os.path.getsize(path + "-wal") == 0  # over the (zero) limit: truncated
+
+        upkeep.clock.now += 10
+        upkeep()
+        assert store.sqlite_stats(con, path)["freelist_count"] < free // 2
+
+    counters = application.extensions["metrics"].snapshot()["counters"]
+    assert counters["sqlite_vacuum_pages_total"] > 0
+    assert counters['sqlite_optimize_total{full="true"}'] == 1
+    assert counters['sqlite_checkpoints_total{mode="truncate"}'] == 2
+    gauges = application.test_client().get("/metrics?format=json").get_json()["gauges"]
+    assert gauges["sqlite_file_bytes"] > 0 and "sqlite_freelist_pages" in gauges
+
+
+def test_old_file_converted_once_idle(tmp_path):
+    path = tmp_path / "old.db"
+    con = sqlite3.connect(path)
+    store._create_v2(con)
+    con.execute("PRAGMA user_version = 2")
+    con.commit()
+    con.close()
+
+    application = blackfile.create_app("testing", {"DB_PATH": str(path), "MAINTENANCE_INTERVAL": 60})
+    upkeep = application.extensions["sqlite_maintenance"]
+    upkeep.clock = Clock()
+    with application.app_context():
+        store.record_event("created")
+        upkeep()  # not while transfers are being written
+        assert store.db().execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        upkeep.clock.now += 10
+        upkeep()
+        assert store.db().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert store.db().execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget for the app factory.
+
+Each check runs in a fresh interpreter so module caching from other tests
+cannot hide an import-time regression. Override the budget with
+STARTUP_BUDGET_MS on slow machines.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1500"))
+
+PROBE = r"""
+import json, os, sys, tempfile, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter() - t0
+tmp = tempfile.mkdtemp()
+application = app.create_app("testing", {
+    "DB_PATH": os.path.join(tmp, "startup.db"),
+    "UPLOADS": os.path.join(tmp, "uploads"),
+})
+resp = application.test_client().get("/")
+t_first = time.perf_counter() - t0
+print(json.dumps({
+    "status": resp.status_code,
+    "import_ms": t_import * 1000,
+    "first_response_ms": t_first * 1000,
+    "loaded": sorted(m for m in ("smtplib", "email.mime.text", "cryptography") if m in sys.modules),
+    "touched_uploads": os.path.exists(os.path.join(tmp, "uploads")),
+}))
+"""
+
+
+def run_probe():
+    env = dict(os.environ, BLACKFILE_PROFILE="testing")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_to_first_response_within_budget():
+    result = run_probe()
+    assert result["status"] == 200
+    assert result["first_response_ms"] < STARTUP_BUDGET_MS, result
+
+
+def test_cold_start_skips_rarely_used_work():
+    result = run_probe()
+    # Mail and crypto modules are only imported when a transfer needs them
+    assert result["loaded"] == [], result
+    assert not result["touched_uploads"]
+
+
+def test_schema_ddl_skipped_when_current(tmp_path):
+    import store
+
+    con = store.connect(str(tmp_path / "schema.db"))
+    store.init_db(con)
+    assert con.execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
+
+    # A current file must not see any DDL on the next start
+    statements = []
+    con.set_trace_callback(statements.append)
+    store.init_db(con)
+    con.close()
+    assert statements == ["PRAGMA user_version"]
+
+
+if __name__ == "__main__":
+    print(json.dumps(run_probe(), indent=2))
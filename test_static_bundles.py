@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Page CSS/JS ships as cacheable static bundles: pages carry no inline
+scripts or more than the critical <style> (checked on every page a
+visitor sees), and static URLs are content-hashed with a long max-age.
+"""
+import io
+import re
+
+import pytest
+
+from conftest import OTP_RE, SECRET_RE, TOKEN_RE
+
+
+def page(client, name):
+    if name == "index":
+        return client.get("/")
+    if name == "not_found":
+        return client.get("/no-such-page")
+    resp = client.post("/upload", data={
+        "email": "a@example.com", "expiry": "10",
+        "file": (io.BytesIO(b"payload"), "a.txt", "text/plain"),
+    })
+    if name == "sent":
+        return client.get(resp.headers["Location"])
+    secret = SECRET_RE.search(client.get(resp.headers["Location"]).get_data(as_text=True)).group(1)
+    [(_, _, html)] = client.outbox
+    token, otp = TOKEN_RE.search(html).group(1), OTP_RE.search(html).group(1)
+    if name == "verify":
+        return client.get(f"/verify/{token}")
+    return client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret})
+
+
+# Something only the full template renders, so a short error body can't pass
+MARKERS = {
+    "index": b'name="file"',
+    "verify": b'name="otp"',
+    "download_success": b"data-file-data=",
+    "sent": b'id="secretKey"',
+    "not_found": b"hero-subtitle",
+}
+
+
+@pytest.mark.parametrize("name", MARKERS)
+def test_pages_have_no_inline_scripts(client, name):
+    html = page(client, name).data
+    assert MARKERS[name] in html
+    assert not re.search(rb"<script(?![^>]*\bsrc=)[^>]*>", html)
+    assert len(re.findall(rb"<style", html)) <= 1  # critical CSS only
+
+
+def test_static_urls_are_versioned_and_cached(client):
+    html = client.get("/").get_data(as_text=True)
+    bundle = re.search(r'src="(/static/js/modern-app\.js\?v=[0-9a-f]{12})"', html).group(1)
+    resp = client.get(bundle)
+    assert resp.status_code == 200
+    assert resp.cache_control.max_age == 31536000
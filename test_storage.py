@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Storage admission control: quotas, 507 rejections and usage accounting
+kept in step with blob writes and purges.
+"""
+import io
+import os
+import sqlite3
+
+import pytest
+
+import app as blackfile
+import blobcrypt
+from conftest import TOKEN_RE
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(STORAGE_QUOTA_MB=1, STORAGE_MIN_FREE_MB=0)
+
+
+def upload(client, size, ip="10.0.0.1"):
+    return client.post("/upload", data={
+        "email": "a@example.com", "expiry": "10",
+        "file": (io.BytesIO(os.urandom(size)), "blob.bin", "application/octet-stream"),
+    }, environ_base={"REMOTE_ADDR": ip})
+
+
+def usage(client, sender=None):
+    with client.application.app_context():
+        return blackfile.store.storage_usage(sender)
+
+
+def test_usage_follows_writes_and_purges(client):
+    assert upload(client, 1000).status_code == 302
+    assert usage(client) == blobcrypt.ciphertext_size(1000)
+    assert usage(client, "10.0.0.1") == blobcrypt.ciphertext_size(1000)
+
+    with client.application.app_context():
+        blackfile.sweep_expired()  # nothing expired yet
+        token = TOKEN_RE.search(client.outbox[0][2]).group(1)
+        blackfile.purge_row_and_files(blackfile.store.get_transfer(bytes.fromhex(token)))
+    assert usage(client) == 0
+    assert usage(client, "10.0.0.1") == 0
+
+
+def test_instance_quota_rejects_with_507(client):
+    assert upload(client, MB // 2).status_code == 302
+    resp = upload(client, MB // 2 + 1)
+    assert resp.status_code == 507
+    # The rejected upload left neither a blob nor a reservation behind
+    assert len(os.listdir(client.application.config["UPLOADS"])) == 1
+    assert usage(client) == blobcrypt.ciphertext_size(MB // 2)
+
+
+def test_failed_insert_leaves_no_blob_row(client):
+    assert upload(client, 1000).status_code == 302
+    token_b = bytes.fromhex(TOKEN_RE.search(client.outbox[0][2]).group(1))
+    now = blackfile.store.now_ts()
+    row = (token_b, "b@example.com", b"h", b"s", b"k", "dup.bin", b"n", b"x", now, now + 600)
+    storage = client.application.extensions["storage"]
+    with client.application.app_context():
+        with pytest.raises(sqlite3.IntegrityError):
+            with storage.reservation("10.0.0.9", 500):
+                blackfile.store.insert_transfers(b"\x01" * 16, "/nowhere.blob", 500, [row],
+                                                 sender="10.0.0.9", reserved=500)
+        assert len(blackfile.store.blob_files()) == 1  # the duplicate's blob row was rolled back
+    assert usage(client) == blobcrypt.ciphertext_size(1000)
+
+
+def test_sender_quota(client):
+    client.application.extensions["storage"].sender_quota = 2000
+    assert upload(client, 1500, ip="10.0.0.2").status_code == 302
+    assert upload(client, 1500, ip="10.0.0.2").status_code == 507
+    assert upload(client, 1500, ip="10.0.0.3").status_code == 302
+
+
+def test_sender_is_the_trusted_hop(make_client):
+    for client, forwarded_for, sender in (
+        (make_client(), "203.0.113.7", "10.0.0.1"),  # no proxy: the header is ignored
+        (make_client(TRUSTED_PROXY_HOPS=1), "6.6.6.6, 203.0.113.7", "203.0.113.7"),  # spoofed entry ignored
+    ):
+        client.post("/upload", data={
+            "email": "a@example.com", "expiry": "10",
+            "file": (io.BytesIO(b"x" * 100), "blob.bin", "application/octet-stream"),
+        }, headers={"X-Forwarded-For": forwarded_for}, environ_base={"REMOTE_ADDR": "10.0.0.1"})
+        assert usage(client, sender) > 0
+    assert usage(client, "6.6.6.6") == 0
+
+
+def test_early_reap_frees_room(client):
+    client.application.extensions["storage"].reap_window = 3600
+    assert upload(client, MB // 2).status_code == 302
+    assert upload(client, MB // 2 + 1).status_code == 302
+    assert len(os.listdir(client.application.config["UPLOADS"])) == 1
+
+
+def test_usage_on_metrics_endpoint(client):
+    upload(client, 2048)
+    body = client.get("/metrics").get_data(as_text=True)
+    assert f"storage_used_bytes {blobcrypt.ciphertext_size(2048)}" in body
+    assert client.get("/metrics?format=json").json["gauges"]["storage_quota_bytes"] == MB
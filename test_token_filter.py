@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Token filter behaviour: no false negatives, deletes, picking up tokens
+written by another worker through the generation counter, and checking
+that counter at most once per sync interval.
+"""
+import os
+
+import app as blackfile
+import store
+from conftest import upload
+from token_filter import TokenFilter
+
+
+class FakeTable:
+    """Stands in for the transfers table + meta.token_generation"""
+
+    def __init__(self):
+        self.tokens = set()
+        self.generation = 0
+        self.generation_reads = 0
+        self.now = 0.0
+
+    def insert(self, token_b):
+        self.tokens.add(token_b)
+        self.generation += 1
+        return self.generation
+
+    def delete(self, token_b):
+        self.tokens.discard(token_b)
+        self.generation += 1
+        return self.generation
+
+    def read_generation(self):
+        self.generation_reads += 1
+        return self.generation
+
+    def make_filter(self, sync_interval=1.0):
+        return TokenFilter(lambda: list(self.tokens), self.read_generation,
+                           sync_interval=sync_interval, clock=lambda: self.now)
+
+
+def test_known_tokens_pass_and_unknown_are_mostly_rejected():
+    table = FakeTable()
+    stored = [os.urandom(16) for _ in range(500)]
+    for token_b in stored:
+        table.insert(token_b)
+    filt = table.make_filter()
+
+    assert all(filt.might_contain(t) for t in stored)
+    false_hits = sum(filt.might_contain(os.urandom(16)) for _ in range(5000))
+    assert false_hits < 5000 * 0.03
+
+
+def test_local_add_and_discard():
+    table = FakeTable()
+    filt = table.make_filter()
+    filt.rebuild()
+
+    token_b = os.urandom(16)
+    filt.add(token_b, table.insert(token_b))
+    assert filt.might_contain(token_b)
+
+    filt.discard(token_b, table.delete(token_b))
+    assert not filt.might_contain(token_b)
+    assert filt.rebuilds == 1  # own writes never force a rebuild
+
+
+def test_token_from_other_worker_visible_after_sync_interval():
+    table = FakeTable()
+    worker_a = table.make_filter()
+    worker_b = table.make_filter()
+    worker_a.rebuild()
+    worker_b.rebuild()
+
+    token_b = os.urandom(16)
+    worker_a.add(token_b, table.insert(token_b))
+
+    # Worker B never saw the insert; once the interval is up a miss
+    # re-checks the generation and rebuilds
+    table.now += 1.0
+    assert worker_b.might_contain(token_b)
+    assert worker_b.rebuilds == 2
+
+
+def test_misses_within_interval_stay_off_the_database():
+    table = FakeTable()
+    filt = table.make_filter()
+    filt.rebuild()
+    reads = table.generation_reads
+    table.insert(os.urandom(16))  # another worker keeps writing
+
+    for _ in range(1000):
+        filt.might_contain(os.urandom(16))
+    assert table.generation_reads == reads and filt.rebuilds == 1
+
+    table.now += 1.0
+    for _ in range(1000):
+        filt.might_contain(os.urandom(16))
+    assert table.generation_reads == reads + 1 and filt.rebuilds == 2
+
+
+def test_link_from_other_worker_served_after_sync(make_client):
+    worker_a = make_client()
+    worker_b = make_client(TOKEN_FILTER_SYNC_SECONDS=0)
+    assert worker_b.get("/verify/" + "00" * 16).status_code == 404  # B's filter is now built
+
+    _, [(token, _)] = upload(worker_a, "a@example.com", os.urandom(100))
+    assert worker_b.get(f"/verify/{token}").status_code == 200
+
+
+def test_racing_purges_discard_once(client):
+    """Two workers purging one row: the loser must neither bump the
+    generation nor take the token out of the filter again"""
+    _, creds = upload(client, "a@example.com, b@example.com", os.urandom(100))
+    (gone, _), (live, _) = creds
+    assert client.get(f"/verify/{live}").status_code == 200  # filter built
+    token_filter = client.application.extensions["token_filter"]
+
+    with client.application.test_request_context():
+        row = store.get_transfer(bytes.fromhex(gone))
+        blackfile.purge_row_and_files(row)
+        generation, count = store.token_generation(), token_filter._count
+        blackfile.purge_row_and_files(row)
+        assert store.delete_transfer(row["token"]) == (None, None)
+        assert store.token_generation() == generation
+        assert token_filter._count == count
+        assert token_filter.might_contain(bytes.fromhex(live))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Verify-path metadata cache: filled on upload, hits skip the full row
+read but still see used/attempts/lock state, and entries go on download,
+purge and lock (here or, via the state read, on another worker).
+"""
+import os
+
+import pytest
+
+import app as blackfile
+from conftest import download, upload
+from transfer_cache import TransferCache
+
+
+@pytest.fixture
+def client(make_client, monkeypatch):
+    test_client = make_client()
+    test_client.cache = test_client.application.extensions["transfer_cache"]
+    reads = test_client.full_reads = []
+    get_transfer = blackfile.store.get_transfer
+    monkeypatch.setattr(blackfile.store, "get_transfer", lambda t: reads.append(t) or get_transfer(t))
+    return test_client
+
+
+def test_verify_hits_cache_and_download_invalidates(client):
+    payload = os.urandom(5000)
+    secret, [(token, otp)] = upload(client, "a@example.com", payload)
+    token_b = bytes.fromhex(token)
+    assert len(client.cache) == 1
+    client.full_reads.clear()  # the /sent page
+
+    for _ in range(3):
+        assert client.get(f"/verify/{token}").status_code == 200
+    assert client.full_reads == []
+    assert download(client, token, otp, secret) == payload
+    assert len(client.cache) == 0
+    client.get(f"/verify/{token}")
+    assert client.full_reads == [token_b]
+
+    gauges = client.get("/metrics?format=json").get_json()["gauges"]
+    assert gauges["transfer_cache_hits"] == 4 and gauges["transfer_cache_hit_ratio"] == 0.8
+
+
+def test_lock_invalidates_and_attempts_stay_authoritative(client):
+    secret, [(token, otp)] = upload(client, "a@example.com", os.urandom(100))
+    wrong = f"{(int(otp) + 1) % 1000000:06d}"
+    for _ in range(client.application.config["OTP_MAX_TRIES"] - 1):
+        client.post(f"/verify/{token}", data={"otp": wrong, "secret_key": secret})
+    assert len(client.cache) == 1  # failed attempts counted in the database, not the cache
+
+    client.post(f"/verify/{token}", data={"otp": wrong, "secret_key": secret})
+    assert len(client.cache) == 0
+    assert b"temporarily locked" in client.get(f"/verify/{token}").data
+
+
+def test_purge_elsewhere_seen_through_state_read(client):
+    secret, [(token, otp)] = upload(client, "a@example.com", os.urandom(100))
+    assert client.get(f"/verify/{token}").status_code == 200
+    with client.application.app_context():
+        # Another worker purges the row behind this worker's cache
+        con = blackfile.store.db()
+        con.execute("DELETE FROM transfers WHERE token=?", (bytes.fromhex(token),))
+        con.commit()
+    assert len(client.cache) == 1
+    assert client.post(f"/verify/{token}", data={"otp": otp, "secret_key": secret}).status_code in (404, 410)
+    assert len(client.cache) == 0
+
+
+def test_lru_and_ttl():
+    clock = type("Clock", (), {"now": 0.0, "__call__": lambda self: self.now})()
+    cache = TransferCache(max_entries=2, ttl=30, clock=clock)
+    row = {"expires_at": 1, "used": 0, "attempts": 2}
+    for key in (b"a", b"b"):
+        cache.put(key, row)
+    assert cache.get(b"a") == {"expires_at": 1}  # a is now most recent
+    cache.put(b"c", row)
+    assert cache.get(b"b") is None and cache.get(b"a") is not None
+
+    clock.now = 31
+    assert cache.get(b"a") is None and len(cache) == 1
@@ -0,0 +1,147 @@
+"""
+In-memory negative-lookup filter for link tokens.
+
+A counting Bloom filter holding every token in the `transfers` table, so
+/verify can turn away unknown tokens (scanners, mistyped links) without a
+SQLite query. Positives still go to the database; only misses are trusted.
+
+Each worker keeps its own copy. Inserts and deletes bump a generation
+counter in the database. A miss re-reads that counter at most once per
+`sync_interval` and rebuilds when another worker has changed the set;
+other misses are answered from memory alone. So a scanner's probes cost
+at most one small SELECT, plus one rebuild (a scan of every token), per
+interval per worker, however many it sends and however busy the other
+workers are. The price is that a link created on another worker less than
+`sync_interval` ago can be turned away here. Links reach their recipients
+by email, which takes longer than that, and the API does not use the
+filter.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+
+
+class TokenFilter:
+    def __init__(self, load_tokens, load_generation, fp_rate=0.01, sync_interval=1.0,
+                 min_capacity=1024, clock=time.monotonic):
+        """`load_tokens()` yields every stored token; `load_generation()`
+        returns the database's current generation counter."""
+        self._load_tokens = load_tokens
+        self._load_generation = load_generation
+        self.fp_rate = fp_rate
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self.min_capacity = min_capacity
+        # Keyed hashing so crafted probe tokens can't target set counters
+        self._salt = os.urandom(16)
+        self._lock = threading.Lock()
+        self._table = None  # (counters, size, k, capacity), built on first use
+        self._count = 0
+        self._generation = None
+        self._checked_at = None
+        self.rebuilds = 0
+
+    # -------------------- hashing --------------------
+    def _positions(self, table, token_b):
+        _, size, k, _ = table
+        digest = hashlib.blake2b(token_b, key=self._salt, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % size for i in range(k)]
+
+    def _test(self, table, token_b):
+        counters = table[0]
+        return all(counters[p] for p in self._positions(table, token_b))
+
+    # -------------------- build / sync --------------------
+    def _sized_table(self, n):
+        capacity = max(self.min_capacity, 2 * n)
+        size = math.ceil(-capacity * math.log(self.fp_rate) / (math.log(2) ** 2))
+        k = max(1, round(size / capacity * math.log(2)))
+        return (bytearray(size), size, k, capacity)
+
+    def _rebuild(self, generation=None):
+        # Generation first: a concurrent insert can only make us rebuild
+        # again, never leave its token out.
+        if generation is None:
+            generation = self._load_generation()
+        tokens = list(self._load_tokens())
+        table = self._sized_table(len(tokens))
+        counters = table[0]
+        for token_b in tokens:
+            for p in self._positions(table, token_b):
+                if counters[p] < 255:
+                    counters[p] += 1
+        self._table = table
+        self._count = len(tokens)
+        self._generation = generation
+        self._checked_at = self.clock()
+        self.rebuilds += 1
+
+    def _sync(self):
+        """Rebuild if the stored set changed elsewhere; True if it did.
+        Checks the database at most once per sync interval."""
+        with self._lock:
+            now = self.clock()
+            if self._table is not None and self._generation is not None \
+                    and now - self._checked_at < self.sync_interval:
+                return False
+            self._checked_at = now
+            generation = self._load_generation()
+            if self._table is None or generation != self._generation:
+                self._rebuild(generation)
+                return True
+            return False
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild()
+
+    # -------------------- public API --------------------
+    def might_contain(self, token_b: bytes) -> bool:
+        if self._table is None:
+            self.rebuild()
+        if self._test(self._table, token_b):
+            return True
+        if self._sync():
+            return self._test(self._table, token_b)
+        return False
+
+    def add(self, token_b: bytes, generation=None):
+        """Record a token this worker just stored at `generation`"""
+        with self._lock:
+            table = self._table
+            if table is None:
+                return  # first lookup builds from the database anyway
+            counters = table[0]
+            for p in self._positions(table, token_b):
+                if counters[p] < 255:
+                    counters[p] += 1
+            self._count += 1
+            self._advance(generation)
+            if self._count > table[3]:
+                self._generation = None  # over capacity: resize on next miss
+
+    def discard(self, token_b: bytes, generation=None):
+        with self._lock:
+            table = self._table
+            if table is None:
+                return
+            counters = table[0]
+            positions = self._positions(table, token_b)
+            # Saturated counters stay put; the next rebuild settles them
+            if all(counters[p] for p in positions):
+                for p in positions:
+                    if counters[p] < 255:
+                        counters[p] -= 1
+                self._count = max(0, self._count - 1)
+            self._advance(generation)
+
+    def _advance(self, generation):
+        # Our own write moved the counter by one; anything more means
+        # another worker wrote too, which the next sync must pick up.
+        if generation is not None and self._generation is not None \
+                and generation == self._generation + 1:
+            self._generation = generation
@@ -0,0 +1,72 @@
+"""
+Per-worker LRU cache of the immutable part of a transfer row.
+
+Recipients refresh /verify/<token> and link scanners prefetch it, and
+every hit used to run the full transfers+blobs join. What a transfer
+was created with (expiry, filename, key fingerprint, nonce, OTP salt and
+hash, blob location) never changes, so it is cached here, filled on
+upload and on first read. What does change (used, attempts,
+locked_until) is always read from the database by primary key; a row
+that is gone there drops its entry, so a purge or download on another
+worker cannot be missed.
+
+Entries are dropped on purge, download and lock by this worker, expire
+after `ttl` seconds, and the least recently used go first past
+`max_entries`.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MUTABLE = ("used", "attempts", "locked_until", "downloaded_from_ip")
+
+
+class TransferCache:
+    def __init__(self, max_entries=4096, ttl=30.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_b: bytes):
+        """The cached immutable columns, or None"""
+        with self._lock:
+            entry = self._entries.get(token_b)
+            if entry is not None:
+                meta, stored_at = entry
+                if self.clock() - stored_at < self.ttl:
+                    self._entries.move_to_end(token_b)
+                    self.hits += 1
+                    return meta
+                del self._entries[token_b]
+            self.misses += 1
+            return None
+
+    def put(self, token_b: bytes, row):
+        """Cache the immutable columns of `row` (a mapping or sqlite3.Row)"""
+        meta = {key: row[key] for key in row.keys() if key not in MUTABLE}
+        with self._lock:
+            self._entries[token_b] = (meta, self.clock())
+            self._entries.move_to_end(token_b)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, token_b: bytes):
+        with self._lock:
+            self._entries.pop(token_b, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def collect(self):
+        """Gauges for the metrics endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "transfer_cache_entries": len(self._entries),
+            "transfer_cache_hits": self.hits,
+            "transfer_cache_misses": self.misses,
+            "transfer_cache_hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }